@@ -1,66 +1,118 @@
+import argparse
+from datetime import datetime
+
 import cv2
 import numpy as np
-import ast
-from shapely.geometry import Point, Polygon
-from ultralytics import YOLO
-
-# ---------- Load parking spot polygons from TXT file ----------
-def load_parking_spots(file_path):
-    spots = []
-    with open(file_path, "r") as f:
-        for line in f:
-            line = line.strip()
-            if line:  # skip empty lines
-                polygon = ast.literal_eval(line)
-                spots.append(polygon)
-    return spots
-
-parking_spots = load_parking_spots("polygon_output.txt")
-
-# ---------- Load the input image ----------
-image_path = "pred_model/moments/5_jun/moment_132426.png"
-image = cv2.imread(image_path)
-
-# ---------- Load YOLOv8x model ----------
-model = YOLO("yolov8l.pt")
-results = model(image)[0]
-
-# ---------- Get only vehicle detections (car=2, bus=5, truck=7) ----------
-vehicle_boxes = [
-    box.xyxy[0].tolist()
-    for box in results.boxes
-    if int(box.cls[0]) in [2, 5, 7]
-]
-
-vehicle_centers = [((x1 + x2)/2, (y1 + y2)/2) for (x1, y1, x2, y2) in vehicle_boxes]
-
-# ---------- Check polygon occupancy ----------
-empty_spots = [
-
-]
-for i, spot in enumerate(parking_spots):
-    poly = Polygon(spot)
-    occupied = any(poly.contains(Point(center)) for center in vehicle_centers)
-    if occupied:
-        empty_spots.append(i)
-
-    # Draw polygon
-    color = (0, 0, 255) if occupied else (0, 255, 0)
-    cv2.polylines(image, [np.array(spot, dtype=np.int32)], isClosed=True, color=color, thickness=2)
-
-    # Label spot
-    cx = int(np.mean([pt[0] for pt in spot]))
-    cy = int(np.mean([pt[1] for pt in spot]))
-    cv2.putText(image, str(i), (cx, cy), cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 2)
-
-# ---------- Draw vehicle boxes ----------
-for (x1, y1, x2, y2) in vehicle_boxes:
-    cv2.rectangle(image, (int(x1), int(y1)), (int(x2), int(y2)), (255, 255, 0), 2)
-
-# ---------- Show image ----------
-cv2.imshow("Occupancy Detection", image)
-print("Empty spots:")
-print(empty_spots)
-
-cv2.waitKey(0)
-cv2.destroyAllWindows()
+
+from smart_parking.detection import box_centers, detect_vehicles
+from smart_parking.history import OccupancyStore
+from smart_parking.models import get_detector
+from smart_parking.roi import spot_rois
+from smart_parking.spotmap import load_spot_map
+from smart_parking.spots import load_parking_spots, spot_label_position
+from smart_parking.stream import stream_occupancy
+
+
+# ---------- Draw spot status and vehicle boxes ----------
+def draw_occupancy(image, parking_spots, occupied, vehicle_boxes):
+    for i, spot in enumerate(parking_spots):
+        color = (0, 0, 255) if occupied[i] else (0, 255, 0)
+        cv2.polylines(image, [np.array(spot, dtype=np.int32)], isClosed=True, color=color, thickness=2)
+        cv2.putText(image, str(i), spot_label_position(spot), cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 2)
+
+    for (x1, y1, x2, y2) in vehicle_boxes:
+        cv2.rectangle(image, (int(x1), int(y1)), (int(x2), int(y2)), (255, 255, 0), 2)
+    return image
+
+
+# ---------- Single image ----------
+def check_image(image_path, spots_path, model, roi_tiles=0, roi_padding=64, imgsz=None):
+    image = cv2.imread(image_path)
+    if image is None:
+        raise FileNotFoundError(f"Could not load image {image_path}")
+
+    spot_map = load_spot_map(spots_path, image.shape)
+    parking_spots = spot_map.spots
+    rois = spot_rois(parking_spots, image.shape, tiles=roi_tiles, padding=roi_padding) if roi_tiles else None
+    vehicle_boxes = detect_vehicles(model, image, rois=rois, **({"imgsz": imgsz} if imgsz else {}))
+    occupied = spot_map.occupancy_from_centers(box_centers(vehicle_boxes))
+    empty_spots = np.flatnonzero(~occupied).tolist()
+
+    cv2.imshow("Occupancy Detection", draw_occupancy(image, parking_spots, occupied, vehicle_boxes))
+    print("Empty spots:")
+    print(empty_spots)
+
+    cv2.waitKey(0)
+    cv2.destroyAllWindows()
+
+
+# ---------- Live video / stream ----------
+def check_stream(source, spots_path, model, show=False, store=None, camera_id="cam0", **stream_options):
+    parking_spots = load_parking_spots(spots_path)
+    history = store.writer(camera_id, len(parking_spots)) if store is not None else None
+    for result in stream_occupancy(source, spots_path, model, **stream_options):
+        # With smoothing only confirmed transitions are recorded
+        record = result.transitions if result.transitions is not None else result.detected
+        if history is not None and record:
+            history.append(datetime.now(), occupied=result.occupied)
+
+        bits = "".join("1" if o else "0" for o in result.occupied)
+        status = "" if result.detected else " (carried)"
+        print(f"frame {result.index} @ {result.video_time:.2f}s "
+              f"(lag {result.latency * 1000:.0f} ms): {bits}{status}")
+
+        if show:
+            image = draw_occupancy(result.frame, parking_spots, result.occupied, result.boxes)
+            cv2.imshow("Occupancy Detection", image)
+            if cv2.waitKey(1) & 0xFF == 27:  # ESC key
+                break
+
+    if history is not None:
+        history.close()
+    if show:
+        cv2.destroyAllWindows()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check which parking spots are occupied.")
+    parser.add_argument("--image", default="pred_model/moments/5_jun/moment_132426.png")
+    parser.add_argument("--source", help="video file, camera index or stream URL; enables streaming mode")
+    parser.add_argument("--spots", default="polygon_output.txt")
+    parser.add_argument("--model", default="yolov8l.pt")
+    parser.add_argument("--export", choices=["onnx", "openvino"], help="run an exported CPU build of the detector")
+    parser.add_argument("--queue-size", type=int, default=2)
+    parser.add_argument("--no-drop", action="store_true", help="process every frame instead of dropping stale ones")
+    parser.add_argument("--motion-threshold", type=float,
+                        help="only re-run detection when a spot's mean pixel change exceeds this (0-255)")
+    parser.add_argument("--max-stale", type=float, default=60.0,
+                        help="seconds after which detection re-runs even without motion")
+    parser.add_argument("--roi-tiles", type=int, default=0,
+                        help="detect only on this many crops around the spots (0 = full frame)")
+    parser.add_argument("--roi-padding", type=int, default=64, help="pixels added around the spot crops")
+    parser.add_argument("--imgsz", type=int, help="detector input size")
+    parser.add_argument("--smooth", type=int, nargs=2, metavar=("N", "M"),
+                        help="confirm a spot change only when N of the last M detections agree (M/2 < N <= M <= 8)")
+    parser.add_argument("--store", help="record per-spot occupancy to this history folder")
+    parser.add_argument("--camera", default="cam0", help="camera id in the occupancy history")
+    parser.add_argument("--show", action="store_true")
+    args = parser.parse_args()
+
+    model = get_detector(args.model, export=args.export)
+
+    if args.source is None:
+        check_image(args.image, args.spots, model, roi_tiles=args.roi_tiles,
+                    roi_padding=args.roi_padding, imgsz=args.imgsz)
+    else:
+        source = int(args.source) if args.source.isdigit() else args.source
+        store = OccupancyStore(args.store) if args.store else None
+        check_stream(source, args.spots, model, show=args.show, store=store, camera_id=args.camera,
+                     max_queue=args.queue_size,
+                     drop_stale=not args.no_drop, motion_threshold=args.motion_threshold,
+                     max_stale=args.max_stale, roi_tiles=args.roi_tiles,
+                     roi_padding=args.roi_padding, imgsz=args.imgsz,
+                     smooth_window=args.smooth[1] if args.smooth else 0,
+                     smooth_required=args.smooth[0] if args.smooth else None)
+
+
+if __name__ == "__main__":
+    main()
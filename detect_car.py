@@ -53,13 +53,13 @@
 #     detect_cars_in_night_image(image_path)
 
 
-from ultralytics import YOLO
 import cv2
 import numpy as np
 
+from smart_parking.models import get_detector
 
-# Load pretrained YOLOv8 model
-model = YOLO('yolov8l.pt')  # or yolov8m.pt, yolov8l.pt
+# Load pretrained YOLOv8 model (cached per process)
+model = get_detector('yolov8l.pt')  # or yolov8m.pt, yolov8l.pt
 
 # Classes to detect: car(2), bus(5), truck(7)
 target_classes = [2, 5, 7]
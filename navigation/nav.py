@@ -4,6 +4,11 @@ import ast
 import time
 import math
 
+from smart_parking.planner import load_lot_planner, instructions, next_waypoint
+from smart_parking.render import ArrowSprites, NavRenderer
+from smart_parking.reservations import ReservationBook
+from smart_parking.spotindex import SpotIndex
+
 def load_parking_spots(file_path):
     spots = []
     with open(file_path, "r") as f:
@@ -15,21 +20,8 @@ def load_parking_spots(file_path):
     return spots
 
 def spot_center(idx):
-    pts = np.array(parking_spots[idx], dtype=np.int32) + margin
-    cx = int(np.mean([p[0] for p in pts]))
-    cy = int(np.mean([p[1] for p in pts]))
-    return (cx, cy)
-
-def dist(p1, p2):
-    return np.linalg.norm(np.array(p1) - np.array(p2))
-
-def rotate_image(img, angle):
-    (h, w) = img.shape[:2]
-    center = (w // 2, h // 2)
-    M = cv2.getRotationMatrix2D(center, angle, 1.0)
-    rotated = cv2.warpAffine(img, M, (w, h), flags=cv2.INTER_LINEAR,
-                             borderMode=cv2.BORDER_CONSTANT, borderValue=(0, 0, 0, 0))
-    return rotated
+    cx, cy = free_index.centers[idx] + margin
+    return (int(cx), int(cy))
 
 def angle_between_points(p1, p2):
     dx = p2[0] - p1[0]
@@ -57,6 +49,7 @@ margin = 100
 car_radius = 15
 car_speed = 20  # increased sensitivity
 arrow_angle = 270  # start facing right
+lookahead = 60  # steer toward the first path point this far ahead
 
 # ---------- LOAD ----------
 image = cv2.imread(blueprint_path)
@@ -65,6 +58,11 @@ if image is None:
     exit(1)
 
 parking_spots = load_parking_spots(spots_file_path)
+planner = load_lot_planner(blueprint_path, spots_file_path)
+free_index = SpotIndex.from_polygons(parking_spots, free=empty_spots)
+# Occupied spots come from the detector; this driver holds its target until it parks
+reservations = ReservationBook(len(parking_spots), default_ttl=300)
+reservations.reconcile([i not in empty_spots for i in range(len(parking_spots))])
 
 canvas_h = image.shape[0] + 2 * margin
 canvas_w = image.shape[1] + 2 * margin
@@ -94,9 +92,27 @@ arrow_icon = np.zeros((40, 40, 4), dtype=np.uint8)
 pts_arrow = np.array([[20, 5], [5, 35], [35, 35]], np.int32)
 cv2.fillPoly(arrow_icon, [pts_arrow], (0, 0, 255, 255))
 
-target_spot_index = min(empty_spots)
+# Static canvas as the base layer; each frame redraws only around the car, path and text
+renderer = NavRenderer(canvas, ArrowSprites(arrow_icon))
+
+def lot_pos(pos):
+    # Canvas -> blueprint coordinates
+    return (pos[0] - margin, pos[1] - margin)
+
+# Nearest spot by driving distance through the aisles, not by index
+candidates = planner.nearest_spots(lot_pos(car_pos), empty_spots, len(empty_spots))
+hold = reservations.hold_first(candidates, client="driver")
+if hold is None:
+    print("No reachable empty spot.")
+    exit(1)
+target_spot_index = hold.spot
 target_center = spot_center(target_spot_index)
 
+path = []
+path_from = None
+for step in instructions(planner.path_to_spot(lot_pos(car_pos), target_spot_index)):
+    print(step)
+
 reached_spot = None
 reach_start_time = None
 
@@ -114,25 +130,18 @@ key_map = {
 print("Use arrow keys or WASD to move. Press ESC to quit.")
 
 while True:
-    canvas_copy = canvas.copy()
-
-    # Car Dot
-    cv2.circle(canvas_copy, tuple(car_pos), car_radius, car_color, -1)
+    renderer.begin()
 
-    # Rotated Arrow
-    rotated_arrow = rotate_image(arrow_icon, -arrow_angle)
-    x_off = car_pos[0] - rotated_arrow.shape[1] // 2
-    y_off = car_pos[1] - rotated_arrow.shape[0] // 2
-
-    for c in range(3):
-        alpha = rotated_arrow[:, :, 3] / 255.0
-        y1, y2 = y_off, y_off + rotated_arrow.shape[0]
-        x1, x2 = x_off, x_off + rotated_arrow.shape[1]
+    # Path to the target, replanned only when the car moved
+    if reached_spot is None and path_from != tuple(car_pos):
+        path_from = tuple(car_pos)
+        path = [(int(x) + margin, int(y) + margin)
+                for x, y in planner.path_to_spot(lot_pos(car_pos), target_spot_index)]
+    if reached_spot is None:
+        renderer.polyline(path, (255, 128, 0), 3)
 
-        if 0 <= y1 < canvas_copy.shape[0] and y2 <= canvas_copy.shape[0] and \
-           0 <= x1 < canvas_copy.shape[1] and x2 <= canvas_copy.shape[1]:
-            canvas_copy[y1:y2, x1:x2, c] = (alpha * rotated_arrow[:, :, c] +
-                                            (1 - alpha) * canvas_copy[y1:y2, x1:x2, c])
+    # Car Dot and Arrow
+    renderer.car(car_pos, car_radius, car_color, arrow_angle)
 
     # Text Message
     if reached_spot is None:
@@ -141,18 +150,21 @@ while True:
         text = f"Reached spot {reached_spot + 1}!"
 
     text_size, _ = cv2.getTextSize(text, font, font_scale, font_thickness)
-    text_x = (canvas_copy.shape[1] - text_size[0]) // 2
+    text_x = (canvas.shape[1] - text_size[0]) // 2
     text_y = margin // 2 + text_size[1] // 2
-    cv2.putText(canvas_copy, text, (text_x, text_y), font, font_scale, text_color, font_thickness)
+    renderer.text(text, (text_x, text_y), font_scale, text_color, font_thickness)
 
     # Direction Label
     if reached_spot is None:
-        target_angle = angle_between_points(car_pos, target_center)
+        waypoint = next_waypoint(path, car_pos, lookahead) or target_center
+        target_angle = angle_between_points(car_pos, waypoint)
         nav_text = relative_direction(arrow_angle, target_angle)
         nav_size, _ = cv2.getTextSize(nav_text, font, 1, 2)
-        nav_x = (canvas_copy.shape[1] - nav_size[0]) // 2
+        nav_x = (canvas.shape[1] - nav_size[0]) // 2
         nav_y = text_y + nav_size[1] + 10
-        cv2.putText(canvas_copy, nav_text, (nav_x, nav_y), font, 1, (0, 0, 0), 2)
+        renderer.text(nav_text, (nav_x, nav_y), 1, (0, 0, 0), 2)
+
+    frame = renderer.end()
 
     # Movement
     key = cv2.waitKey(30) & 0xFF
@@ -164,25 +176,31 @@ while True:
             car_pos[1] = max(margin, car_pos[1] - car_speed)
             arrow_angle = 0
         elif move_dir == 'down':
-            car_pos[1] = min(canvas_copy.shape[0] - margin, car_pos[1] + car_speed)
+            car_pos[1] = min(canvas.shape[0] - margin, car_pos[1] + car_speed)
             arrow_angle = 180
         elif move_dir == 'left':
             car_pos[0] = max(margin, car_pos[0] - car_speed)
             arrow_angle = 270
         elif move_dir == 'right':
-            car_pos[0] = min(canvas_copy.shape[1] - margin, car_pos[0] + car_speed)
+            car_pos[0] = min(canvas.shape[1] - margin, car_pos[0] + car_speed)
             arrow_angle = 90
 
     # ---------- Reach Logic ----------
     if reached_spot is None:
-        for idx in empty_spots:
-            if dist(car_pos, spot_center(idx)) <= 40:
-                reached_spot = idx
-                reach_start_time = time.time()
-                break
+        nearest = free_index.nearest(lot_pos(car_pos), max_distance=40)
+        if nearest is not None:
+            reached_spot = nearest[0]
+            reach_start_time = time.time()
     elif time.time() - reach_start_time >= 2 and reached_spot in empty_spots:
         # 2 seconds passed -> mark as occupied
+        if reached_spot != hold.spot:
+            # Parked somewhere else: give the held spot back to other drivers
+            reservations.release(hold)
+            hold = reservations.hold(reached_spot, client="driver")
+        if hold is not None:
+            reservations.claim(hold)
         empty_spots.remove(reached_spot)
+        free_index.set_free(reached_spot, False)
         pts = np.array(parking_spots[reached_spot], dtype=np.int32) + margin
         cv2.fillPoly(canvas, [pts], (0, 0, 255))
         cx = int(np.mean([p[0] for p in pts]))
@@ -195,6 +213,7 @@ while True:
         print("Navigation ended.")
         break
 
-    cv2.imshow("Parking Navigation", canvas_copy)
+    cv2.imshow("Parking Navigation", frame)
 
+print(renderer.timer.summary())
 cv2.destroyAllWindows()
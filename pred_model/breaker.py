@@ -1,5 +1,12 @@
-import cv2
+import argparse
 import os
+import time
+from datetime import timedelta
+
+import cv2
+
+from smart_parking.framestore import FrameStore, FrameStoreWriter, sample_video, video_start_time
+
 
 def extract_frames(video_path, output_folder):
     # Create output folder if it doesn't exist
@@ -26,8 +33,51 @@ def extract_frames(video_path, output_folder):
     cap.release()
     print(f"Done! Extracted {frame_count} frames to '{output_folder}'.")
 
-# === USAGE ===
-video_file = 'pred_model/videos/F0090D403175_20250607204354406_cam0.mov'
-output_dir = 'pred_model/moments/5_jun'
 
-extract_frames(video_file, output_dir)
+def extract_to_store(video_path, output_folder, every_s=1.0, dedup_bits=12, chunk_frames=128):
+    # Samples one frame per every_s seconds, drops near-duplicates and writes
+    # the rest to a chunked frame store with a frame -> timestamp index
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        print(f"Error: Could not open video file {video_path}")
+        return
+
+    start = video_start_time(video_path)
+    if start is None:
+        print(f"⚠️ No recording time in '{os.path.basename(video_path)}', storing video offsets only")
+
+    started = time.perf_counter()
+    stats = {}
+    with FrameStoreWriter(output_folder, chunk_frames=chunk_frames) as store:
+        for video_ms, frame in sample_video(cap, every_s=every_s, dedup_bits=dedup_bits, stats=stats):
+            when = start + timedelta(milliseconds=video_ms) if start else None
+            store.append(frame, video_ms=video_ms, when=when)
+    cap.release()
+
+    size_mb = FrameStore(output_folder).nbytes() / 1e6
+    print(f"Done! {stats['grabbed']} frames read, {stats['decoded']} decoded, "
+          f"{stats['duplicates']} near-duplicates dropped, {stats['kept']} stored "
+          f"({size_mb:.1f} MB) in '{output_folder}' in {time.perf_counter() - started:.1f}s.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Extract frames from a CCTV recording.")
+    parser.add_argument("video", nargs="?", default="pred_model/videos/F0090D403175_20250607204354406_cam0.mov")
+    parser.add_argument("output", nargs="?", default="pred_model/moments/5_jun")
+    parser.add_argument("--every", type=float, default=1.0, help="seconds of footage between kept frames")
+    parser.add_argument("--dedup-bits", type=int, default=12,
+                        help="drop frames whose 256-bit perceptual hash differs from the last kept one by at "
+                             "most this many bits (-1 keeps all)")
+    parser.add_argument("--chunk-frames", type=int, default=128, help="frames per store chunk file")
+    parser.add_argument("--jpeg", action="store_true", help="write every frame as a JPEG instead (old behaviour)")
+    args = parser.parse_args()
+
+    if args.jpeg:
+        extract_frames(args.video, args.output)
+    else:
+        extract_to_store(args.video, args.output, every_s=args.every,
+                         dedup_bits=None if args.dedup_bits < 0 else args.dedup_bits, chunk_frames=args.chunk_frames)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,20 @@
-from ultralytics import YOLO
-import cv2
-import numpy as np
+import argparse
+import hashlib
+import json
 import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
 
-# Load pretrained YOLOv8 model
-model = YOLO('yolov8l.pt')  # Or yolov8m.pt, yolov8l.pt
+import cv2
+import numpy as np
 
-# Classes to detect: car(2), bus(5), truck(7)
-target_classes = [2, 5, 7]
-class_names = {2: 'car', 5: 'bus', 7: 'truck'}
+from smart_parking.detection import CLASS_NAMES, box_centers, detect_batch
+from smart_parking.framestore import INDEX_FILE, FrameStore
+from smart_parking.history import DEFAULT_STORE, OccupancyStore, from_store_time, to_store_time
+from smart_parking.models import get_detector
+from smart_parking.motion import MotionGate
+from smart_parking.roi import roi_pixel_ratio, spot_rois
 
 # Define polygon as list of (x, y) tuples
 polygon = np.array([
@@ -18,67 +24,280 @@ polygon = np.array([
     (30, 450)
 ], dtype=np.int32)
 
-# Parent folder containing all subfolders
-parent_folder = 'pred_model/moments'
-output_log_path = os.path.join(parent_folder, 'vehicle_count_log.txt')
 
-# Open a single log file for all entries
-with open(output_log_path, 'w') as log_file:
-    # Iterate through each subfolder
+# ---------- Collect frames to process ----------
+def list_frames(parent_folder, every=4):
+    # Jobs are (subfolder, filename) for image folders and (subfolder, frame
+    # number) for frame stores written by breaker.py; stores are already
+    # sampled by time, so every only thins image folders
+    jobs = []
     for subfolder in sorted(os.listdir(parent_folder)):
         input_folder = os.path.join(parent_folder, subfolder)
         if not os.path.isdir(input_folder):
             continue
+        if FrameStore.is_store(input_folder):
+            jobs.extend((subfolder, i) for i in range(len(FrameStore(input_folder))))
+            continue
+        # annotated_*.png are this script's own output (--save-annotated)
+        frames = sorted(f for f in os.listdir(input_folder)
+                        if f.lower().endswith('.png') and not f.startswith('annotated_'))
+        jobs.extend((subfolder, filename) for filename in frames[::every])
+    return jobs
+
+
+# ---------- Prefetch and decode in a worker pool ----------
+def open_stores(parent_folder, jobs):
+    return {subfolder: FrameStore(os.path.join(parent_folder, subfolder))
+            for subfolder in {job[0] for job in jobs if isinstance(job[1], int)}}
+
+
+def iter_batches(parent_folder, jobs, batch_size, workers, stores=None):
+    # cv2.imread releases the GIL, so a thread pool decodes in parallel while
+    # the main thread runs inference. At most 2 batches are decoded ahead.
+    # Frame store frames are memory-mapped views and need no decoding.
+    stores = stores if stores is not None else open_stores(parent_folder, jobs)
+
+    def read(job):
+        if isinstance(job[1], int):
+            return stores[job[0]].frame(job[1])
+        return cv2.imread(os.path.join(parent_folder, *job))
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        remaining = iter(jobs)
+        pending = deque()
+        for job in remaining:
+            pending.append((job, pool.submit(read, job)))
+            if len(pending) >= 2 * batch_size:
+                break
+
+        batch = []
+        while pending:
+            job, future = pending.popleft()
+            next_job = next(remaining, None)
+            if next_job is not None:
+                pending.append((next_job, pool.submit(read, next_job)))
+
+            batch.append((job, future.result()))
+            if len(batch) == batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+
+def filename_seconds(filename):
+    # moment_104501.png → 10*3600 + 45*60 + 1
+    hhmmss = filename.replace('moment_', '')[:6]
+    if not hhmmss.isdigit():
+        return None
+    return int(hhmmss[:2]) * 3600 + int(hhmmss[2:4]) * 60 + int(hhmmss[4:6])
+
+
+def frame_clock(job, stores, year, folder_days):
+    # (label for the log, datetime or None) of a job
+    subfolder, name = job
+    if isinstance(name, int):
+        t = int(stores[subfolder].times()[name])
+        if t < 0:
+            return f"{subfolder}#{name:05d}", None
+        when = from_store_time(t)
+        return when.strftime('%H%M%S'), when
+
+    # Extract timestamp from filename: moment_104501.png → 104501
+    time_str = name.replace('moment_', '').replace('.png', '')
+    seconds = filename_seconds(name)
+    if seconds is None:
+        return time_str, None
+    if subfolder not in folder_days:
+        day = folder_date(subfolder, year)
+        folder_days[subfolder] = datetime.combine(day, datetime.min.time())
+    return time_str, folder_days[subfolder] + timedelta(seconds=seconds)
+
+
+def folder_date(subfolder, year):
+    # Day folders are named like 5_jun
+    try:
+        return datetime.strptime(f"{subfolder} {year}", "%d_%b %Y").date()
+    except ValueError:
+        print(f"⚠️ Cannot read a date from folder '{subfolder}', recording it as today")
+        return date.today()
+
+
+# ---------- Counting ----------
+def count_inside_polygon(boxes):
+    count = 0
+    for cx, cy in box_centers(boxes):
+        if cv2.pointPolygonTest(polygon, (float(cx), float(cy)), False) >= 0:
+            count += 1
+    return count
+
+
+def annotate(img, boxes, classes):
+    for (x1, y1, x2, y2), cls in zip(boxes.astype(int), classes):
+        label = CLASS_NAMES.get(int(cls), "object")
+        cv2.rectangle(img, (x1, y1), (x2, y2), (0, 255, 0), 2)
+        cv2.putText(img, label, (x1, y1 - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.9, (0, 255, 0), 2)
+    cv2.polylines(img, [polygon], isClosed=True, color=(255, 0, 0), thickness=2)
+    return img
+
+
+# ---------- Resumable checkpoints ----------
+def frames_signature(parent_folder, jobs, every):
+    # The checkpoint only counts jobs, so it is tied to the frames it counted
+    # through: the input folder, the sampling, and the name, size and
+    # modification time of every image and frame store index
+    digest = hashlib.sha1(f"{os.path.abspath(parent_folder)}|{every}|{len(jobs)}".encode())
+    sources = sorted({os.path.join(job[0], INDEX_FILE if isinstance(job[1], int) else job[1]) for job in jobs})
+    for source in sources:
+        st = os.stat(os.path.join(parent_folder, source))
+        digest.update(f"|{source}|{st.st_size}|{st.st_mtime_ns}".encode())
+    return digest.hexdigest()
+
+
+def load_checkpoint(checkpoint_path, signature=None):
+    # (jobs done, log size in bytes when they were)
+    if not os.path.exists(checkpoint_path):
+        return 0, 0
+    with open(checkpoint_path) as f:
+        checkpoint = json.load(f)
+    if checkpoint.get("signature") != signature:
+        print("⚠️ The frames changed since the checkpoint was written, starting over")
+        return 0, 0
+    return checkpoint["done"], checkpoint.get("log_offset", 0)
+
+
+def save_checkpoint(checkpoint_path, done, signature=None, log_offset=0):
+    tmp_path = checkpoint_path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({"done": done, "signature": signature, "log_offset": log_offset}, f)
+    os.replace(tmp_path, checkpoint_path)
+
+
+# ---------- Pipeline ----------
+def run(parent_folder, output_log_path, model, batch_size=8, workers=4, every=4,
+        resume=False, save_annotated=False, motion_threshold=None, max_stale=600.0,
+        roi=False, roi_padding=64, imgsz=None, store=None, camera_id="cam0", year=None):
+    checkpoint_path = output_log_path + ".ckpt"
+    jobs = list_frames(parent_folder, every=every)
+    stores = open_stores(parent_folder, jobs)
+    signature = frames_signature(parent_folder, jobs, every)
+    done, log_offset = load_checkpoint(checkpoint_path, signature) if resume else (0, 0)
+    if done and (not os.path.exists(output_log_path) or os.path.getsize(output_log_path) < log_offset):
+        print(f"⚠️ {output_log_path} is shorter than at the checkpoint, starting over")
+        done = 0
+    if done:
+        print(f"⏩ Resuming after {done}/{len(jobs)} frames")
 
-        frame_index = 0
-        print(f"🔍 Processing folder: {subfolder}")
+    # With a motion threshold, frames where the counting polygon did not change
+    # since the last detection reuse that detection's count
+    gate = None
+    gate_folder = None
+    last_count = 0
 
-        for filename in sorted(os.listdir(input_folder)):
-            if frame_index % 4 != 0:
-                frame_index += 1
-                continue
+    # With roi, YOLO only sees the padded bounding box of the counting polygon
+    rois = None
+    detect_options = {"imgsz": imgsz} if imgsz else {}
 
-            if not filename.lower().endswith('.png'):
-                continue
+    # Counts also go to the columnar occupancy history, dated by day folder;
+    # times already recorded (a re-run over the same frames) are skipped
+    history = store.writer(camera_id, skip_recorded=True) if store is not None else None
+    year = year or date.today().year
+    folder_days = {}
 
-            image_path = os.path.join(input_folder, filename)
-            img = cv2.imread(image_path)
-            if img is None:
-                continue
+    try:
+        # Single buffered writer; the checkpoint is only advanced after a flush
+        with open(output_log_path, 'a' if done else 'w', buffering=1 << 16) as log_file:
+            if done:
+                # Lines flushed after the last checkpoint are written again below
+                log_file.truncate(log_offset)
+            for batch in iter_batches(parent_folder, jobs[done:], batch_size, workers, stores):
+                readable = [(job, img) for job, img in batch if img is not None]
+                if roi and rois is None and readable:
+                    rois = spot_rois([polygon], readable[0][1].shape, padding=roi_padding)
+                    print(f"Detecting on {roi_pixel_ratio(rois, readable[0][1].shape):.0%} of each frame")
+                detect = [True] * len(readable)
+                clocks = [frame_clock(job, stores, year, folder_days) for job, _ in readable]
+                if motion_threshold is not None:
+                    for i, ((subfolder, filename), img) in enumerate(readable):
+                        if gate is None:
+                            gate = MotionGate([polygon], img.shape, threshold=motion_threshold,
+                                              max_stale=max_stale)
+                        if subfolder != gate_folder:
+                            gate.reset()
+                            gate_folder = subfolder
+                        # Frames without a time skip the stale check instead of
+                        # mixing a frame counter into the store-time clock
+                        when = clocks[i][1]
+                        detect[i] = gate.should_detect(img, None if when is None else to_store_time(when))
 
-            results = model(img, classes=target_classes)
-            count_inside_polygon = 0
+                to_detect = [img for (_, img), d in zip(readable, detect) if d]
+                detections = iter(detect_batch(model, to_detect, rois=rois, return_classes=True,
+                                               **detect_options))
+                for ((subfolder, filename), img), detected, (time_str, when) in zip(readable, detect, clocks):
+                    if detected:
+                        boxes, classes = next(detections)
+                        last_count = count_inside_polygon(boxes)
 
-            for result in results:
-                boxes = result.boxes
-                for box in boxes:
-                    x1, y1, x2, y2 = map(int, box.xyxy[0].cpu().numpy())
-                    cls = int(box.cls[0].cpu().numpy())
-                    cx, cy = (x1 + x2) // 2, (y1 + y2) // 2
+                    log_file.write(f"{time_str}: {last_count} vehicles\n")
+                    if history is not None and when is not None:
+                        history.append(when, count=last_count)
 
-                    if cv2.pointPolygonTest(polygon, (cx, cy), False) >= 0:
-                        count_inside_polygon += 1
+                    if save_annotated and detected:
+                        name = filename if isinstance(filename, str) else f"frame_{filename:05d}.png"
+                        annotated_path = os.path.join(parent_folder, subfolder, 'annotated_' + name)
+                        cv2.imwrite(annotated_path, annotate(np.array(img), boxes, classes))
 
-                    label = class_names.get(cls, "object")
-                    cv2.rectangle(img, (x1, y1), (x2, y2), (0, 255, 0), 2)
-                    cv2.putText(img, label, (x1, y1 - 10),
-                                cv2.FONT_HERSHEY_SIMPLEX, 0.9, (0, 255, 0), 2)
+                done += len(batch)
+                log_file.flush()
+                if history is not None:
+                    history.flush()
+                save_checkpoint(checkpoint_path, done, signature, log_file.tell())
+                print(f"🔍 {done}/{len(jobs)} frames ({batch[-1][0][0]}/{batch[-1][0][1]})")
+    finally:
+        # Buffered history records are written even when the run fails
+        if history is not None:
+            history.close()
 
-            cv2.polylines(img, [polygon], isClosed=True, color=(255, 0, 0), thickness=2)
+    if os.path.exists(checkpoint_path):  # never written when there was nothing to count
+        os.remove(checkpoint_path)
+    if history is not None and history.skipped:
+        print(f"⏭️ {history.skipped} counts were already in the occupancy history")
+    if gate is not None:
+        print(gate.summary())
+    print(f"✅ Combined log saved at: {output_log_path}")
 
-            # Extract timestamp from filename: moment_104501.png → 104501
-            time_str = filename.replace('moment_', '').replace('.png', '')
 
-            # Log entry: just the timestamp and vehicle count
-            log_file.write(f"{time_str}: {count_inside_polygon} vehicles\n")
-            print(f"{filename} → {count_inside_polygon} vehicles")
+def main():
+    parser = argparse.ArgumentParser(description="Count vehicles in every CCTV moment folder.")
+    parser.add_argument("--input", default="pred_model/moments", help="parent folder containing all subfolders")
+    parser.add_argument("--log", help="output log (default: <input>/vehicle_count_log.txt)")
+    parser.add_argument("--model", default="yolov8l.pt")
+    parser.add_argument("--export", choices=["onnx", "openvino"], help="run an exported CPU build of the detector")
+    parser.add_argument("--workers", type=int, default=4, help="image decoding threads")
+    parser.add_argument("--batch-size", type=int, default=8, help="frames per YOLO call")
+    parser.add_argument("--every", type=int, default=4, help="keep every Nth frame of each folder")
+    parser.add_argument("--resume", action="store_true", help="continue from the last checkpoint")
+    parser.add_argument("--save-annotated", action="store_true")
+    parser.add_argument("--roi", action="store_true", help="detect only around the counting polygon")
+    parser.add_argument("--roi-padding", type=int, default=64, help="pixels added around the polygon crop")
+    parser.add_argument("--imgsz", type=int, help="detector input size")
+    parser.add_argument("--store", default=DEFAULT_STORE, help="occupancy history folder ('' to disable)")
+    parser.add_argument("--camera", default="cam0", help="camera id in the occupancy history")
+    parser.add_argument("--year", type=int, help="year of the day folders (default: current year)")
+    parser.add_argument("--motion-threshold", type=float,
+                        help="only re-run detection when the polygon's mean pixel change exceeds this (0-255)")
+    parser.add_argument("--max-stale", type=float, default=600.0,
+                        help="seconds of footage after which detection re-runs even without motion")
+    args = parser.parse_args()
 
-            frame_index += 1
+    output_log_path = args.log or os.path.join(args.input, 'vehicle_count_log.txt')
+    model = get_detector(args.model, export=args.export)
+    run(args.input, output_log_path, model, batch_size=args.batch_size, workers=args.workers,
+        every=args.every, resume=args.resume, save_annotated=args.save_annotated,
+        motion_threshold=args.motion_threshold, max_stale=args.max_stale, roi=args.roi,
+        roi_padding=args.roi_padding, imgsz=args.imgsz,
+        store=OccupancyStore(args.store) if args.store else None, camera_id=args.camera, year=args.year)
 
-            # Optional: save annotated frame
-            # cv2.imwrite(os.path.join(input_folder, 'annotated_' + filename), img)
 
-print(f"✅ Combined log saved at: {output_log_path}")
-cv2.imshow('Last Processed Frame', img)
-cv2.waitKey(0)
-cv2.destroyAllWindows()
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+import argparse
+import os
+import queue
+import threading
+import time
+from datetime import date, datetime, timedelta
+
+import cv2
+
+from pred_model.detector import annotate, count_inside_polygon, polygon
+from pred_model.renamer import DigitCache, digit_cache, predict_timestamps
+from smart_parking.detection import detect_batch
+from smart_parking.framestore import sample_video, video_start_time
+from smart_parking.history import DEFAULT_STORE, OccupancyStore
+from smart_parking.models import get_detector
+from smart_parking.motion import MotionGate
+from smart_parking.roi import spot_rois
+
+
+# ---------- Decode ahead in a background thread ----------
+def prefetch(video_path, every_s, max_frames):
+    # Yields (video_ms, frame) while the next frames are decoded in parallel
+    # with OCR and detection on the current batch
+    frames = queue.Queue(maxsize=max_frames)
+    done = object()
+    stop = threading.Event()
+    stats = {}
+
+    def put(item):
+        # Gives up once the consumer has stopped reading
+        while not stop.is_set():
+            try:
+                frames.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def produce():
+        cap = cv2.VideoCapture(video_path)
+        try:
+            for item in sample_video(cap, every_s=every_s, stats=stats):
+                if not put(item):
+                    break
+        finally:
+            cap.release()
+            put(done)
+
+    threading.Thread(target=produce, daemon=True).start()
+    try:
+        while True:
+            item = frames.get()
+            if item is done:
+                return
+            yield item
+    finally:
+        # Also runs when the consumer stops early (an error, or the generator closed)
+        stop.set()
+
+
+def batches(items, size):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def ocr_seconds(hhmmss):
+    # None for impossible readings (e.g. a digit misread as 7 in the tens of minutes)
+    h, m, s = int(hhmmss[:2]), int(hhmmss[2:4]), int(hhmmss[4:6])
+    if h > 23 or m > 59 or s > 59:
+        return None
+    return h * 3600 + m * 60 + s
+
+
+# Consecutive readings more than 12 h behind the clock before it counts as
+# past midnight; a single misread must not move the rest of the video a day
+WRAP_READINGS = 3
+
+
+# ---------- Single-pass ingest ----------
+def ingest(video_path, model, day=None, every_s=1.0, batch_size=16, history=None, log_file=None,
+           annotated_dir=None, motion_threshold=None, max_stale=600.0, roi=False, roi_padding=64, imgsz=None,
+           cache=digit_cache):
+    # Reads the recording once: every sampled frame is OCR'd for the clock
+    # overlay and counted by the detector while still in memory, and the
+    # count is recorded under the OCR'd time. Nothing is written to disk
+    # except the log, the history and, if asked for, annotated frames.
+    start = video_start_time(video_path)
+    day = day or (start.date() if start else date.today())
+    midnight = datetime.combine(day, datetime.min.time())
+    previous_seconds = None
+    wrapped = 0
+    gate = None
+    rois = None
+    last_count = 0
+    detect_options = {"imgsz": imgsz} if imgsz else {}
+    counts = {"frames": 0, "detected": 0, "unreadable": 0}
+    if annotated_dir:
+        os.makedirs(annotated_dir, exist_ok=True)
+
+    for batch in batches(prefetch(video_path, every_s, 2 * batch_size), batch_size):
+        frames = [frame for _, frame in batch]
+        stamps = predict_timestamps(frames, cache=cache)
+
+        # Wall-clock time of every frame: OCR first, the file name's start time as fallback
+        times = []
+        for (video_ms, _), stamp in zip(batch, stamps):
+            seconds = ocr_seconds(stamp)
+            if seconds is not None and previous_seconds is not None and seconds < previous_seconds - 12 * 3600:
+                wrapped += 1
+                if wrapped < WRAP_READINGS:
+                    seconds = None  # a misread until the next readings confirm it
+                else:
+                    midnight += timedelta(days=1)  # the clock wrapped past midnight
+                    wrapped = 0
+            elif seconds is not None:
+                wrapped = 0
+            if seconds is not None:
+                previous_seconds = seconds
+                times.append(midnight + timedelta(seconds=seconds))
+            elif start is not None:
+                times.append(start + timedelta(milliseconds=video_ms))
+            else:
+                times.append(None)
+                counts["unreadable"] += 1
+
+        if roi and rois is None:
+            rois = spot_rois([polygon], frames[0].shape, padding=roi_padding)
+        detect = [True] * len(frames)
+        if motion_threshold is not None:
+            if gate is None:
+                gate = MotionGate([polygon], frames[0].shape, threshold=motion_threshold, max_stale=max_stale)
+            # The video position is the one clock every frame has; OCR'd
+            # times can be missing or misread
+            detect = [gate.should_detect(frame, video_ms / 1000) for video_ms, frame in batch]
+
+        detections = iter(detect_batch(model, [f for f, d in zip(frames, detect) if d], rois=rois,
+                                       return_classes=True, **detect_options))
+        for frame, when, detected in zip(frames, times, detect):
+            counts["frames"] += 1
+            if detected:
+                boxes, classes = next(detections)
+                last_count = count_inside_polygon(boxes)
+                counts["detected"] += 1
+                if annotated_dir and when is not None:
+                    path = os.path.join(annotated_dir, f"moment_{when.strftime('%H%M%S')}.png")
+                    cv2.imwrite(path, annotate(frame, boxes, classes))
+            if when is None:
+                continue
+            if log_file is not None:
+                log_file.write(f"{when.strftime('%H%M%S')}: {last_count} vehicles\n")
+            if history is not None:
+                history.append(when, count=last_count)
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Count vehicles straight from CCTV recordings in one pass.")
+    parser.add_argument("videos", nargs="+", help="recordings, e.g. pred_model/videos/*.mov")
+    parser.add_argument("--every", type=float, default=1.0, help="seconds of footage between processed frames")
+    parser.add_argument("--day", help="YYYY-MM-DD of the footage (default: from the file name, else today)")
+    parser.add_argument("--model", default="yolov8l.pt")
+    parser.add_argument("--export", choices=["onnx", "openvino"], help="run an exported CPU build of the detector")
+    parser.add_argument("--batch-size", type=int, default=16, help="frames per OCR and YOLO call")
+    parser.add_argument("--log", help="also append 'HHMMSS: N vehicles' lines to this file")
+    parser.add_argument("--store", default=DEFAULT_STORE, help="occupancy history folder ('' to disable)")
+    parser.add_argument("--camera", default="cam0", help="camera id in the occupancy history")
+    parser.add_argument("--save-annotated", metavar="DIR", help="write annotated frames to this folder")
+    parser.add_argument("--roi", action="store_true", help="detect only around the counting polygon")
+    parser.add_argument("--roi-padding", type=int, default=64, help="pixels added around the polygon crop")
+    parser.add_argument("--imgsz", type=int, help="detector input size")
+    parser.add_argument("--motion-threshold", type=float,
+                        help="only re-run detection when the polygon's mean pixel change exceeds this (0-255)")
+    parser.add_argument("--max-stale", type=float, default=600.0,
+                        help="seconds of footage after which detection re-runs even without motion")
+    parser.add_argument("--cache-size", type=int, default=4096, help="cached digit crops (0 disables the cache)")
+    args = parser.parse_args()
+
+    model = get_detector(args.model, export=args.export)
+    # Times already in the history (a recording ingested before) are skipped
+    history = OccupancyStore(args.store).writer(args.camera, skip_recorded=True) if args.store else None
+    cache = DigitCache(args.cache_size) if args.cache_size > 0 else None
+    day = datetime.strptime(args.day, "%Y-%m-%d").date() if args.day else None
+    log_file = open(args.log, "a", buffering=1 << 16) if args.log else None
+    try:
+        for video_path in args.videos:
+            started = time.perf_counter()
+            counts = ingest(video_path, model, day=day, every_s=args.every, batch_size=args.batch_size,
+                            history=history, log_file=log_file, annotated_dir=args.save_annotated,
+                            motion_threshold=args.motion_threshold, max_stale=args.max_stale, roi=args.roi,
+                            roi_padding=args.roi_padding, imgsz=args.imgsz, cache=cache)
+            elapsed = time.perf_counter() - started
+            print(f"✅ {os.path.basename(video_path)}: {counts['frames']} frames "
+                  f"({counts['detected']} detected, {counts['unreadable']} without a time) "
+                  f"in {elapsed:.1f}s ({counts['frames'] / max(elapsed, 1e-9):.1f} frames/sec)")
+    finally:
+        if history is not None:
+            history.close()
+        if log_file is not None:
+            log_file.close()
+    if cache is not None:
+        print(f"🗃️ Digit cache: {cache.hits} hits, {cache.misses} misses ({cache.hit_rate():.1%} hit rate)")
+
+
+if __name__ == "__main__":
+    main()
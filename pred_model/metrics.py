@@ -1,8 +1,8 @@
-import numpy as np
 import matplotlib.pyplot as plt
 import matplotlib.dates as mdates
 from datetime import datetime, timedelta
-import joblib
+
+from smart_parking.prediction import get_prediction_table
 
 # ----------- Utility Functions -----------
 
@@ -12,24 +12,14 @@ def hhmm_to_seconds(h, m):
 def seconds_to_hhmm(seconds):
     return datetime.strptime(str(int(seconds // 3600)).zfill(2) + ':' + str(int((seconds % 3600) // 60)).zfill(2), "%H:%M")
 
-# ----------- Load Model -----------
-
-model = joblib.load("parking_predictor_model.joblib")
-print("✅ Loaded model: parking_predictor_model.joblib")
-
 # ----------- Generate Predictions for Entire Day -----------
 
 interval_minutes = 5  # change to 1 for every minute
-start_time = 0           # 00:00
-end_time = 24 * 3600     # 24:00
-
-times = []
-predicted_counts = []
 
-for seconds in range(start_time, end_time, interval_minutes * 60):
-    times.append(seconds_to_hhmm(seconds))
-    predicted = model.predict(np.array([[seconds]]))[0]
-    predicted_counts.append(predicted)
+# One vectorized predict for the whole day (today, for the dated compact model), cached per model version
+table = get_prediction_table(resolution_s=interval_minutes * 60)
+seconds, predicted_counts = table.curve()
+times = [seconds_to_hhmm(s) for s in seconds]
 
 # ----------- Plot -----------
 
@@ -1,7 +1,17 @@
+import argparse
+import json
+import os
 import re
+import time
+from datetime import date, datetime, timedelta
+
 import numpy as np
-from sklearn.ensemble import RandomForestRegressor
-import joblib
+
+from smart_parking.history import DEFAULT_STORE, SECONDS_PER_DAY, OccupancyStore, resample_counts
+from smart_parking.predictor import DEFAULT_CAPACITY, OccupancyPredictor, camera_capacities, store_day
+
+LEGACY_MODEL = "parking_predictor_model.joblib"
+MODEL = "parking_predictor_model.npz"
 
 # ----------- Time conversion function -----------
 
@@ -27,6 +37,29 @@ def load_data_from_files(file_list):
                     y.append(vehicles)
     return np.array(X).reshape(-1, 1), np.array(y)
 
+# ----------- Load data from the occupancy history -----------
+
+def load_samples_from_store(store, capacities, cameras=None, start_day=None, end_day=None, step_s=60):
+    # Full store times (date and time of day) with each sample's camera capacity
+    times, counts, capacity = [], [], []
+    for camera_id in cameras or store.cameras():
+        records = store.query(camera_id, start_day=start_day, end_day=end_day)
+        t, c = resample_counts(records, step_s)
+        times.append(t)
+        counts.append(c.astype(int))
+        capacity.append(np.full(len(t), capacities.get(camera_id, DEFAULT_CAPACITY)))
+    if not times:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=int), np.zeros(0)
+    return np.concatenate(times), np.concatenate(counts), np.concatenate(capacity)
+
+
+def load_samples_from_files(file_list, day, capacity):
+    # Logs only hold the time of day, so they are dated with day
+    X, y = load_data_from_files(file_list)
+    times = store_day(day) * SECONDS_PER_DAY + X[:, 0].astype(np.int64)
+    return times, y, np.full(len(y), capacity)
+
+
 # ----------- List of all txt files -----------
 
 txt_files = [
@@ -34,29 +67,176 @@ txt_files = [
     # Add more file paths here
 ]
 
+# ----------- Prediction function -----------
+
+def predict_probability(model, hhmmss, max_capacity=None, day=None, camera=None):
+    # Works with both the compact predictor (dated, per-camera capacity) and
+    # the legacy time-of-day forest
+    seconds = time_to_seconds(hhmmss)
+    if isinstance(model, OccupancyPredictor):
+        when = store_day(day or date.today()) * SECONDS_PER_DAY + seconds
+        predicted_vehicles = model.predict_count(np.array([when]), camera)[0]
+        max_capacity = max_capacity or model.capacity(camera)
+    else:
+        predicted_vehicles = model.predict(np.array([[seconds]]))[0]
+        max_capacity = max_capacity or DEFAULT_CAPACITY
+    prob = max(0.0, min(1.0, 1 - predicted_vehicles / max_capacity))
+    return prob, predicted_vehicles
+
+# ----------- Legacy model and benchmark -----------
+
+def train_legacy(times, counts, n_jobs=None):
+    # The original single-feature forest: time of day only
+    from sklearn.ensemble import RandomForestRegressor
+    model = RandomForestRegressor(n_estimators=100, random_state=42, n_jobs=n_jobs)
+    model.fit((times % SECONDS_PER_DAY).reshape(-1, 1), counts)
+    return model
+
+
+def median_seconds(fn, repeats=50):
+    samples = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    return float(np.median(samples))
+
+
+def benchmark(times, counts, capacity, capacities, n_estimators, n_jobs, folder="."):
+    # Trains both models on all but the last day, then compares training time,
+    # file size, load time, prediction latency and error on the held-out day
+    import joblib
+
+    days = times // SECONDS_PER_DAY
+    test = days == days.max()
+    if test.all():
+        test = np.zeros(len(times), dtype=bool)
+        print("⚠️ Only one day of history, the error is measured on the training data")
+    train = ~test if test.any() else np.ones(len(times), dtype=bool)
+    test = test if test.any() else train
+
+    legacy_path = os.path.join(folder, "benchmark_legacy.joblib")
+    compact_path = os.path.join(folder, "benchmark_compact.npz")
+
+    started = time.perf_counter()
+    legacy = train_legacy(times[train], counts[train])
+    legacy_train = time.perf_counter() - started
+    joblib.dump(legacy, legacy_path)
+
+    started = time.perf_counter()
+    compact = OccupancyPredictor.fit(times[train], counts[train], capacity[train], n_estimators=n_estimators,
+                                     n_jobs=n_jobs, capacities=capacities)
+    compact_train = time.perf_counter() - started
+    compact.save(compact_path)
+
+    legacy_load = median_seconds(lambda: joblib.load(legacy_path), repeats=5)
+    compact_load = median_seconds(lambda: OccupancyPredictor.load(compact_path), repeats=5)
+
+    one_legacy = np.array([[times[0] % SECONDS_PER_DAY]])
+    one_compact = times[:1]
+    day_seconds = np.arange(0, SECONDS_PER_DAY, 60)
+    day_compact = store_day(date.today()) * SECONDS_PER_DAY + day_seconds
+    single_capacity = capacity[:1]
+    rows = [
+        ("train (s)", legacy_train, compact_train),
+        ("file (MB)", os.path.getsize(legacy_path) / 1e6, os.path.getsize(compact_path) / 1e6),
+        ("load (ms)", legacy_load * 1e3, compact_load * 1e3),
+        ("1 query (ms)", median_seconds(lambda: legacy.predict(one_legacy)) * 1e3,
+         median_seconds(lambda: compact.predict_fraction(one_compact, single_capacity)) * 1e3),
+        ("1440 queries (ms)", median_seconds(lambda: legacy.predict(day_seconds.reshape(-1, 1)), 10) * 1e3,
+         median_seconds(lambda: compact.predict_fraction(day_compact, single_capacity), 10) * 1e3),
+        ("held-out MAE", np.abs(legacy.predict((times[test] % SECONDS_PER_DAY).reshape(-1, 1)) - counts[test]).mean(),
+         np.abs(compact.predict_fraction(times[test], capacity[test]) * capacity[test] - counts[test]).mean()),
+    ]
+    os.remove(legacy_path)
+    os.remove(compact_path)
+
+    print(f"{'':<20}{'joblib forest':>15}{'compact':>12}")
+    for name, old, new in rows:
+        print(f"{name:<20}{old:>15.3f}{new:>12.3f}")
+
 # ----------- Load data and train model -----------
 
-X, y = load_data_from_files(txt_files)
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train the parking occupancy predictor.")
+    parser.add_argument("--store", default=DEFAULT_STORE, help="occupancy history folder")
+    parser.add_argument("--camera", action="append", help="camera id to train on (default: all)")
+    parser.add_argument("--step", type=int, default=60, help="seconds between resampled history samples")
+    parser.add_argument("--logs", nargs="*", help="train on vehicle_count_log.txt files instead")
+    parser.add_argument("--day", help="YYYY-MM-DD the --logs were recorded on (default: today)")
+    parser.add_argument("--cameras", help="cameras.json whose spot files give each camera's capacity")
+    parser.add_argument("--capacity", type=int, default=DEFAULT_CAPACITY,
+                        help="spots per camera when it is not in --cameras")
+    parser.add_argument("--model", default=MODEL, help="compact model file")
+    parser.add_argument("--trees", type=int, default=40, help="trees in a new model (--update adds a quarter as many)")
+    parser.add_argument("--max-trees", type=int, default=120, help="oldest trees are dropped beyond this")
+    parser.add_argument("--n-jobs", type=int, default=-1, help="training processes (-1: all cores)")
+    parser.add_argument("--update", action="store_true",
+                        help="add trees for the days after the model's last training day instead of retraining")
+    parser.add_argument("--window-days", type=int, default=14,
+                        help="days of history each --update trains on (at least 7, so every weekday is seen)")
+    parser.add_argument("--legacy", action="store_true", help=f"train the time-of-day forest into {LEGACY_MODEL}")
+    parser.add_argument("--benchmark", action="store_true", help="compare the compact model with the legacy forest")
+    args = parser.parse_args()
 
-model = RandomForestRegressor(n_estimators=100, random_state=42)
-model.fit(X, y)
+    capacities = {}
+    if args.cameras:
+        with open(args.cameras) as f:
+            capacities = camera_capacities(json.load(f))
 
-joblib.dump(model, "parking_predictor_model.joblib")
-print("✅ RandomForest model saved as 'parking_predictor_model.joblib'")
+    # Only complete days: today's history is still being recorded, and a
+    # model trained on part of it would skip the rest at the next --update
+    end_day = date.today() - timedelta(days=1)
+    existing = None
+    start_day = None
+    new_days = True
+    if args.update and os.path.exists(args.model):
+        existing = OccupancyPredictor.load(args.model)
+        first_new = existing.trained_until() + timedelta(days=1)
+        new_days = first_new <= end_day
+        # New days plus enough older ones to cover every weekday
+        start_day = min(first_new, end_day - timedelta(days=max(args.window_days, 7) - 1))
+        print(f"🔁 Updating {args.model} ({existing.summary()}) with days {start_day} to {end_day}")
 
-# ----------- Prediction function -----------
+    store = OccupancyStore(args.store)
+    if not new_days:
+        times, counts, capacity = np.zeros(0, dtype=np.int64), np.zeros(0, dtype=int), np.zeros(0)
+    elif args.logs is None and store.cameras():
+        cameras = args.camera or store.cameras()
+        capacities = {c: capacities.get(c) or store.n_spots(c) or args.capacity for c in cameras}
+        times, counts, capacity = load_samples_from_store(store, capacities, cameras=cameras, start_day=start_day,
+                                                          end_day=end_day, step_s=args.step)
+        print(f"📚 Loaded {len(counts)} records from occupancy history '{args.store}'")
+    else:
+        day = datetime.strptime(args.day, "%Y-%m-%d").date() if args.day else date.today()
+        times, counts, capacity = load_samples_from_files(args.logs or txt_files, day, args.capacity)
+        capacities = capacities or {"cam0": args.capacity}
 
-def predict_probability(hhmmss, max_capacity=35):
-    seconds = time_to_seconds(hhmmss)
-    predicted_vehicles = model.predict(np.array([[seconds]]))[0]
-    prob = max(0.0, min(1.0, 1 - predicted_vehicles / max_capacity))
-    return prob, predicted_vehicles
+    if len(counts) == 0:
+        print("Nothing new to train on.")
+    elif args.benchmark:
+        benchmark(times, counts, capacity, capacities, args.trees, args.n_jobs)
+    elif args.legacy:
+        import joblib
+        joblib.dump(train_legacy(times, counts), LEGACY_MODEL)
+        print(f"✅ RandomForest model saved as '{LEGACY_MODEL}'")
+    else:
+        started = time.perf_counter()
+        if existing is not None:
+            model = existing.update(times, counts, capacity, n_estimators=max(1, args.trees // 4),
+                                    max_trees=args.max_trees, n_jobs=args.n_jobs, capacities=capacities)
+        else:
+            model = OccupancyPredictor.fit(times, counts, capacity, n_estimators=args.trees, n_jobs=args.n_jobs,
+                                           capacities=capacities)
+        model.save(args.model)
+        print(f"✅ Occupancy predictor saved as '{args.model}' in {time.perf_counter() - started:.1f}s "
+              f"({model.summary()})")
 
-# ----------- Example usage -----------
+    # ----------- Example usage -----------
 
-# query_time = input()  # HHMMSS format
-# prob, count = predict_probability(query_time)
+    # query_time = input()  # HHMMSS format
+    # prob, count = predict_probability(model, query_time)
 
-# print(f"At {query_time}:")
-# print(f"  Estimated vehicles: {count:.2f}")
-# print(f"  Probability of finding a spot: {prob:.2%}")
+    # print(f"At {query_time}:")
+    # print(f"  Estimated vehicles: {count:.2f}")
+    # print(f"  Probability of finding a spot: {prob:.2%}")
@@ -1,11 +1,12 @@
+import argparse
 import cv2
+import hashlib
 import numpy as np
 import os
-from tensorflow.keras.models import load_model
-from tensorflow.keras.preprocessing.image import img_to_array
+import time
+from collections import OrderedDict
 
-# Load the trained digit classification model
-model = load_model('digit_classifier_custom.h5')
+from smart_parking.models import get_digit_classifier
 
 # Coordinates for hour, minute, and second digits (x1, y1, x2, y2)
 digit_coords = [
@@ -17,28 +18,108 @@ digit_coords = [
     (431, 0, 452, 33),  # second units
 ]
 
-def predict_digit(img):
-    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-    gray = cv2.resize(gray, (30, 50))  # match model input size
-    gray = gray.astype('float32') / 255.0
-    gray = np.expand_dims(gray, axis=(0, -1))
-    pred = model.predict(gray, verbose=0)
-    return str(np.argmax(pred))
+# Place value of each digit when the six are read as one HHMMSS integer
+digit_weights = 10 ** np.arange(len(digit_coords) - 1, -1, -1)
+
+
+# ---------- Digit prediction cache ----------
+class DigitCache:
+    # LRU of classifier outputs keyed by a hash of the exact digit crop pixels.
+    # The clock overlay only changes once a second, so on 25 fps footage most
+    # crops have been classified already.
+
+    def __init__(self, max_entries=4096):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        digit = self.entries.get(key)
+        if digit is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return digit
+
+    def put(self, key, digit):
+        self.entries[key] = digit
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+digit_cache = DigitCache()
+
+
+def digit_key(crop):
+    return hashlib.blake2b(np.ascontiguousarray(crop).tobytes(), digest_size=16).digest()
+
+
+# ---------- Batched digit OCR ----------
+def prepare_digit(crop):
+    gray = cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY)
+    return cv2.resize(gray, (30, 50)).astype(np.float32) / 255.0  # match model input size
+
+
+def predict_timestamps(images, cache=digit_cache):
+    # Cached digits are reused; every other crop of every frame goes through
+    # one batched inference
+    if not images:
+        return []
+    crops = [image[y1:y2, x1:x2] for image in images for (x1, y1, x2, y2) in digit_coords]
+    digits = np.empty(len(crops), dtype=np.int64)
+
+    missing = {}
+    for i, crop in enumerate(crops):
+        key = digit_key(crop) if cache is not None else i
+        cached = cache.get(key) if cache is not None else None
+        if cached is None:
+            missing.setdefault(key, []).append(i)
+        else:
+            digits[i] = cached
+
+    if missing:
+        batch = np.stack([prepare_digit(crops[idx[0]]) for idx in missing.values()])[..., np.newaxis]
+        pred = get_digit_classifier().predict(batch, batch_size=len(batch), verbose=0)
+        for (key, idx), digit in zip(missing.items(), np.argmax(pred, axis=1)):
+            digits[idx] = digit
+            if cache is not None:
+                cache.put(key, int(digit))
+
+    values = digits.reshape(len(images), len(digit_coords)) @ digit_weights
+    return [f"{v:06d}" for v in values]
+
 
 def extract_timestamp_from_image(img_path):
     image = cv2.imread(img_path)
     if image is None:
         return None
-    digit_images = [image[y1:y2, x1:x2] for (x1, y1, x2, y2) in digit_coords]
-    digits = [predict_digit(d) for d in digit_images]
-    return f"{digits[0]}{digits[1]}{digits[2]}{digits[3]}{digits[4]}{digits[5]}"
+    return predict_timestamps([image])[0]
 
-def rename_all_images_in_folder(folder_path):
+
+def extract_timestamps(img_paths, cache=digit_cache):
+    images = [cv2.imread(p) for p in img_paths]
+    readable = [img for img in images if img is not None]
+    timestamps = iter(predict_timestamps(readable, cache=cache))
+    return [next(timestamps) if img is not None else None for img in images]
+
+
+def rename_all_images_in_folder(folder_path, batch_size=64, cache=digit_cache):
     used_names = {}
-    for filename in sorted(os.listdir(folder_path)):
-        if filename.lower().endswith(('.png', '.jpg', '.jpeg')):
-            img_path = os.path.join(folder_path, filename)
-            timestamp = extract_timestamp_from_image(img_path)
+    filenames = [f for f in sorted(os.listdir(folder_path))
+                 if f.lower().endswith(('.png', '.jpg', '.jpeg'))]
+    start = time.perf_counter()
+
+    for i in range(0, len(filenames), batch_size):
+        chunk = filenames[i:i + batch_size]
+        paths = [os.path.join(folder_path, f) for f in chunk]
+        for filename, img_path, timestamp in zip(chunk, paths, extract_timestamps(paths, cache)):
             if timestamp:
                 new_name = f"moment_{timestamp}"
                 count = used_names.get(new_name, 0)
@@ -54,6 +135,19 @@ def rename_all_images_in_folder(folder_path):
             else:
                 print(f"Skipped: {filename} (could not read)")
 
+    elapsed = time.perf_counter() - start
+    if filenames:
+        print(f"⏱️ {len(filenames)} frames in {elapsed:.1f}s ({len(filenames) / elapsed:.1f} frames/sec)")
+    if cache is not None:
+        print(f"🗃️ Digit cache: {cache.hits} hits, {cache.misses} misses ({cache.hit_rate():.1%} hit rate)")
+
+
 # === USAGE ===
-frames_folder = 'pred_model/moments/untitled'  # Change this to your folder path
-rename_all_images_in_folder(frames_folder)
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rename CCTV frames by their OCR'd timestamp.")
+    parser.add_argument("folder", nargs="?", default='pred_model/moments/untitled')
+    parser.add_argument("--batch-size", type=int, default=64, help="frames per classifier call")
+    parser.add_argument("--cache-size", type=int, default=4096, help="cached digit crops (0 disables the cache)")
+    args = parser.parse_args()
+    cache = DigitCache(args.cache_size) if args.cache_size > 0 else None
+    rename_all_images_in_folder(args.folder, batch_size=args.batch_size, cache=cache)
@@ -0,0 +1,240 @@
+import asyncio
+import json
+import re
+from datetime import datetime
+from urllib.parse import parse_qs
+
+import numpy as np
+
+from smart_parking.availability import PredictionUnavailable
+
+# Per-client SSE backlog; slower clients are disconnected and reconnect with a fresh snapshot
+SSE_BACKLOG = 256
+
+STATUS_TEXT = {200: "OK", 304: "Not Modified", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+               503: "Service Unavailable"}
+
+COORDS = re.compile(r"\s*(-?\d+(?:\.\d+)?)\s*,\s*(-?\d+(?:\.\d+)?)\s*")
+
+
+# ---------- Availability API ----------
+class AvailabilityAPI:
+    # Serves the lot's per-spot occupancy over HTTP from memory:
+    #   GET /spots            snapshot of all cameras
+    #   GET /spots/<camera>   snapshot of one camera
+    #   GET /events           Server-Sent Events: a snapshot, then only diffs
+    #   GET /stats            per-camera fps and lag
+    #   GET /arrivals?origin=<lon>,<lat>|<address>&origin=...&depart=<ISO time>
+    #                         chance of a spot on arrival from each origin
+    #                         (only with an ArrivalAvailability; 503 when there
+    #                         is neither a trained model nor a live count)
+    # Response bodies are encoded once per state change, not per request, so
+    # polling clients never touch the detector or re-serialize the state.
+
+    def __init__(self, state, host="0.0.0.0", port=8080, arrivals=None):
+        self.state = state
+        self.arrivals = arrivals
+        self.host = host
+        self.port = port
+        self.loop = None
+        self.version = 0
+        self.occupied = {}
+        self.known = {}  # False until a camera's first detection
+        self.bodies = {}
+        self.clients = set()
+        self._load_snapshot()
+
+    # ----- cached bodies -----
+    def _load_snapshot(self):
+        snapshot = self.state.snapshot()
+        for camera_id, info in snapshot["cameras"].items():
+            self.occupied[camera_id] = np.array(info["occupied"], dtype=bool)
+            self.known[camera_id] = info["known"]
+        self._encode()
+
+    def _camera_json(self, camera_id):
+        # Before its first detection a camera reports no spots, not all spots free
+        if not self.known.get(camera_id):
+            return {"known": False, "occupied": None, "empty": []}
+        occupied = self.occupied[camera_id]
+        return {"known": True, "occupied": occupied.astype(int).tolist(),
+                "empty": np.flatnonzero(~occupied).tolist()}
+
+    def _encode(self):
+        cameras = {cam: self._camera_json(cam) for cam in self.occupied}
+        self.bodies = {cam: json.dumps({"version": self.version, "camera": cam, **body}).encode()
+                       for cam, body in cameras.items()}
+        self.bodies[None] = json.dumps({"version": self.version, "cameras": cameras}).encode()
+
+    # ----- state changes -----
+    def attach(self, loop):
+        # LotState listeners run on the collector thread; hop onto the event loop
+        self.loop = loop
+        self.state.subscribe(lambda cam, occ: loop.call_soon_threadsafe(self.on_change, cam, occ))
+        # Detections between __init__ and now were not delivered to on_change;
+        # changes from here on are queued on the loop and applied after this
+        self.version += 1
+        self._load_snapshot()
+
+    def on_change(self, camera_id, occupied):
+        previous = self.occupied.get(camera_id) if self.known.get(camera_id) else None
+        occupied = np.asarray(occupied, dtype=bool).copy()
+        if previous is not None and np.array_equal(previous, occupied):
+            return
+        self.version += 1
+        self.occupied[camera_id] = occupied
+        self.known[camera_id] = True
+        self._encode()
+
+        if previous is None:
+            # No spot was reported free before the first detection
+            previous = np.ones_like(occupied)
+        diff = {
+            "version": self.version,
+            "camera": camera_id,
+            "freed": np.flatnonzero(previous & ~occupied).tolist(),
+            "taken": np.flatnonzero(~previous & occupied).tolist(),
+        }
+        self._broadcast(b"event: diff\ndata: " + json.dumps(diff).encode() + b"\n\n")
+
+    def _broadcast(self, message):
+        for client in list(self.clients):
+            try:
+                client.put_nowait(message)
+            except asyncio.QueueFull:
+                # Too far behind: end its stream so it reconnects and gets a snapshot
+                self.clients.discard(client)
+                while not client.empty():
+                    client.get_nowait()
+                client.put_nowait(None)
+
+    # ----- HTTP -----
+    async def serve_forever(self):
+        self.attach(asyncio.get_running_loop())
+        server = await asyncio.start_server(self._handle, self.host, self.port, backlog=4096)
+        print(f"🌐 Availability API on http://{self.host}:{self.port}/spots")
+        async with server:
+            await server.serve_forever()
+
+    async def _handle(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                parts = request_line.decode("latin-1").split()
+                if len(parts) < 2:
+                    break
+                method, (path, _, query) = parts[0], parts[1].partition("?")
+                path = path.rstrip("/")
+                keep_alive = headers.get("connection", "").lower() != "close"
+
+                if method != "GET":
+                    await self._respond(writer, 405, b"{}", keep_alive)
+                elif path == "/events":
+                    await self._stream(writer)
+                    break
+                elif path == "/arrivals" and self.arrivals is not None:
+                    await self._arrivals(writer, query, keep_alive)
+                else:
+                    await self._route(writer, path, headers, keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.CancelledError):
+            pass
+        finally:
+            writer.close()
+
+    async def _route(self, writer, path, headers, keep_alive):
+        if path == "/stats":
+            snapshot = self.state.snapshot()
+            stats = {cam: {k: info[k] for k in ("fps", "lag_ms", "updated")}
+                     for cam, info in snapshot["cameras"].items()}
+            await self._respond(writer, 200, json.dumps(stats).encode(), keep_alive)
+            return
+
+        if path == "/spots":
+            key = None
+        elif path.startswith("/spots/") and path[len("/spots/"):] in self.occupied:
+            key = path[len("/spots/"):]
+        else:
+            await self._respond(writer, 404, b'{"error": "not found"}', keep_alive)
+            return
+
+        etag = f'"{self.version}"'
+        if headers.get("if-none-match") == etag:
+            await self._respond(writer, 304, b"", keep_alive, etag=etag)
+        else:
+            await self._respond(writer, 200, self.bodies[key], keep_alive, etag=etag)
+
+    async def _arrivals(self, writer, query, keep_alive):
+        # Batch of origins answered concurrently (memoized per origin cell and
+        # departure bucket by the ArrivalAvailability)
+        params = parse_qs(query)
+        origins = []
+        for origin in params.get("origin", []):
+            match = COORDS.fullmatch(origin)
+            origins.append((float(match.group(1)), float(match.group(2))) if match else origin)
+        try:
+            departure = datetime.fromisoformat(params["depart"][0]) if "depart" in params else None
+        except ValueError:
+            departure = None
+            origins = []
+        if not origins:
+            await self._respond(writer, 400, b'{"error": "give origin=<lon>,<lat> or an address, '
+                                             b'and optionally depart=<ISO time>"}', keep_alive)
+            return
+
+        try:
+            estimates = await self.arrivals.query_many(origins, departure)
+        except PredictionUnavailable as e:
+            await self._respond(writer, 503, json.dumps({"error": str(e)}).encode(), keep_alive)
+            return
+        body = {"arrivals": [None if e is None else {
+            "origin": list(e.origin),
+            "distance_m": round(e.distance_m),
+            "duration_s": round(e.duration_s),
+            "arrival": e.arrival.isoformat(timespec="seconds"),
+            "probability": round(float(e.probability), 4),
+            "expected_vehicles": round(float(e.expected_vehicles), 2),
+            "source": e.source,
+        } for e in estimates]}
+        await self._respond(writer, 200, json.dumps(body).encode(), keep_alive)
+
+    async def _respond(self, writer, status, body, keep_alive, etag=None):
+        head = [f"HTTP/1.1 {status} {STATUS_TEXT[status]}",
+                "Content-Type: application/json",
+                f"Content-Length: {len(body)}",
+                "Cache-Control: no-cache",
+                "Connection: " + ("keep-alive" if keep_alive else "close")]
+        if etag:
+            head.append(f"ETag: {etag}")
+        writer.write(("\r\n".join(head) + "\r\n\r\n").encode() + body)
+        await writer.drain()
+
+    async def _stream(self, writer):
+        # Subscribe and take the snapshot with no await in between, so every
+        # diff after the snapshot is queued for this client
+        client = asyncio.Queue(maxsize=SSE_BACKLOG)
+        self.clients.add(client)
+        try:
+            writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\n"
+                         b"Cache-Control: no-cache\r\nConnection: keep-alive\r\n\r\n")
+            writer.write(b"event: snapshot\ndata: " + self.bodies[None] + b"\n\n")
+            await writer.drain()
+            while True:
+                message = await client.get()
+                if message is None:
+                    break
+                writer.write(message)
+                await writer.drain()
+        finally:
+            self.clients.discard(client)
@@ -0,0 +1,198 @@
+import argparse
+import asyncio
+import os
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+from smart_parking.forecast import HORIZON_MIN
+from smart_parking.history import from_store_time, to_store_time
+from smart_parking.prediction import default_model, get_prediction_table, prediction_table_cached
+from smart_parking.routing import (DESTINATION, AsyncMemo, OfflineBackend, ORSBackend, RoutingService, TTLCache,
+                                   grid_cell)
+
+# probability: chance of finding a spot on arrival; source: "forecast" (live
+# counts, arrivals within the forecast horizon) or "model" (time-of-day predictor)
+ArrivalEstimate = namedtuple("ArrivalEstimate", ["origin", "distance_m", "duration_s", "departure", "arrival",
+                                                 "probability", "expected_vehicles", "source"])
+
+
+
+class PredictionUnavailable(Exception):
+    # Neither a trained model nor a live count to predict from
+    pass
+
+
+# ---------- Spot probability at arrival ----------
+class ArrivalAvailability:
+    # ETA from the routing service, then the predicted availability at the
+    # arrival time. Answers are memoized by (origin grid cell, departure
+    # bucket): every origin in a cell leaving within the same bucket_s gets
+    # the answer computed for the middle of the bucket, so a rush of requests
+    # from the same neighbourhood costs one route and one prediction.
+
+    def __init__(self, routing, forecaster=None, model_path=None, camera=None, destination=DESTINATION,
+                 bucket_s=300, cache_size=4096, resolution_s=60):
+        self.routing = routing
+        self.forecaster = forecaster
+        self.model_path = model_path
+        self.camera = camera
+        self.destination = tuple(destination)
+        self.bucket_s = bucket_s
+        self.resolution_s = resolution_s
+        # Entries outlive their bucket by one bucket at most
+        self.estimates = TTLCache(cache_size, ttl=2 * bucket_s)
+        self._memo = AsyncMemo(self.estimates)
+
+    def _bucket(self, departure):
+        # (bucket key, the departure time answers in it are computed for)
+        start = to_store_time(departure) // self.bucket_s * self.bucket_s
+        return start, from_store_time(start + self.bucket_s // 2)
+
+    async def query(self, origin, departure=None):
+        # origin: an address or (lon, lat); None if the address is unknown
+        departure = departure or datetime.now()
+        if isinstance(origin, str):
+            origin = await self.routing.geocode(origin)
+            if origin is None:
+                return None
+        bucket, departure = self._bucket(departure)
+        key = (grid_cell(origin, self.routing.cell_deg), bucket)
+        return await self._memo.get(key, lambda: self._estimate(tuple(origin), departure))
+
+    async def query_many(self, origins, departure=None, concurrency=64):
+        # All origins concurrently, at most concurrency routing calls at once;
+        # results are in the order of origins
+        departure = departure or datetime.now()
+        limit = asyncio.Semaphore(concurrency)
+
+        async def one(origin):
+            async with limit:
+                try:
+                    return await self.query(origin, departure)
+                except PredictionUnavailable:
+                    raise  # the same for every origin
+                except Exception as e:
+                    print(f"⚠️ No estimate for {origin!r}: {e}")
+                    return None
+
+        return await asyncio.gather(*(one(origin) for origin in origins))
+
+    async def _estimate(self, origin, departure):
+        route = await self.routing.route(origin, self.destination)
+        arrival = departure + timedelta(seconds=route.duration_s)
+        estimate = self._forecast(arrival, fallback=not self.has_model())
+        if estimate is None and prediction_table_cached(self.model_path, self.resolution_s, arrival.date(),
+                                                        self.camera):
+            estimate = self._from_model(arrival)
+        elif estimate is None:
+            # A cold table may load sklearn; the event loop keeps serving meanwhile
+            estimate = await asyncio.get_running_loop().run_in_executor(None, self._from_model, arrival)
+        probability, vehicles, source = estimate
+        return ArrivalEstimate(origin, route.distance_m, route.duration_s, departure, arrival, probability, vehicles,
+                               source)
+
+    def has_model(self):
+        return os.path.exists(self.model_path or default_model())
+
+    def predict(self, arrival, now=None):
+        # (probability, expected vehicles, source) at an arrival datetime
+        estimate = self._forecast(arrival, now, fallback=not self.has_model())
+        return estimate if estimate is not None else self._from_model(arrival)
+
+    def _forecast(self, arrival, now=None, fallback=False):
+        # From the live counts when arrival is within the forecast horizon,
+        # else None. With fallback (no trained model) arrivals beyond it get
+        # the forecast at the end of the horizon, and PredictionUnavailable
+        # is raised when no camera has reported yet.
+        minutes = (arrival - (now or datetime.now())).total_seconds() / 60
+        if not 0 <= minutes <= HORIZON_MIN:
+            if not fallback:
+                return None
+            minutes = min(max(minutes, 0), HORIZON_MIN)
+        if self.forecaster is not None:
+            t = to_store_time(now) if now else None
+            free = self.forecaster.expected_free(minutes, t=t)
+            if self.camera is None or self.camera in free:
+                cameras = [self.camera] if self.camera else list(free)
+                if cameras:
+                    capacity = sum(self.forecaster.cameras[c].capacity for c in cameras)
+                    vehicles = capacity - sum(free[c] for c in cameras)
+                    return self.forecaster.free_probability(minutes, self.camera, t=t), vehicles, "forecast"
+        if fallback:
+            raise PredictionUnavailable("No trained occupancy model, and no camera has reported yet")
+        return None
+
+    def _from_model(self, arrival):
+        table = get_prediction_table(self.model_path, self.resolution_s, day=arrival.date(), camera=self.camera)
+        probability, vehicles = table.predict_probability(arrival.strftime("%H%M%S"))
+        return probability, vehicles, "model"
+
+    def summary(self):
+        return (f"Arrivals: {self.estimates.hits} cached, {self.estimates.misses} computed, "
+                f"{self._memo.coalesced} coalesced | {self.routing.summary()}")
+
+
+# ---------- Rush-hour benchmark ----------
+async def rush(availability, origins, requests, seconds, concurrency):
+    # requests queries from random origins, spread over seconds of departures
+    import random
+
+    rng = random.Random(0)
+    start = datetime.now()
+    batches = []
+    for i in range(0, requests, concurrency):
+        departure = start + timedelta(seconds=seconds * i / requests)
+        batches.append(([rng.choice(origins) for _ in range(min(concurrency, requests - i))], departure))
+    started = time.perf_counter()
+    answered = 0
+    for batch, departure in batches:
+        answered += sum(r is not None for r in await availability.query_many(batch, departure, concurrency))
+    return answered, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Chance of finding a spot on arrival, for many origins at once.")
+    parser.add_argument("origins", nargs="*", help="addresses (default: a simulated rush hour)")
+    parser.add_argument("--model", help="occupancy predictor (default: the trained one)")
+    parser.add_argument("--camera", help="camera whose spots to predict (default: the model's)")
+    parser.add_argument("--offline", action="store_true", help="use the offline routing stand-in instead of ORS")
+    parser.add_argument("--bucket", type=int, default=300, help="seconds of departure time sharing one answer")
+    parser.add_argument("--requests", type=int, default=20000, help="simulated requests")
+    parser.add_argument("--addresses", type=int, default=500, help="distinct simulated origins")
+    parser.add_argument("--minutes", type=float, default=60, help="simulated rush hour length")
+    parser.add_argument("--delay", type=float, default=0.05, help="simulated routing latency in seconds")
+    parser.add_argument("--concurrency", type=int, default=256)
+    args = parser.parse_args()
+
+    if args.offline or not args.origins:
+        backend = OfflineBackend(delay=args.delay if not args.origins else 0.0)
+    else:
+        backend = ORSBackend(key_path="maps_integration/key.txt")
+    availability = ArrivalAvailability(RoutingService(backend), model_path=args.model, camera=args.camera,
+                                       bucket_s=args.bucket)
+
+    if not availability.has_model():
+        print(f"⚠️ No trained occupancy model at {args.model or default_model()}; train one with model_gen.py")
+        return
+
+    if args.origins:
+        for address, estimate in zip(args.origins, asyncio.run(availability.query_many(args.origins))):
+            if estimate is None:
+                print(f"{address}: not found")
+                continue
+            print(f"{address}: {estimate.distance_m / 1000:.1f} km, arrive {estimate.arrival:%H:%M:%S}, "
+                  f"{estimate.expected_vehicles:.1f} vehicles expected, "
+                  f"{estimate.probability:.0%} chance of a spot ({estimate.source})")
+        return
+
+    origins = [f"{i} simulated street, pune" for i in range(args.addresses)]
+    answered, elapsed = asyncio.run(rush(availability, origins, args.requests, args.minutes * 60,
+                                         args.concurrency))
+    print(f"🚗 {answered} arrival estimates in {elapsed:.2f}s ({answered / max(elapsed, 1e-9):,.0f}/sec), "
+          f"{backend.calls} backend calls")
+    print(availability.summary())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+import numpy as np
+
+from smart_parking.detection import detect_batch
+
+
+# ---------- Cross-camera dynamic batching ----------
+class BatchScheduler:
+    # Collects frames submitted by any number of camera threads and runs them
+    # through the detector together. A batch is closed when it holds max_batch
+    # frames or max_wait seconds after its first frame arrived, whichever comes
+    # first: a larger max_wait fills batches better at the cost of latency.
+    # Frames submitted with their own imgsz (cameras configured with one) are
+    # run in a separate detector call per input size.
+
+    def __init__(self, model, max_batch=8, max_wait=0.02, history=1000, **detect_options):
+        self.model = model
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.detect_options = detect_options
+        self.pending = queue.Queue()
+        self.batches = 0
+        self.frames = 0
+        self.fill = deque(maxlen=history)
+        self.queue_wait = deque(maxlen=history)
+        self.latency = deque(maxlen=history)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join(timeout=5)
+        # Requests nobody will run any more fail instead of blocking their callers
+        while True:
+            try:
+                item = self.pending.get_nowait()
+            except queue.Empty:
+                break
+            item[-1].set_exception(RuntimeError("BatchScheduler stopped"))
+
+    def submit(self, frame, rois=None, imgsz=None):
+        future = Future()
+        if self._stop.is_set():
+            future.set_exception(RuntimeError("BatchScheduler stopped"))
+            return future
+        self.pending.put((time.perf_counter(), frame, rois, imgsz, future))
+        return future
+
+    def detect(self, frame, rois=None, imgsz=None):
+        # Blocking call with the same result as detection.detect_vehicles
+        return self.submit(frame, rois, imgsz).result()
+
+    def _next_batch(self):
+        try:
+            batch = [self.pending.get(timeout=0.1)]
+        except queue.Empty:
+            return []
+        deadline = batch[0][0] + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            try:
+                batch.append(self.pending.get(timeout=remaining) if remaining > 0 else self.pending.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while not self._stop.is_set():
+            batch = self._next_batch()
+            if not batch:
+                continue
+            groups = {}
+            for item in batch:
+                groups.setdefault(item[3], []).append(item)
+            for imgsz, group in groups.items():
+                self._detect_group(group, imgsz)
+
+    def _detect_group(self, group, imgsz):
+        # One detector call for frames sharing an input size
+        options = dict(self.detect_options, **({"imgsz": imgsz} if imgsz else {}))
+        started = time.perf_counter()
+        try:
+            detections = detect_batch(self.model, [frame for _, frame, _, _, _ in group],
+                                      rois_per_image=[rois for _, _, rois, _, _ in group], **options)
+        except Exception as e:
+            for _, _, _, _, future in group:
+                future.set_exception(e)
+            return
+
+        finished = time.perf_counter()
+        self.batches += 1
+        self.frames += len(group)
+        self.fill.append(len(group) / self.max_batch)
+        for (submitted, _, _, _, future), boxes in zip(group, detections):
+            self.queue_wait.append(started - submitted)
+            self.latency.append(finished - submitted)
+            future.set_result(boxes)
+
+    def metrics(self):
+        def ms(samples, q):
+            return round(float(np.percentile(samples, q)) * 1000, 1) if samples else 0.0
+        return {
+            "batches": self.batches,
+            "frames": self.frames,
+            "fill_ratio": round(float(np.mean(self.fill)), 3) if self.fill else 0.0,
+            "queue_wait_ms_p50": ms(self.queue_wait, 50),
+            "queue_wait_ms_p95": ms(self.queue_wait, 95),
+            "latency_ms_p50": ms(self.latency, 50),
+            "latency_ms_p95": ms(self.latency, 95),
+        }
+
+    def summary(self):
+        m = self.metrics()
+        return (f"Batches: {m['batches']} ({m['frames']} frames, fill {m['fill_ratio']:.0%}), "
+                f"queue wait p50/p95 {m['queue_wait_ms_p50']}/{m['queue_wait_ms_p95']} ms, "
+                f"latency p50/p95 {m['latency_ms_p50']}/{m['latency_ms_p95']} ms")
@@ -0,0 +1,100 @@
+import numpy as np
+
+# Classes to detect: car(2), bus(5), truck(7)
+VEHICLE_CLASSES = [2, 5, 7]
+CLASS_NAMES = {2: 'car', 5: 'bus', 7: 'truck'}
+
+
+# ---------- Vehicle boxes from a YOLO result ----------
+def vehicle_boxes(result, return_classes=False):
+    # (N, 4) float32 array of xyxy boxes for vehicle classes only
+    boxes = result.boxes
+    if len(boxes) == 0:
+        xyxy, cls = np.zeros((0, 4), dtype=np.float32), np.zeros(0, dtype=int)
+    else:
+        xyxy = boxes.xyxy.cpu().numpy().astype(np.float32)
+        cls = boxes.cls.cpu().numpy().astype(int)
+        keep = np.isin(cls, VEHICLE_CLASSES)
+        xyxy, cls = xyxy[keep], cls[keep]
+    return (xyxy, cls) if return_classes else xyxy
+
+
+def box_centers(boxes):
+    boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+    return np.stack([(boxes[:, 0] + boxes[:, 2]) / 2,
+                     (boxes[:, 1] + boxes[:, 3]) / 2], axis=1)
+
+
+def suppress_duplicates(boxes, iou_threshold=0.5, sources=None, rois=None):
+    # Indices of boxes to keep when overlapping ROI crops saw the same vehicle;
+    # larger boxes win since a crop edge can only cut a vehicle short.
+    # sources[k] is the index in rois of the crop box k came from. A box cut
+    # short by a crop edge has a low IoU with the whole vehicle, so a box from
+    # another crop that lies in the band both crops cover is also dropped
+    # when mostly inside the bigger one. Within one crop, and outside the
+    # bands, only IoU counts: a small car next to a truck is a real car.
+    boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+    areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    if sources is not None:
+        sources = np.asarray(sources, dtype=int)
+        rois = np.asarray(rois, dtype=np.float32).reshape(-1, 4)
+    order = np.argsort(-areas)
+    keep = []
+    while len(order):
+        i, rest = order[0], order[1:]
+        keep.append(i)
+        ix1 = np.maximum(boxes[i, 0], boxes[rest, 0])
+        iy1 = np.maximum(boxes[i, 1], boxes[rest, 1])
+        ix2 = np.minimum(boxes[i, 2], boxes[rest, 2])
+        iy2 = np.minimum(boxes[i, 3], boxes[rest, 3])
+        inter = np.clip(ix2 - ix1, 0, None) * np.clip(iy2 - iy1, 0, None)
+        overlap = inter / (areas[i] + areas[rest] - inter + 1e-6)
+        if sources is not None:
+            # Band covered by both box i's crop and each other box's crop
+            own, other = rois[sources[i]], rois[sources[rest]]
+            bx1, by1 = np.maximum(own[0], other[:, 0]), np.maximum(own[1], other[:, 1])
+            bx2, by2 = np.minimum(own[2], other[:, 2]), np.minimum(own[3], other[:, 3])
+            in_band = ((sources[rest] != sources[i]) & (boxes[rest, 0] >= bx1) & (boxes[rest, 1] >= by1)
+                       & (boxes[rest, 2] <= bx2) & (boxes[rest, 3] <= by2))
+            overlap = np.where(in_band, np.maximum(overlap, inter / (areas[rest] + 1e-6)), overlap)
+        order = rest[overlap <= iou_threshold]
+    return np.sort(np.array(keep, dtype=int))
+
+
+# ---------- Detection ----------
+def detect_batch(model, images, rois=None, return_classes=False, rois_per_image=None, **kwargs):
+    # One YOLO call for all images. With rois=[(x1, y1, x2, y2), ...] only those
+    # crops of each image are passed to the model and the boxes are mapped
+    # back to full-frame coordinates. rois_per_image gives each image its own
+    # list (e.g. frames from different cameras).
+    if not images:
+        return []
+    if rois_per_image is None:
+        rois_per_image = [rois] * len(images)
+    rois_per_image = [r or [None] for r in rois_per_image]
+    crops = [image if roi is None else image[roi[1]:roi[3], roi[0]:roi[2]]
+             for image, image_rois in zip(images, rois_per_image) for roi in image_rois]
+    results = iter(model(crops, classes=VEHICLE_CLASSES, verbose=False, **kwargs))
+
+    detections = []
+    for image, image_rois in zip(images, rois_per_image):
+        all_boxes, all_classes, sources = [], [], []
+        for k, roi in enumerate(image_rois):
+            boxes, classes = vehicle_boxes(next(results), return_classes=True)
+            if roi is not None:
+                boxes = boxes + np.array([roi[0], roi[1], roi[0], roi[1]], dtype=np.float32)
+            all_boxes.append(boxes)
+            all_classes.append(classes)
+            sources.append(np.full(len(boxes), k))
+        boxes, classes = np.concatenate(all_boxes), np.concatenate(all_classes)
+        if len(image_rois) > 1:
+            frame = (0, 0, image.shape[1], image.shape[0])
+            keep = suppress_duplicates(boxes, sources=np.concatenate(sources),
+                                       rois=[frame if roi is None else roi for roi in image_rois])
+            boxes, classes = boxes[keep], classes[keep]
+        detections.append((boxes, classes) if return_classes else boxes)
+    return detections
+
+
+def detect_vehicles(model, image, rois=None, **kwargs):
+    return detect_batch(model, [image], rois=rois, **kwargs)[0]
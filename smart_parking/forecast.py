@@ -0,0 +1,361 @@
+import argparse
+import math
+import threading
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from smart_parking.history import DEFAULT_STORE, EPOCH, SECONDS_PER_DAY, OccupancyStore, resample_counts, \
+    to_store_time
+
+HORIZON_MIN = 60
+
+
+def store_now():
+    return to_store_time(datetime.now())
+
+
+# ---------- Preallocated rolling window ----------
+class RingBuffer:
+    # Fixed-size window of floats with running sums, so push, mean and std
+    # are O(1) and nothing is allocated after construction
+
+    def __init__(self, size):
+        self.data = np.zeros(size)
+        self.size = size
+        self.count = 0
+        self.head = 0  # next write position
+        self.total = 0.0
+        self.total_sq = 0.0
+
+    def push(self, value):
+        if self.count == self.size:
+            old = self.data[self.head]
+            self.total -= old
+            self.total_sq -= old * old
+        else:
+            self.count += 1
+        self.data[self.head] = value
+        self.total += value
+        self.total_sq += value * value
+        self.head = (self.head + 1) % self.size
+
+    def last(self, k=1):
+        # k-th most recent value
+        return self.data[(self.head - k) % self.size]
+
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+    def std(self):
+        if self.count < 2:
+            return 0.0
+        return math.sqrt(max(0.0, self.total_sq / self.count - self.mean() ** 2))
+
+    def values(self):
+        # Oldest first
+        if self.count < self.size:
+            return self.data[:self.count].copy()
+        return np.roll(self.data, -self.head)
+
+
+# ---------- Baseline from the occupancy predictor ----------
+def model_baseline(camera=None, model_path=None, resolution_s=60):
+    # Callable store times -> predicted counts, served from the cached daily
+    # prediction tables (one per date for the dated compact model)
+    from smart_parking.prediction import get_prediction_table
+
+    def baseline(times):
+        times = np.asarray(times, dtype=np.int64)
+        days = times // SECONDS_PER_DAY
+        counts = np.empty(len(times))
+        for day in np.unique(days):
+            table = get_prediction_table(model_path, resolution_s, day=EPOCH + timedelta(days=int(day)),
+                                         camera=camera)
+            mask = days == day
+            counts[mask] = table.predict_count(times[mask] % SECONDS_PER_DAY)
+        return counts
+
+    return baseline
+
+
+# ---------- Short-horizon forecaster for one camera ----------
+class OccupancyForecaster:
+    # The live count is averaged over step_s steps (time-weighted, since the
+    # detector only reports changes). What the time-of-day baseline does not
+    # explain is tracked with a damped-trend (Holt) smoother, so a lot that is
+    # fuller than usual right now is forecast to stay fuller, decaying back
+    # to the usual curve over the next hour. Forecast errors are measured per
+    # horizon as the real counts arrive and give the spread used for
+    # probabilities. Each step costs O(horizon) and each query O(1).
+
+    def __init__(self, capacity, baseline=None, step_s=60, horizon_min=HORIZON_MIN, alpha=0.5, beta=0.05, phi=0.95,
+                 error_decay=0.02, window=120):
+        self.capacity = capacity
+        self.baseline = baseline
+        self.step_s = step_s
+        self.horizon = max(1, int(round(horizon_min * 60 / step_s)))
+        self.alpha = alpha
+        self.beta = beta
+        self.phi = phi
+        self.error_decay = error_decay
+
+        self.level = None  # residual over the baseline
+        self.trend = 0.0
+        # Cumulative damping sum phi + phi^2 + ... + phi^h for every horizon
+        self._damping = np.cumsum(phi ** np.arange(1, self.horizon + 1))
+        self._offsets = np.arange(0, self.horizon + 1) * step_s
+
+        self.steps = RingBuffer(window)  # step means, oldest first
+        self.step_start = None
+        self.count = 0  # latest observed count
+        self.count_since = None
+        self.weighted = 0.0  # sum of count * seconds in the open step
+
+        # pending[s % (horizon + 1), h] is what was forecast h steps before step s
+        self.pending = np.full((self.horizon + 1, self.horizon + 1), np.nan)
+        self.mse = np.full(self.horizon + 1, float(capacity) ** 2 / 16)
+        self.mse[0] = 0.25
+        self.step_index = 0
+
+        # Current forecast, as plain lists for the scalar query path
+        self._forecast = [0.0] * (self.horizon + 1)
+        self._sigma = [0.5] * (self.horizon + 1)
+        self.forecast_time = None  # until the first observation
+
+    # ----- stream -----
+    def observe(self, count, t=None):
+        # count occupied spots at store time t (seconds); closes every step
+        # that ended since the last observation
+        t = store_now() if t is None else t
+        if self.step_start is None:
+            # Steps start at the first observation: the unseen part of a
+            # minute must not average in as an empty lot
+            self.step_start = t
+            self.count, self.count_since = count, t
+            self._set_forecast(t)
+            return
+        self.advance(t)
+        self.weighted += self.count * (t - self.count_since)
+        self.count, self.count_since = count, t
+
+    def advance(self, t):
+        # Closes elapsed steps, carrying the last count forward through gaps
+        step_end = self.step_start + self.step_s
+        if t < step_end:
+            return
+        missed = int((t - step_end) // self.step_s)
+        if missed > self.steps.size:
+            # Long outage: the old state says nothing about now
+            self.level, self.trend = None, 0.0
+            self.pending.fill(np.nan)
+            self.step_start += missed * self.step_s
+            self.count_since = max(self.count_since, self.step_start)
+            self.weighted = 0.0
+            step_end = self.step_start + self.step_s
+        while t >= step_end:
+            self.weighted += self.count * (step_end - self.count_since)
+            self._close_step(self.weighted / self.step_s, step_end)
+            self.weighted = 0.0
+            self.count_since = self.step_start = step_end
+            step_end += self.step_s
+
+    def _close_step(self, value, step_end):
+        self.steps.push(value)
+        row = self.pending[self.step_index % (self.horizon + 1)]
+        seen = ~np.isnan(row)
+        errors = value - row[seen]
+        self.mse[seen] += self.error_decay * (errors * errors - self.mse[seen])
+        row.fill(np.nan)
+
+        # The baseline at this step's end was computed with the last forecast
+        residual = value - self._next_base
+        if self.level is None:
+            self.level, self.trend = residual, 0.0
+        else:
+            previous = self.level
+            self.level = self.alpha * residual + (1 - self.alpha) * (previous + self.phi * self.trend)
+            self.trend = self.beta * (self.level - previous) + (1 - self.beta) * self.phi * self.trend
+        self.step_index += 1
+        self._set_forecast(step_end)
+
+    def _baseline(self, times):
+        return self.baseline(times) if self.baseline is not None else np.zeros(len(times))
+
+    def _set_forecast(self, step_end):
+        base = self._baseline(step_end + self._offsets)
+        forecast = np.empty(self.horizon + 1)
+        forecast[0] = self.count
+        level = self.level if self.level is not None else self.count - base[0]
+        forecast[1:] = base[1:] + level + self.trend * self._damping
+        np.clip(forecast, 0, self.capacity, out=forecast)
+        # Remember the forecast of each future step to score it when it
+        # arrives; step_index is the step that closes next
+        for h in range(1, self.horizon + 1):
+            self.pending[(self.step_index + h - 1) % (self.horizon + 1), h] = forecast[h]
+        self._next_base = base[1]
+        self._forecast = forecast.tolist()
+        self._sigma = np.sqrt(np.maximum(self.mse, 0.25)).tolist()
+        self.forecast_time = step_end
+
+    # ----- queries -----
+    def forecast(self, minutes):
+        # Expected occupied spots minutes after the last closed step
+        pos = min(max(minutes * 60 / self.step_s, 0.0), self.horizon)
+        i = min(int(pos), self.horizon - 1)
+        frac = pos - i
+        values = self._forecast
+        return values[i] + (values[i + 1] - values[i]) * frac
+
+    def sigma(self, minutes):
+        pos = min(max(minutes * 60 / self.step_s, 0.0), self.horizon)
+        i = min(int(pos), self.horizon - 1)
+        frac = pos - i
+        values = self._sigma
+        return values[i] + (values[i + 1] - values[i]) * frac
+
+    def expected_free(self, minutes):
+        return self.capacity - self.forecast(minutes)
+
+    def free_probability(self, minutes, spots=1):
+        # P(at least spots free), with the forecast error taken as normal
+        margin = self.capacity - spots + 0.5 - self.forecast(minutes)
+        return 0.5 * (1.0 + math.erf(margin / (self.sigma(minutes) * math.sqrt(2))))
+
+    def curve(self):
+        # (minutes ahead, expected count, sigma) over the whole horizon
+        minutes = np.arange(self.horizon + 1) * self.step_s / 60
+        return minutes, np.array(self._forecast), np.array(self._sigma)
+
+
+# ---------- All cameras of the lot ----------
+class LotForecaster:
+    # One forecaster per camera, fed by LotState changes. Queries first catch
+    # up with the clock so a camera that has not changed for a while is
+    # forecast from its unchanged count, not from when it last changed.
+
+    def __init__(self, capacities, baselines=None, **options):
+        baselines = baselines or {}
+        self.cameras = {cam: OccupancyForecaster(capacity, baseline=baselines.get(cam), **options)
+                        for cam, capacity in capacities.items()}
+        self._lock = threading.Lock()
+
+    def follow(self, state):
+        # Seeds every known camera from the current state, then follows changes
+        snapshot = state.snapshot()
+        now = store_now()
+        for cam, info in snapshot["cameras"].items():
+            if cam in self.cameras and info.get("known", True):
+                self.observe(cam, int(np.count_nonzero(info["occupied"])), now)
+        state.subscribe(lambda cam, occupied: self.observe(cam, int(np.count_nonzero(occupied))))
+
+    def observe(self, camera_id, count, t=None):
+        with self._lock:
+            self.cameras[camera_id].observe(count, store_now() if t is None else t)
+
+    def _catch_up(self, t):
+        t = store_now() if t is None else t
+        for cam in self.started():
+            self.cameras[cam].advance(t)
+        return t
+
+    def started(self):
+        # Cameras that have reported at least once
+        return [cam for cam, f in self.cameras.items() if f.forecast_time is not None]
+
+    def free_probability(self, minutes, camera_id=None, t=None):
+        # Per camera, or for the lot: P(at least one camera has a free spot)
+        with self._lock:
+            t = self._catch_up(t)
+            cameras = [camera_id] if camera_id else self.started()
+            if not cameras or self.cameras[cameras[0]].forecast_time is None:
+                raise ValueError(f"No occupancy reported yet for {camera_id or 'any camera'}")
+            none_free = 1.0
+            for cam in cameras:
+                forecaster = self.cameras[cam]
+                ahead = minutes + (t - forecaster.forecast_time) / 60
+                none_free *= 1.0 - forecaster.free_probability(ahead)
+            return 1.0 - none_free
+
+    def expected_free(self, minutes, t=None):
+        with self._lock:
+            t = self._catch_up(t)
+            return {cam: self.cameras[cam].expected_free(minutes + (t - self.cameras[cam].forecast_time) / 60)
+                    for cam in self.started()}
+
+
+# ---------- Replay recorded history ----------
+def replay(times, counts, capacity, baseline=None, horizons=(5, 15, 30, 60), step_s=60):
+    # Feeds the history through a forecaster and, at every closed step,
+    # scores it against the recorded count h minutes later, the baseline
+    # alone and "no change" persistence
+    forecaster = OccupancyForecaster(capacity, baseline=baseline, step_s=step_s)
+    errors = {name: {h: [] for h in horizons} for name in ("forecast", "baseline", "persistence")}
+    scored = None
+    started = time.perf_counter()
+    for t, count in zip(times.tolist(), counts.tolist()):
+        forecaster.observe(count, t)
+        if forecaster.forecast_time == scored:
+            continue
+        scored = now = forecaster.forecast_time
+        targets = now + np.array(horizons) * 60
+        idx = np.searchsorted(times, targets, side="right") - 1
+        for h, target, i in zip(horizons, targets, idx):
+            # Only where the history covers the target (no overnight gaps)
+            if i < 0 or target - times[i] >= step_s:
+                continue
+            actual = int(counts[i])
+            errors["forecast"][h].append(abs(forecaster.forecast(h) - actual))
+            errors["persistence"][h].append(abs(forecaster.count - actual))
+            if baseline is not None:
+                errors["baseline"][h].append(abs(baseline(np.array([target]))[0] - actual))
+    elapsed = time.perf_counter() - started
+    return forecaster, errors, len(times) / max(elapsed, 1e-9)
+
+
+def query_rate(forecaster, n=100000):
+    rng = np.random.default_rng(0)
+    minutes = (rng.random(n) * HORIZON_MIN).tolist()
+    started = time.perf_counter()
+    for m in minutes:
+        forecaster.free_probability(m)
+    return n / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay occupancy history through the short-horizon forecaster.")
+    parser.add_argument("--store", default=DEFAULT_STORE, help="occupancy history folder")
+    parser.add_argument("--camera", default="cam0")
+    parser.add_argument("--capacity", type=int, help="spots of the camera (default: from the history, else 35)")
+    parser.add_argument("--model", help="occupancy predictor for the baseline (default: the trained one, if any)")
+    parser.add_argument("--no-baseline", action="store_true", help="forecast from the live counts only")
+    parser.add_argument("--step", type=int, default=60, help="seconds per forecast step")
+    args = parser.parse_args()
+
+    store = OccupancyStore(args.store)
+    times, counts = resample_counts(store.query(args.camera), args.step)
+    if not len(times):
+        print(f"No history for {args.camera} in '{args.store}'")
+        return
+    capacity = args.capacity or store.n_spots(args.camera) or 35
+    baseline = None
+    if not args.no_baseline:
+        try:
+            baseline = model_baseline(args.camera, args.model, args.step)
+            baseline(times[:1])
+        except (OSError, ValueError) as e:
+            print(f"⚠️ No baseline model ({e}), forecasting from the live counts only")
+            baseline = None
+
+    forecaster, errors, rate = replay(times, counts, capacity, baseline, step_s=args.step)
+    print(f"📈 Replayed {len(times)} steps of {args.camera} ({rate:,.0f} updates/sec)")
+    print(f"{'MAE (vehicles)':<16}" + "".join(f"{h:>8} min" for h in errors["forecast"]))
+    for name, by_horizon in errors.items():
+        if any(by_horizon.values()):
+            print(f"{name:<16}" + "".join(f"{np.mean(e) if e else float('nan'):>12.2f}" for e in by_horizon.values()))
+    print(f"⚡ {query_rate(forecaster):,.0f} free-spot probability queries/sec")
+
+
+if __name__ == "__main__":
+    main()
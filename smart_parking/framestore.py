@@ -0,0 +1,166 @@
+import os
+import re
+from datetime import datetime, timedelta
+
+import cv2
+import numpy as np
+
+from smart_parking.history import to_store_time
+
+INDEX_FILE = "index.npy"
+
+# One row per stored frame; time is in history store time (-1 when the
+# recording start is unknown)
+INDEX_DTYPE = np.dtype([
+    ("chunk", "<u4"),
+    ("offset", "<u4"),
+    ("video_ms", "<f8"),
+    ("time", "<i8"),
+])
+
+
+# ---------- Perceptual hash ----------
+def dhash(frame, size=16):
+    # size*size-bit difference hash: is each pixel brighter than its right
+    # neighbour. 16x16 keeps a car entering a spot well above the few bits
+    # of compression noise between two static frames.
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+    small = cv2.resize(gray, (size + 1, size), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).ravel()
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def hamming(a, b):
+    return bin(a ^ b).count("1")
+
+
+# ---------- Sampling ----------
+def video_start_time(video_path):
+    # Camera files are named like F0090D403175_20250607204354406_cam0.mov
+    match = re.search(r"_(\d{14})(\d{3})?_", os.path.basename(video_path))
+    if not match:
+        return None
+    start = datetime.strptime(match.group(1), "%Y%m%d%H%M%S")
+    return start + timedelta(milliseconds=int(match.group(2) or 0))
+
+
+def sample_video(cap, every_s=1.0, dedup_bits=None, stats=None):
+    # Yields (video_ms, frame) every every_s seconds of footage. Skipped
+    # frames are only grab()bed (demuxed, not converted), and with dedup_bits
+    # a frame whose dHash is within that many bits of the last kept frame is
+    # dropped as a near-duplicate.
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    step = max(1, int(round(every_s * fps)))
+    stats = {} if stats is None else stats
+    stats.update(grabbed=0, decoded=0, duplicates=0, kept=0)
+    last_hash = None
+    index = 0
+    while cap.grab():
+        stats["grabbed"] += 1
+        if index % step == 0:
+            ok, frame = cap.retrieve()
+            if not ok:
+                break
+            stats["decoded"] += 1
+            h = dhash(frame) if dedup_bits is not None else None
+            if h is not None and last_hash is not None and hamming(h, last_hash) <= dedup_bits:
+                stats["duplicates"] += 1
+            else:
+                last_hash = h
+                stats["kept"] += 1
+                yield index * 1000.0 / fps, frame
+        index += 1
+
+
+# ---------- Chunked frame store ----------
+class FrameStoreWriter:
+    # Frames go into fixed-size .npy chunks written through a memmap, so
+    # readers can np.load(mmap_mode="r") them without copying; the index
+    # maps every frame to its chunk, offset and timestamps.
+
+    def __init__(self, folder, chunk_frames=128):
+        os.makedirs(folder, exist_ok=True)
+        self.folder = folder
+        self.chunk_frames = chunk_frames
+        self.rows = []
+        self.chunk = None
+        self.chunk_id = -1
+        self.offset = 0
+        self.shape = None
+
+    def _chunk_path(self, chunk_id):
+        return os.path.join(self.folder, f"chunk_{chunk_id:05d}.npy")
+
+    def append(self, frame, video_ms=0.0, when=None):
+        if self.shape is None:
+            self.shape = frame.shape
+        elif frame.shape != self.shape:
+            raise ValueError(f"frame shape {frame.shape} does not match the store's {self.shape}")
+        if self.chunk is None or self.offset == self.chunk_frames:
+            self._close_chunk()
+            self.chunk_id += 1
+            self.chunk = np.lib.format.open_memmap(self._chunk_path(self.chunk_id), mode="w+", dtype=np.uint8,
+                                                   shape=(self.chunk_frames,) + self.shape)
+            self.offset = 0
+        self.chunk[self.offset] = frame
+        self.rows.append((self.chunk_id, self.offset, video_ms, to_store_time(when) if when else -1))
+        self.offset += 1
+
+    def _close_chunk(self):
+        if self.chunk is None:
+            return
+        if self.offset < self.chunk_frames:
+            # Shrink the last chunk to the frames it holds
+            path = self._chunk_path(self.chunk_id)
+            trimmed = np.array(self.chunk[:self.offset])
+            del self.chunk
+            np.save(path, trimmed)
+        else:
+            self.chunk.flush()
+            del self.chunk
+        self.chunk = None
+
+    def close(self):
+        self._close_chunk()
+        index = np.array(self.rows, dtype=INDEX_DTYPE)
+        tmp_path = os.path.join(self.folder, "index.tmp.npy")
+        np.save(tmp_path, index)
+        os.replace(tmp_path, os.path.join(self.folder, INDEX_FILE))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class FrameStore:
+    def __init__(self, folder):
+        self.folder = folder
+        self.index = np.load(os.path.join(folder, INDEX_FILE))
+        self._chunks = {}
+
+    @staticmethod
+    def is_store(folder):
+        return os.path.exists(os.path.join(folder, INDEX_FILE))
+
+    def __len__(self):
+        return len(self.index)
+
+    def _chunk(self, chunk_id):
+        chunk = self._chunks.get(chunk_id)
+        if chunk is None:
+            chunk = np.load(os.path.join(self.folder, f"chunk_{chunk_id:05d}.npy"), mmap_mode="r")
+            self._chunks[chunk_id] = chunk
+        return chunk
+
+    def frame(self, i):
+        # Read-only view into the memory-mapped chunk (no copy, no decode)
+        row = self.index[i]
+        return self._chunk(int(row["chunk"]))[int(row["offset"])]
+
+    def times(self):
+        return self.index["time"]
+
+    def nbytes(self):
+        return sum(os.path.getsize(os.path.join(self.folder, f)) for f in os.listdir(self.folder))
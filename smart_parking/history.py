@@ -0,0 +1,217 @@
+import json
+import os
+import re
+from datetime import date, datetime, timedelta
+
+import numpy as np
+
+DEFAULT_STORE = "occupancy_history"
+SECONDS_PER_DAY = 24 * 3600
+EPOCH = date(1970, 1, 1)
+
+
+# ---------- Record layout ----------
+# Times are local wall-clock seconds since 1970-01-01 (no timezone), so
+# time // 86400 is the day and time % 86400 the time of day.
+def record_dtype(n_spots):
+    return np.dtype([
+        ("time", "<i8"),
+        ("count", "<u2"),
+        ("spots", "u1", (max(1, (n_spots + 7) // 8),)),  # per-spot occupancy bitset
+    ])
+
+
+def to_store_time(when):
+    return (when.date() - EPOCH).days * SECONDS_PER_DAY + when.hour * 3600 + when.minute * 60 + when.second
+
+
+def from_store_time(t):
+    return datetime.combine(EPOCH, datetime.min.time()) + timedelta(seconds=int(t))
+
+
+def unpack_spots(records, n_spots):
+    # (N, n_spots) bool array from the bitset column
+    return np.unpackbits(records["spots"], axis=1, count=n_spots).astype(bool)
+
+
+# ---------- Append-only writer for one camera ----------
+class CameraWriter:
+    # With skip_recorded, records whose time is already in the store for
+    # that day are dropped, so re-processing the same footage does not
+    # append its counts a second time
+
+    def __init__(self, folder, n_spots, buffer_size=1024, skip_recorded=False):
+        self.folder = folder
+        self.n_spots = n_spots
+        self.dtype = record_dtype(n_spots)
+        self.buffer = np.zeros(buffer_size, dtype=self.dtype)
+        self.pending = 0
+        self.skip_recorded = skip_recorded
+        self.skipped = 0
+        self._recorded = {}  # day -> times already on disk before this writer
+
+    def append(self, when, count=None, occupied=None):
+        i = self.pending
+        self.buffer["time"][i] = to_store_time(when)
+        self.buffer["spots"][i] = 0
+        if occupied is not None:
+            packed = np.packbits(np.asarray(occupied, dtype=bool))
+            self.buffer["spots"][i, :len(packed)] = packed
+            if count is None:
+                count = int(np.count_nonzero(occupied))
+        self.buffer["count"][i] = count or 0
+        self.pending += 1
+        if self.pending == len(self.buffer):
+            self.flush()
+
+    def flush(self):
+        if not self.pending:
+            return
+        records = self.buffer[:self.pending]
+        days = records["time"] // SECONDS_PER_DAY
+        for day in np.unique(days):
+            path = os.path.join(self.folder, f"{EPOCH + timedelta(days=int(day)):%Y%m%d}.bin")
+            day_records = records[days == day]
+            if self.skip_recorded:
+                recorded = self._recorded.get(day)
+                if recorded is None:
+                    exists = os.path.exists(path) and os.path.getsize(path)
+                    recorded = np.fromfile(path, dtype=self.dtype)["time"] if exists else np.zeros(0, dtype="<i8")
+                    self._recorded[day] = recorded
+                new = ~np.isin(day_records["time"], recorded)
+                self.skipped += int(len(day_records) - np.count_nonzero(new))
+                day_records = day_records[new]
+            with open(path, "ab") as f:
+                day_records.tofile(f)
+        self.pending = 0
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# ---------- Store ----------
+class OccupancyStore:
+    # One folder per camera holding meta.json and one binary file of
+    # fixed-size records per day. Queries memory-map only the days in range.
+
+    def __init__(self, root=DEFAULT_STORE):
+        self.root = root
+
+    def cameras(self):
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(c for c in os.listdir(self.root) if os.path.exists(self._meta_path(c)))
+
+    def _meta_path(self, camera_id):
+        return os.path.join(self.root, camera_id, "meta.json")
+
+    def n_spots(self, camera_id):
+        with open(self._meta_path(camera_id)) as f:
+            return json.load(f)["n_spots"]
+
+    def writer(self, camera_id, n_spots=0, skip_recorded=False):
+        folder = os.path.join(self.root, camera_id)
+        os.makedirs(folder, exist_ok=True)
+        meta_path = self._meta_path(camera_id)
+        if os.path.exists(meta_path):
+            recorded = self.n_spots(camera_id)
+            if recorded != n_spots:
+                raise ValueError(f"Camera {camera_id} was recorded with {recorded} spots, not {n_spots}")
+        else:
+            with open(meta_path, "w") as f:
+                json.dump({"n_spots": n_spots}, f)
+        return CameraWriter(folder, n_spots, skip_recorded=skip_recorded)
+
+    def days(self, camera_id):
+        folder = os.path.join(self.root, camera_id)
+        return sorted(datetime.strptime(f[:8], "%Y%m%d").date()
+                      for f in os.listdir(folder) if re.fullmatch(r"\d{8}\.bin", f))
+
+    def query(self, camera_id, start_day=None, end_day=None, start_time=None, end_time=None):
+        # Records with start_day <= day <= end_day and, when given, a time of
+        # day in [start_time, end_time) (datetime.time values; wraps past midnight)
+        dtype = record_dtype(self.n_spots(camera_id))
+        parts = []
+        for day in self.days(camera_id):
+            if (start_day and day < start_day) or (end_day and day > end_day):
+                continue
+            path = os.path.join(self.root, camera_id, f"{day:%Y%m%d}.bin")
+            if os.path.getsize(path):
+                parts.append(np.memmap(path, dtype=dtype, mode="r"))
+        records = np.concatenate(parts) if parts else np.zeros(0, dtype=dtype)
+
+        if start_time is not None or end_time is not None:
+            tod = records["time"] % SECONDS_PER_DAY
+            lo = _seconds(start_time) if start_time is not None else 0
+            hi = _seconds(end_time) if end_time is not None else SECONDS_PER_DAY
+            keep = (tod >= lo) & (tod < hi) if lo <= hi else (tod >= lo) | (tod < hi)
+            records = records[keep]
+        return records
+
+
+def resample_counts(records, step_s=60):
+    # Forward-fills the count onto a regular grid within each recorded day, so
+    # change-only (smoothed) history and dense per-frame history weigh the
+    # same when used as training data. Returns (times, counts).
+    records = np.sort(records, order="time")
+    times, counts = records["time"], records["count"]
+    days = times // SECONDS_PER_DAY
+    grid_times, grid_counts = [], []
+    for day in np.unique(days):
+        day_times = times[days == day]
+        grid = np.arange(day_times[0], day_times[-1] + 1, step_s)
+        idx = np.searchsorted(times, grid, side="right") - 1
+        grid_times.append(grid)
+        grid_counts.append(counts[idx])
+    if not grid_times:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=counts.dtype)
+    return np.concatenate(grid_times), np.concatenate(grid_counts)
+
+
+def _seconds(t):
+    return t.hour * 3600 + t.minute * 60 + t.second
+
+
+# ---------- Import legacy vehicle_count_log.txt files ----------
+def import_count_log(store, camera_id, log_path, day):
+    # "HHMMSS: N vehicles" lines recorded on the given date; times already in
+    # the history (a log imported before) are skipped. Returns (read, skipped).
+    midnight = datetime.combine(day, datetime.min.time())
+    read = 0
+    with store.writer(camera_id, skip_recorded=True) as writer:
+        with open(log_path) as f:
+            for line in f:
+                match = re.match(r'(\d{2})(\d{2})(\d{2}):\s*(\d+)\s+vehicles', line)
+                if match:
+                    h, m, s, vehicles = map(int, match.groups())
+                    writer.append(midnight + timedelta(hours=h, minutes=m, seconds=s), count=vehicles)
+                    read += 1
+    return read, writer.skipped
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Import vehicle_count_log.txt files into the occupancy history.")
+    parser.add_argument("logs", nargs="+", help="'HHMMSS: N vehicles' log files")
+    parser.add_argument("--day", required=True, help="YYYY-MM-DD the logs were recorded on")
+    parser.add_argument("--camera", default="cam0", help="camera id in the occupancy history")
+    parser.add_argument("--store", default=DEFAULT_STORE, help="occupancy history folder")
+    args = parser.parse_args()
+
+    store = OccupancyStore(args.store)
+    day = datetime.strptime(args.day, "%Y-%m-%d").date()
+    for log_path in args.logs:
+        read, skipped = import_count_log(store, args.camera, log_path, day)
+        print(f"📥 {log_path}: {read - skipped} counts imported into '{args.store}/{args.camera}' "
+              f"({skipped} already there)")
+
+
+if __name__ == "__main__":
+    main()
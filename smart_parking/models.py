@@ -0,0 +1,113 @@
+import os
+import threading
+import time
+
+import numpy as np
+
+# Models are loaded on first use and cached for the lifetime of the process
+_models = {}
+_lock = threading.Lock()
+
+# key -> {"load_s": ..., "warmup_s": ...}
+load_stats = {}
+
+
+def _get_or_load(key, loader, warmup=None):
+    with _lock:
+        if key in _models:
+            return _models[key]
+
+        start = time.perf_counter()
+        model = loader()
+        load_s = time.perf_counter() - start
+
+        warmup_s = 0.0
+        if warmup is not None:
+            start = time.perf_counter()
+            warmup(model)
+            warmup_s = time.perf_counter() - start
+
+        _models[key] = model
+        load_stats[key] = {"load_s": load_s, "warmup_s": warmup_s}
+        print(f"⏱️ Loaded {key[0]} ({key[1]}) in {load_s:.2f}s (warm-up {warmup_s:.2f}s)")
+        return model
+
+
+def _evict_other_versions(key):
+    # Drops cached models with the same (kind, path) but another version
+    with _lock:
+        for old in [k for k in _models if k[:2] == key[:2] and k != key]:
+            del _models[old]
+            load_stats.pop(old, None)
+
+
+def clear_models():
+    with _lock:
+        _models.clear()
+        load_stats.clear()
+
+
+# ---------- YOLO vehicle detector ----------
+def exported_detector_path(weights, export):
+    root, _ = os.path.splitext(weights)
+    if export == "onnx":
+        return root + ".onnx"
+    if export == "openvino":
+        return root + "_openvino_model"
+    raise ValueError(f"Unsupported export format: {export}")
+
+
+def get_detector(weights="yolov8l.pt", export=None, imgsz=640):
+    # export="onnx" / "openvino" builds a CPU inference copy of the weights the
+    # first time and reuses it on every later start.
+    from ultralytics import YOLO
+
+    def load():
+        if export is None:
+            return YOLO(weights)
+        path = exported_detector_path(weights, export)
+        if not os.path.exists(path):
+            path = YOLO(weights).export(format=export, imgsz=imgsz)
+        return YOLO(path, task="detect")
+
+    def warmup(model):
+        model(np.zeros((imgsz, imgsz, 3), dtype=np.uint8), imgsz=imgsz, verbose=False)
+
+    return _get_or_load(("detector", weights, export, imgsz), load, warmup)
+
+
+# ---------- Keras timestamp digit classifier ----------
+def get_digit_classifier(path="digit_classifier_custom.h5"):
+    def load():
+        from tensorflow.keras.models import load_model
+        return load_model(path)
+
+    def warmup(model):
+        model.predict(np.zeros((1, 50, 30, 1), dtype=np.float32), verbose=0)
+
+    return _get_or_load(("digit_classifier", path), load, warmup)
+
+
+# ---------- Occupancy predictor ----------
+def get_occupancy_predictor(path="parking_predictor_model.joblib"):
+    # .npz files are the compact forest (no sklearn needed), anything else the joblib one
+    compact = path.endswith(".npz")
+
+    def load():
+        if compact:
+            from smart_parking.predictor import OccupancyPredictor
+            return OccupancyPredictor.load(path)
+        import joblib
+        return joblib.load(path)
+
+    def warmup(model):
+        if compact:
+            model.predict_count(np.zeros(1, dtype=np.int64))
+        else:
+            model.predict(np.zeros((1, 1)))
+
+    # Models are retrained in place (model_gen.py, --update), so the cache key
+    # includes the file version and only the newest version is kept
+    key = ("occupancy_predictor", path, os.path.getmtime(path))
+    _evict_other_versions(key)
+    return _get_or_load(key, load, warmup)
@@ -0,0 +1,77 @@
+import cv2
+import numpy as np
+
+from smart_parking.spotmap import SpotMap
+
+
+# ---------- Frame-differencing gate ----------
+class MotionGate:
+    # Decides per frame whether the detector has to run. Each spot ROI is
+    # compared, on a downscaled grayscale copy, with the frame the detector
+    # last ran on. Detection is re-run when any spot's mean absolute difference
+    # crosses the threshold or when max_stale seconds have passed; otherwise
+    # the caller carries the previous occupancy forward. Frames without a
+    # time (now=None) are only gated on motion and don't move the stale clock.
+
+    def __init__(self, spots, frame_shape, scale=0.25, threshold=12.0, max_stale=60.0):
+        self.scale = scale
+        self.threshold = threshold
+        self.max_stale = max_stale
+
+        h, w = frame_shape[:2]
+        self.size = (max(int(w * scale), 1), max(int(h * scale), 1))
+        scaled = [[(x * scale, y * scale) for x, y in spot] for spot in spots]
+        labels = SpotMap.build(scaled, (self.size[1], self.size[0])).labels.ravel()
+        self.pixels = np.flatnonzero(labels >= 0)
+        self.pixel_labels = labels[self.pixels]
+        self.areas = np.maximum(np.bincount(self.pixel_labels, minlength=len(spots)), 1)
+
+        self.reference = None
+        self.last_detect = None
+        self.frames = 0
+        self.detected = 0
+        self.skipped = 0
+        self.stale_refreshes = 0
+
+    def _small_gray(self, frame):
+        small = cv2.resize(frame, self.size, interpolation=cv2.INTER_AREA)
+        if small.ndim == 3:
+            small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        return small
+
+    def spot_scores(self, small):
+        diff = cv2.absdiff(small, self.reference).ravel()[self.pixels]
+        return np.bincount(self.pixel_labels, weights=diff, minlength=len(self.areas)) / self.areas
+
+    def should_detect(self, frame, now):
+        self.frames += 1
+        small = self._small_gray(frame)
+
+        detect = self.reference is None
+        if (not detect and now is not None and self.last_detect is not None
+                and now - self.last_detect >= self.max_stale):
+            detect = True
+            self.stale_refreshes += 1
+        if not detect:
+            detect = bool((self.spot_scores(small) > self.threshold).any())
+
+        if detect:
+            self.reference = small
+            if now is not None:
+                self.last_detect = now
+            self.detected += 1
+        else:
+            self.skipped += 1
+        return detect
+
+    def reset(self):
+        self.reference = None
+        self.last_detect = None
+
+    def skip_ratio(self):
+        return self.skipped / self.frames if self.frames else 0.0
+
+    def summary(self):
+        return (f"Motion gate: {self.frames} frames, {self.detected} detected "
+                f"({self.stale_refreshes} stale refreshes), {self.skipped} skipped "
+                f"({self.skip_ratio():.1%})")
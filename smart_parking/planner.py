@@ -0,0 +1,268 @@
+import heapq
+import math
+import os
+
+import cv2
+import numpy as np
+
+from smart_parking.spots import load_parking_spots
+
+# 8-connected grid moves as (drow, dcol, cost)
+MOVES = [(-1, 0, 1.0), (1, 0, 1.0), (0, -1, 1.0), (0, 1, 1.0),
+         (-1, -1, math.sqrt(2)), (-1, 1, math.sqrt(2)), (1, -1, math.sqrt(2)), (1, 1, math.sqrt(2))]
+
+
+# ---------- Drivable grid from the blueprint ----------
+def build_walkable(image, spots, cell):
+    # A cell is drivable when it is entirely light floor: the painted lines,
+    # the walls and the spots themselves (parked cars) are obstacles
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+    floor = (gray > 100).astype(np.uint8)
+    for spot in spots:
+        cv2.fillPoly(floor, [np.array(spot, dtype=np.int32)], 0)
+    rows, cols = gray.shape[0] // cell, gray.shape[1] // cell
+    coverage = cv2.resize(floor[:rows * cell, :cols * cell].astype(np.float32), (cols, rows),
+                          interpolation=cv2.INTER_AREA)
+    return coverage > 0.99
+
+
+def dijkstra(walkable, source):
+    # Driving distance (in cells) from source to every cell; inf when unreachable
+    rows, cols = walkable.shape
+    dist = np.full((rows, cols), np.inf, dtype=np.float32)
+    dist[source] = 0.0
+    heap = [(0.0, source[0], source[1])]
+    while heap:
+        d, r, c = heapq.heappop(heap)
+        if d > dist[r, c]:
+            continue
+        for dr, dc, cost in MOVES:
+            nr, nc = r + dr, c + dc
+            if 0 <= nr < rows and 0 <= nc < cols and walkable[nr, nc]:
+                # No corner cutting past obstacles on diagonal moves
+                if dr and dc and not (walkable[r, nc] and walkable[nr, c]):
+                    continue
+                nd = d + cost
+                if nd < dist[nr, nc]:
+                    dist[nr, nc] = nd
+                    heapq.heappush(heap, (nd, nr, nc))
+    return dist
+
+
+# ---------- Planner ----------
+class LotPlanner:
+    # Drivable grid of the lot plus precomputed distance fields from the
+    # entrance and from every spot's entry cell. "Nearest reachable free spot"
+    # is one field lookup per candidate spot, and the path to a spot is a
+    # descent along that spot's field, so neither needs a search per query.
+
+    def __init__(self, walkable, cell, entrance, spot_centers, spot_entries, fields, entrance_field):
+        self.walkable = walkable
+        self.cell = cell
+        self.entrance = tuple(entrance)
+        self.spot_centers = np.asarray(spot_centers, dtype=np.float32)
+        self.spot_entries = np.asarray(spot_entries, dtype=np.int32)
+        self.fields = fields  # (n_spots, rows, cols): distance to each spot's entry
+        self.entrance_field = entrance_field  # distance from the entrance
+
+        # Snap any cell (walls, spots, outside the blueprint) to its nearest drivable cell
+        _, labels = cv2.distanceTransformWithLabels((~walkable).astype(np.uint8), cv2.DIST_L2, 5,
+                                                    labelType=cv2.DIST_LABEL_PIXEL)
+        lut = np.zeros(labels.max() + 1, dtype=np.int64)
+        lut[labels[walkable]] = np.flatnonzero(walkable)
+        self.snap = lut[labels]
+
+        # Last leg from the entry cell into the spot, in pixels
+        entry_px = (self.spot_entries[:, ::-1] + 0.5) * cell
+        self.last_leg = np.linalg.norm(self.spot_centers - entry_px, axis=1) if len(spot_entries) else np.zeros(0)
+
+    @classmethod
+    def build(cls, image, spots, cell=10, entrance=None):
+        walkable = build_walkable(image, spots, cell)
+        rows, cols = walkable.shape
+        planner_entrance = entrance if entrance is not None else (0, image.shape[0] // 2)
+
+        # Keep only the floor connected to the entrance (drops closed-off areas)
+        start = _snap_cell(walkable, _cell_of(planner_entrance, cell, walkable.shape))
+        _, components = cv2.connectedComponents(walkable.astype(np.uint8), connectivity=8)
+        walkable = components == components[start]
+
+        centers = [(float(np.mean([p[0] for p in s])), float(np.mean([p[1] for p in s]))) for s in spots]
+        entries = [_snap_cell(walkable, _cell_of(c, cell, walkable.shape)) for c in centers]
+        fields = np.stack([dijkstra(walkable, e) for e in entries]) if entries else \
+            np.zeros((0, rows, cols), dtype=np.float32)
+        start = (int(start[0]), int(start[1]))
+        return cls(walkable, cell, start, centers, entries, fields, dijkstra(walkable, start))
+
+    # ----- coordinates -----
+    def cell_of(self, point):
+        r, c = _cell_of(point, self.cell, self.walkable.shape)
+        return divmod(int(self.snap[r, c]), self.walkable.shape[1])
+
+    def cell_center(self, cell):
+        return ((cell[1] + 0.5) * self.cell, (cell[0] + 0.5) * self.cell)
+
+    # ----- queries -----
+    def spot_distances(self, point, spots):
+        # Driving distance in pixels from point to each spot (inf if unreachable)
+        spots = np.asarray(spots, dtype=np.intp)
+        r, c = self.cell_of(point)
+        return self.fields[spots, r, c] * self.cell + self.last_leg[spots]
+
+    def nearest_spot(self, point, free_spots):
+        nearest = self.nearest_spots(point, free_spots, 1)
+        return nearest[0] if nearest else None
+
+    def nearest_spots(self, point, free_spots, k):
+        free_spots = list(free_spots)
+        if not free_spots:
+            return []
+        d = self.spot_distances(point, free_spots)
+        order = np.argsort(d)[:k]
+        return [free_spots[i] for i in order if np.isfinite(d[i])]
+
+    def path_to_spot(self, point, spot):
+        # Pixel waypoints from point to the spot's center, following the field
+        field = self.fields[spot]
+        cell = self.cell_of(point)
+        if not np.isfinite(field[cell]):
+            return []
+        path = [cell]
+        rows, cols = field.shape
+        while field[cell] > 0:
+            r, c = cell
+            best = min(((r + dr, c + dc) for dr, dc, _ in MOVES
+                        if 0 <= r + dr < rows and 0 <= c + dc < cols),
+                       key=lambda n: field[n])
+            if field[best] >= field[cell]:
+                break
+            cell = best
+            path.append(cell)
+        return [self.cell_center(p) for p in path] + [tuple(self.spot_centers[spot].tolist())]
+
+    def astar(self, start, goal):
+        # Pixel waypoints between two arbitrary points (e.g. to the exit)
+        start, goal = self.cell_of(start), self.cell_of(goal)
+        rows, cols = self.walkable.shape
+        came_from = {start: None}
+        cost = {start: 0.0}
+        heap = [(0.0, start)]
+        while heap:
+            _, cell = heapq.heappop(heap)
+            if cell == goal:
+                break
+            r, c = cell
+            for dr, dc, step in MOVES:
+                n = (r + dr, c + dc)
+                if not (0 <= n[0] < rows and 0 <= n[1] < cols and self.walkable[n]):
+                    continue
+                if dr and dc and not (self.walkable[r, n[1]] and self.walkable[n[0], c]):
+                    continue
+                new_cost = cost[cell] + step
+                if new_cost < cost.get(n, np.inf):
+                    cost[n] = new_cost
+                    came_from[n] = cell
+                    heapq.heappush(heap, (new_cost + math.hypot(goal[0] - n[0], goal[1] - n[1]), n))
+        if goal not in came_from:
+            return []
+        path = []
+        cell = goal
+        while cell is not None:
+            path.append(self.cell_center(cell))
+            cell = came_from[cell]
+        return path[::-1]
+
+    # ----- cache -----
+    def save(self, path):
+        np.savez_compressed(path, walkable=self.walkable, cell=self.cell, entrance=self.entrance,
+                            spot_centers=self.spot_centers, spot_entries=self.spot_entries,
+                            fields=self.fields, entrance_field=self.entrance_field)
+
+    @classmethod
+    def load(cls, path):
+        data = np.load(path)
+        return cls(data["walkable"], int(data["cell"]), tuple(data["entrance"]), data["spot_centers"],
+                   data["spot_entries"], data["fields"], data["entrance_field"])
+
+
+def _cell_of(point, cell, shape):
+    r = min(max(int(point[1] // cell), 0), shape[0] - 1)
+    c = min(max(int(point[0] // cell), 0), shape[1] - 1)
+    return r, c
+
+
+def _snap_cell(walkable, cell):
+    if walkable[cell]:
+        return cell
+    free = np.argwhere(walkable)
+    nearest = free[np.argmin(np.abs(free - np.array(cell)).sum(axis=1))]
+    return int(nearest[0]), int(nearest[1])
+
+
+def load_lot_planner(blueprint_path, spots_path, cell=10, cache_path=None):
+    # The grid and distance fields are rebuilt only when the blueprint or the
+    # polygon file is newer than the cache
+    cache_path = cache_path or f"{os.path.splitext(blueprint_path)[0]}.lotplan_{cell}.npz"
+    newest_input = max(os.path.getmtime(blueprint_path), os.path.getmtime(spots_path))
+    if os.path.exists(cache_path) and os.path.getmtime(cache_path) >= newest_input:
+        return LotPlanner.load(cache_path)
+
+    image = cv2.imread(blueprint_path)
+    if image is None:
+        raise FileNotFoundError(f"Could not load blueprint {blueprint_path}")
+    planner = LotPlanner.build(image, load_parking_spots(spots_path), cell=cell)
+    planner.save(cache_path)
+    return planner
+
+
+# ---------- Turn-by-turn ----------
+def heading(p1, p2):
+    # Degrees clockwise from "up" on screen, as the navigation arrow uses
+    return math.degrees(math.atan2(p2[0] - p1[0], p1[1] - p2[1])) % 360
+
+
+def turn_name(diff):
+    diff %= 360
+    if diff <= 30 or diff >= 330:
+        return "Straight"
+    return "Right" if diff < 180 else "Left"
+
+
+def simplify_path(path, tolerance):
+    if len(path) < 3:
+        return list(path)
+    approx = cv2.approxPolyDP(np.array(path, dtype=np.float32).reshape(-1, 1, 2), tolerance, False)
+    return [tuple(p) for p in approx.reshape(-1, 2).tolist()]
+
+
+def instructions(path, tolerance=15):
+    # ["Head Right for 540 px", "Turn Left, then 320 px", ..., "Arrive"]
+    points = simplify_path(path, tolerance)
+    if len(points) < 2:
+        return ["Arrive"]
+    steps = []
+    previous = None
+    for a, b in zip(points, points[1:]):
+        h = heading(a, b)
+        length = math.hypot(b[0] - a[0], b[1] - a[1])
+        if previous is None:
+            steps.append(f"Head {compass(h)} for {length:.0f} px")
+        else:
+            turn = turn_name(h - previous)
+            steps.append(f"Continue {length:.0f} px" if turn == "Straight" else f"Turn {turn}, then {length:.0f} px")
+        previous = h
+    steps.append("Arrive")
+    return steps
+
+
+def compass(h):
+    names = ["up", "up-right", "right", "down-right", "down", "down-left", "left", "up-left"]
+    return names[int(((h + 22.5) % 360) // 45)]
+
+
+def next_waypoint(path, point, lookahead):
+    # First waypoint at least lookahead pixels away, used to steer the live arrow
+    for p in path:
+        if math.hypot(p[0] - point[0], p[1] - point[1]) >= lookahead:
+            return p
+    return path[-1] if path else None
@@ -0,0 +1,130 @@
+import os
+import threading
+from collections import OrderedDict
+from datetime import date
+
+import numpy as np
+
+from smart_parking.models import get_occupancy_predictor
+
+SECONDS_PER_DAY = 24 * 3600
+COMPACT_MODEL = "parking_predictor_model.npz"
+LEGACY_MODEL = "parking_predictor_model.joblib"
+DEFAULT_CAPACITY = 35
+MAX_TABLES = 64  # per-day, per-camera tables of compact models kept in memory
+
+
+def default_model():
+    # The compact dated model once model_gen.py has written one, else the legacy forest
+    return COMPACT_MODEL if os.path.exists(COMPACT_MODEL) else LEGACY_MODEL
+
+
+def time_to_seconds(hhmmss):
+    h = int(hhmmss[:2])
+    m = int(hhmmss[2:4])
+    s = int(hhmmss[4:6])
+    return h * 3600 + m * 60 + s
+
+
+# ---------- Daily prediction curve as a lookup table ----------
+class PredictionTable:
+    # The legacy model only depends on the time of day and the compact one on
+    # the date and camera too, so a whole day is predicted once in a single
+    # vectorized call and queries interpolate linearly between the two
+    # neighbouring samples.
+
+    def __init__(self, counts, resolution_s, capacity=None):
+        self.resolution_s = resolution_s
+        self.capacity = capacity
+        # One extra sample at 24:00 equal to 00:00 so interpolation wraps around midnight
+        self.counts = np.append(counts, counts[0]).astype(np.float64)
+        self._values = self.counts.tolist()  # plain floats for the scalar fast path
+
+    @classmethod
+    def from_model(cls, model, resolution_s=60, day=None, camera=None):
+        if hasattr(model, "day_curve"):
+            return cls(model.day_curve(day or date.today(), camera, resolution_s), resolution_s,
+                       model.capacity(camera))
+        seconds = np.arange(0, SECONDS_PER_DAY, resolution_s)
+        return cls(model.predict(seconds.reshape(-1, 1)), resolution_s)
+
+    def times(self):
+        return np.arange(0, SECONDS_PER_DAY, self.resolution_s)
+
+    def curve(self):
+        return self.times(), self.counts[:-1]
+
+    def predict_count(self, seconds):
+        # Scalar: a few float operations; array: vectorized interpolation
+        if np.ndim(seconds) == 0:
+            pos = (seconds % SECONDS_PER_DAY) / self.resolution_s
+            i = int(pos)
+            frac = pos - i
+            return self._values[i] + (self._values[i + 1] - self._values[i]) * frac
+        pos = (np.asarray(seconds) % SECONDS_PER_DAY) / self.resolution_s
+        i = pos.astype(np.intp)
+        frac = pos - i
+        return self.counts[i] + (self.counts[i + 1] - self.counts[i]) * frac
+
+    def predict_probability(self, hhmmss, max_capacity=None):
+        # Without max_capacity, the camera capacity the model was trained with
+        max_capacity = max_capacity or self.capacity or DEFAULT_CAPACITY
+        predicted_vehicles = self.predict_count(time_to_seconds(hhmmss))
+        prob = max(0.0, min(1.0, 1 - predicted_vehicles / max_capacity))
+        return prob, predicted_vehicles
+
+
+# ---------- Build once per model version, cache to disk ----------
+_tables = OrderedDict()  # least recently used first
+_lock = threading.Lock()
+
+
+def prediction_cache_path(model_path, resolution_s):
+    root, _ = os.path.splitext(model_path)
+    return f"{root}.curve_{resolution_s}s.npy"
+
+
+def _table_key(model_path, resolution_s, day, camera):
+    if model_path.endswith(".npz"):
+        return model_path, resolution_s, day or date.today(), camera
+    return model_path, resolution_s
+
+
+def prediction_table_cached(model_path=None, resolution_s=60, day=None, camera=None):
+    # True when get_prediction_table would answer from memory, without
+    # loading the model (callers on an event loop load it in a thread instead)
+    model_path = model_path or default_model()
+    with _lock:
+        cached = _tables.get(_table_key(model_path, resolution_s, day, camera))
+        return (cached is not None and os.path.exists(model_path)
+                and cached[0] == os.path.getmtime(model_path))
+
+
+def get_prediction_table(model_path=None, resolution_s=60, day=None, camera=None):
+    # The on-disk table is rebuilt only when the model file is newer than it,
+    # so a retrained model is picked up without loading sklearn on every query.
+    # Compact models are cheap to load and differ per day and camera, so their
+    # tables are only kept in memory.
+    model_path = model_path or default_model()
+    with _lock:
+        version = os.path.getmtime(model_path)
+        compact = model_path.endswith(".npz")
+        key = _table_key(model_path, resolution_s, day, camera)
+        cached = _tables.get(key)
+        if cached is not None and cached[0] == version:
+            _tables.move_to_end(key)
+            return cached[1]
+
+        cache_path = prediction_cache_path(model_path, resolution_s)
+        if compact:
+            table = PredictionTable.from_model(get_occupancy_predictor(model_path), resolution_s, day, camera)
+        elif os.path.exists(cache_path) and os.path.getmtime(cache_path) >= version:
+            table = PredictionTable(np.load(cache_path)[:-1], resolution_s)
+        else:
+            table = PredictionTable.from_model(get_occupancy_predictor(model_path), resolution_s)
+            np.save(cache_path, table.counts)
+        _tables[key] = (version, table)
+        _tables.move_to_end(key)
+        while len(_tables) > MAX_TABLES:
+            _tables.popitem(last=False)
+        return table
@@ -0,0 +1,207 @@
+import json
+from datetime import timedelta
+
+import numpy as np
+
+from smart_parking.history import EPOCH, SECONDS_PER_DAY
+from smart_parking.spots import load_parking_spots
+
+DEFAULT_CAPACITY = 35
+
+FEATURES = ["time_of_day", "tod_sin", "tod_cos", "day_of_week", "dow_sin", "dow_cos", "weekend",
+            "doy_sin", "doy_cos", "capacity"]
+
+
+# ---------- Features ----------
+def time_features(times, capacity):
+    # times are history store times (local seconds since 1970-01-01); the
+    # cyclic encodings make 23:59 close to 00:00 and Sunday close to Monday
+    times = np.asarray(times, dtype=np.int64)
+    days = times // SECONDS_PER_DAY
+    tod = (times % SECONDS_PER_DAY).astype(np.float64)
+    dow = (days + 3) % 7  # 1970-01-01 was a Thursday; Monday = 0
+    doy = (days - days_to_year_start(days)).astype(np.float64)
+    tod_angle = 2 * np.pi * tod / SECONDS_PER_DAY
+    dow_angle = 2 * np.pi * dow / 7
+    doy_angle = 2 * np.pi * doy / 365.25
+    columns = [tod, np.sin(tod_angle), np.cos(tod_angle), dow, np.sin(dow_angle), np.cos(dow_angle),
+               (dow >= 5).astype(np.float64), np.sin(doy_angle), np.cos(doy_angle),
+               np.broadcast_to(np.asarray(capacity, dtype=np.float64), tod.shape)]
+    return np.column_stack(columns).astype(np.float32)
+
+
+def days_to_year_start(days):
+    years = (np.asarray(days).astype("datetime64[D]")).astype("datetime64[Y]")
+    return years.astype("datetime64[D]").astype(np.int64)
+
+
+def store_day(day):
+    return (day - EPOCH).days
+
+
+def camera_capacities(config):
+    # {camera id: number of spot polygons} from a cameras.json config
+    return {camera["id"]: len(load_parking_spots(camera["spots"])) for camera in config["cameras"]}
+
+
+# ---------- Compact forest ----------
+class OccupancyPredictor:
+    # A regression forest flattened into plain arrays (one node table for all
+    # trees), saved as a single .npz. Loading is one np.load, prediction is a
+    # vectorized walk of every tree at once, and neither imports sklearn.
+    # The target is the occupied fraction of a camera's spots, so cameras of
+    # different sizes share one model; counts are fraction * capacity.
+    # update() trains extra trees on new days and drops the oldest ones, so
+    # daily retraining does not revisit the whole history.
+
+    def __init__(self, feature, threshold, left, right, value, roots, tree_days, capacities, max_depth):
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.value = value
+        self.roots = roots
+        self.tree_days = tree_days
+        self.capacities = dict(capacities)
+        self.max_depth = int(max_depth)
+        # Traversal tables: leaves point to themselves and never go right, so
+        # every sample can take exactly max_depth steps without branching
+        nodes = np.arange(len(feature))
+        leaf = feature < 0
+        self._children = np.stack([np.where(leaf, nodes, left), np.where(leaf, nodes, right)], axis=1).ravel()
+        self._feature = np.where(leaf, 0, feature).astype(np.intp)
+        self._threshold = np.where(leaf, np.inf, threshold)
+
+    # ----- training (needs sklearn) -----
+    @staticmethod
+    def _train_trees(times, fractions, capacity, n_estimators, n_jobs, max_depth, min_samples_leaf, seed):
+        from sklearn.ensemble import RandomForestRegressor
+
+        # Half-size bootstrap samples and feature subsets keep the trees small
+        # and decorrelated; the minute-level history is dense enough for it
+        forest = RandomForestRegressor(n_estimators=n_estimators, max_depth=max_depth,
+                                       min_samples_leaf=min_samples_leaf, max_samples=0.5, max_features=0.5,
+                                       n_jobs=n_jobs, random_state=seed)
+        forest.fit(time_features(times, capacity), fractions)
+        return [estimator.tree_ for estimator in forest.estimators_]
+
+    @classmethod
+    def fit(cls, times, counts, capacity, n_estimators=40, n_jobs=-1, max_depth=12, min_samples_leaf=20,
+            seed=42, capacities=None):
+        # capacity: per-sample spot count (array) or one number
+        capacity = np.broadcast_to(np.asarray(capacity, dtype=np.float64), np.shape(times))
+        fractions = np.asarray(counts, dtype=np.float64) / np.maximum(capacity, 1)
+        trees = cls._train_trees(times, fractions, capacity, n_estimators, n_jobs, max_depth, min_samples_leaf, seed)
+        last_day = int(np.max(times) // SECONDS_PER_DAY) if len(times) else 0
+        return cls._from_trees(trees, [last_day] * len(trees), capacities or {}, max_depth)
+
+    def update(self, times, counts, capacity, n_estimators=10, max_trees=120, n_jobs=-1, min_samples_leaf=20,
+               seed=None, capacities=None):
+        # Warm start: trees trained on a recent window join the forest; beyond
+        # max_trees the oldest are dropped so the model follows recent habits.
+        # The window must span a whole week: within a single day the weekday
+        # features are constant, so such trees cannot learn them, and once the
+        # original trees are dropped the forest would lose the weekly pattern.
+        n_days = len(np.unique(np.asarray(times) // SECONDS_PER_DAY))
+        if n_days < 7:
+            print(f"⚠️ Updating from {n_days} day(s) of history; trees need at least 7 to learn the day of week")
+        capacity = np.broadcast_to(np.asarray(capacity, dtype=np.float64), np.shape(times))
+        fractions = np.asarray(counts, dtype=np.float64) / np.maximum(capacity, 1)
+        seed = len(self.roots) if seed is None else seed
+        n_estimators = min(n_estimators, max_trees)  # never more trees than the forest keeps
+        new_trees = self._train_trees(times, fractions, capacity, n_estimators, n_jobs, self.max_depth,
+                                      min_samples_leaf, seed)
+        last_day = int(np.max(times) // SECONDS_PER_DAY)
+        old = [self._tree(i) for i in range(len(self.roots))]
+        keep = old[max(0, len(old) + len(new_trees) - max_trees):]
+        kept_days = list(self.tree_days[len(old) - len(keep):])
+        updated = self._from_arrays(keep + [_tree_arrays(t) for t in new_trees], kept_days + [last_day] * len(new_trees),
+                                    {**self.capacities, **(capacities or {})}, self.max_depth)
+        self.__dict__.update(updated.__dict__)
+        return self
+
+    @classmethod
+    def _from_trees(cls, trees, tree_days, capacities, max_depth):
+        return cls._from_arrays([_tree_arrays(t) for t in trees], tree_days, capacities, max_depth)
+
+    @classmethod
+    def _from_arrays(cls, trees, tree_days, capacities, max_depth):
+        # Concatenates per-tree node arrays, shifting child indices by each tree's offset
+        feature, threshold, left, right, value, roots = [], [], [], [], [], []
+        offset = 0
+        for f, t, l, r, v in trees:
+            roots.append(offset)
+            feature.append(f)
+            threshold.append(t)
+            left.append(np.where(l >= 0, l + offset, -1))
+            right.append(np.where(r >= 0, r + offset, -1))
+            value.append(v)
+            offset += len(f)
+        return cls(np.concatenate(feature).astype(np.int16), np.concatenate(threshold).astype(np.float64),
+                   np.concatenate(left).astype(np.int32), np.concatenate(right).astype(np.int32),
+                   np.concatenate(value).astype(np.float32), np.array(roots, dtype=np.int32),
+                   np.array(tree_days, dtype=np.int32), capacities, max_depth)
+
+    def _tree(self, i):
+        start = self.roots[i]
+        end = self.roots[i + 1] if i + 1 < len(self.roots) else len(self.feature)
+        shift = lambda a: np.where(a >= 0, a - start, -1)  # noqa: E731
+        return (self.feature[start:end], self.threshold[start:end], shift(self.left[start:end]),
+                shift(self.right[start:end]), self.value[start:end])
+
+    # ----- prediction -----
+    def predict_fraction(self, times, capacity):
+        X = time_features(times, capacity).T
+        n = X.shape[1]
+        X = X.ravel()
+        nodes = np.repeat(self.roots[:, None], n, axis=1)  # (trees, samples)
+        samples = np.arange(n)[None, :]
+        for _ in range(self.max_depth):
+            go_right = X[self._feature[nodes] * n + samples] > self._threshold[nodes]
+            nodes = self._children[2 * nodes + go_right]
+        return self.value[nodes].mean(axis=0)
+
+    def capacity(self, camera=None):
+        if camera is not None and camera in self.capacities:
+            return self.capacities[camera]
+        if len(self.capacities) == 1:
+            return next(iter(self.capacities.values()))
+        return DEFAULT_CAPACITY
+
+    def predict_count(self, times, camera=None):
+        capacity = self.capacity(camera)
+        return self.predict_fraction(times, capacity) * capacity
+
+    def day_curve(self, day, camera=None, resolution_s=60):
+        # Predicted counts for every resolution_s of one date
+        start = store_day(day) * SECONDS_PER_DAY
+        return self.predict_count(start + np.arange(0, SECONDS_PER_DAY, resolution_s), camera)
+
+    # ----- storage -----
+    def save(self, path):
+        meta = {"capacities": self.capacities, "max_depth": self.max_depth, "features": FEATURES}
+        np.savez(path, feature=self.feature, threshold=self.threshold, left=self.left, right=self.right,
+                 value=self.value, roots=self.roots, tree_days=self.tree_days, meta=np.array(json.dumps(meta)))
+
+    @classmethod
+    def load(cls, path):
+        data = np.load(path)
+        meta = json.loads(str(data["meta"]))
+        if meta.get("features") != FEATURES:
+            raise ValueError(f"{path} was trained with different features; retrain it")
+        return cls(data["feature"], data["threshold"], data["left"], data["right"], data["value"], data["roots"],
+                   data["tree_days"], meta["capacities"], meta["max_depth"])
+
+    def trained_until(self):
+        # Last day of history any of the trees has seen
+        return EPOCH + timedelta(days=int(self.tree_days.max())) if len(self.tree_days) else None
+
+    def summary(self):
+        return (f"{len(self.roots)} trees, {len(self.feature)} nodes, "
+                f"trained until {self.trained_until()}, capacities {self.capacities}")
+
+
+def _tree_arrays(tree):
+    # sklearn Tree -> (feature, threshold, left, right, value); leaves have feature -1
+    feature = np.where(tree.children_left >= 0, tree.feature, -1)
+    return feature, tree.threshold, tree.children_left, tree.children_right, tree.value.reshape(-1)
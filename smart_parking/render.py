@@ -0,0 +1,203 @@
+import argparse
+import time
+from collections import deque
+
+import cv2
+import numpy as np
+
+
+# ---------- Pre-rotated sprites ----------
+class ArrowSprites:
+    # Every rotation of a BGRA icon, computed once, stored pre-multiplied:
+    # drawing is then out = color + roi * (1 - alpha) on a small patch, with
+    # no warpAffine or float blending per frame.
+
+    def __init__(self, icon, step=5):
+        self.step = step
+        self.size = icon.shape[:2]
+        self.colors, self.inverse_alphas = [], []
+        h, w = self.size
+        for i in range(360 // step):
+            M = cv2.getRotationMatrix2D((w // 2, h // 2), -i * step, 1.0)
+            rotated = cv2.warpAffine(icon, M, (w, h), flags=cv2.INTER_LINEAR,
+                                     borderMode=cv2.BORDER_CONSTANT, borderValue=(0, 0, 0, 0))
+            alpha = rotated[:, :, 3:4].astype(np.uint16)
+            self.colors.append(((rotated[:, :, :3] * alpha + 127) // 255).astype(np.uint8))
+            self.inverse_alphas.append(np.repeat(255 - alpha, 3, axis=2).astype(np.uint8))
+
+    def index(self, angle):
+        return int(round(angle / self.step)) % len(self.colors)
+
+    def draw(self, frame, center, angle):
+        # Blends the sprite centered at center; returns the touched rectangle
+        i = self.index(angle)
+        h, w = self.size
+        x1, y1 = int(center[0]) - w // 2, int(center[1]) - h // 2
+        rect = clip_rect((x1, y1, x1 + w, y1 + h), frame.shape)
+        if rect is None:
+            return None
+        rx1, ry1, rx2, ry2 = rect
+        sx, sy = rx1 - x1, ry1 - y1
+        roi = frame[ry1:ry2, rx1:rx2]
+        color = self.colors[i][sy:sy + ry2 - ry1, sx:sx + rx2 - rx1]
+        inverse = self.inverse_alphas[i][sy:sy + ry2 - ry1, sx:sx + rx2 - rx1]
+        cv2.add(cv2.multiply(roi, inverse, scale=1 / 255.0), color, dst=roi)
+        return rect
+
+
+def clip_rect(rect, shape):
+    x1, y1, x2, y2 = rect
+    x1, y1 = max(x1, 0), max(y1, 0)
+    x2, y2 = min(x2, shape[1]), min(y2, shape[0])
+    if x1 >= x2 or y1 >= y2:
+        return None
+    return x1, y1, x2, y2
+
+
+# ---------- Frame timing ----------
+class FrameTimer:
+    def __init__(self, history=1000):
+        self.times = deque(maxlen=history)
+        self.frames = 0
+        self._start = None
+
+    def start(self):
+        self._start = time.perf_counter()
+
+    def stop(self):
+        self.times.append(time.perf_counter() - self._start)
+        self.frames += 1
+
+    def stats(self):
+        if not self.times:
+            return {"frames": 0, "mean_ms": 0.0, "p95_ms": 0.0}
+        times = np.array(self.times) * 1000
+        return {"frames": self.frames, "mean_ms": round(float(times.mean()), 3),
+                "p95_ms": round(float(np.percentile(times, 95)), 3)}
+
+    def summary(self):
+        s = self.stats()
+        return f"Rendering: {s['frames']} frames, {s['mean_ms']} ms mean, {s['p95_ms']} ms p95"
+
+
+# ---------- Dirty-rectangle renderer ----------
+class NavRenderer:
+    # Keeps one output frame per viewer. Between frames only the rectangles
+    # drawn last time (car, arrow, text, path) are restored from the static
+    # base layer, so a frame costs a few small copies instead of a full
+    # canvas copy. Call refresh() after drawing on the base layer.
+
+    def __init__(self, base, sprites):
+        self.base = base
+        self.sprites = sprites
+        self.frame = base.copy()
+        self.dirty = []
+        self.timer = FrameTimer()
+
+    def refresh(self, rect=None):
+        if rect is None:
+            self.frame[:] = self.base
+            self.dirty = []
+            return
+        self._restore(rect)
+
+    def _restore(self, rect):
+        rect = clip_rect(rect, self.frame.shape)
+        if rect is not None:
+            x1, y1, x2, y2 = rect
+            self.frame[y1:y2, x1:x2] = self.base[y1:y2, x1:x2]
+
+    def _mark(self, rect):
+        rect = clip_rect(rect, self.frame.shape)
+        if rect is not None:
+            self.dirty.append(rect)
+
+    def begin(self):
+        self.timer.start()
+        for rect in self.dirty:
+            self._restore(rect)
+        self.dirty = []
+
+    def end(self):
+        self.timer.stop()
+        return self.frame
+
+    # ----- primitives -----
+    def car(self, center, radius, color, angle):
+        x, y = int(center[0]), int(center[1])
+        cv2.circle(self.frame, (x, y), radius, color, -1)
+        self._mark((x - radius - 1, y - radius - 1, x + radius + 2, y + radius + 2))
+        rect = self.sprites.draw(self.frame, (x, y), angle)
+        if rect is not None:
+            self.dirty.append(rect)
+
+    def text(self, text, org, scale, color, thickness, font=cv2.FONT_HERSHEY_SIMPLEX):
+        if not text:
+            return
+        (w, h), baseline = cv2.getTextSize(text, font, scale, thickness)
+        cv2.putText(self.frame, text, org, font, scale, color, thickness)
+        x, y = org
+        self._mark((x - thickness, y - h - thickness, x + w + thickness, y + baseline + thickness))
+
+    def polyline(self, points, color, thickness):
+        if len(points) < 2:
+            return
+        pts = np.asarray(points, dtype=np.int32)
+        cv2.polylines(self.frame, [pts], False, color, thickness)
+        # One rectangle per segment so an L-shaped path does not dirty its whole bounding box
+        pad = thickness
+        for (x1, y1), (x2, y2) in zip(pts[:-1].tolist(), pts[1:].tolist()):
+            self._mark((min(x1, x2) - pad, min(y1, y2) - pad, max(x1, x2) + pad + 1, max(y1, y2) + pad + 1))
+
+
+def arrow_icon(size=40, color=(0, 0, 255, 255)):
+    icon = np.zeros((size, size, 4), dtype=np.uint8)
+    s = size / 40.0
+    pts = (np.array([[20, 5], [5, 35], [35, 35]]) * s).astype(np.int32)
+    cv2.fillPoly(icon, [pts], color)
+    return icon
+
+
+# ---------- Headless benchmark ----------
+def simulate(base, users, frames, step=20, seed=0):
+    # Random-walking cars, one renderer (and output frame) per simulated viewer
+    rng = np.random.default_rng(seed)
+    sprites = ArrowSprites(arrow_icon())
+    h, w = base.shape[:2]
+    renderers = [NavRenderer(base, sprites) for _ in range(users)]
+    positions = rng.uniform((0, 0), (w, h), size=(users, 2))
+    moves = np.array([(0, -step), (step, 0), (0, step), (-step, 0)])
+    start = time.perf_counter()
+    for _ in range(frames):
+        direction = rng.integers(0, 4, size=users)
+        positions = np.clip(positions + moves[direction], 0, (w - 1, h - 1))
+        for renderer, pos, d in zip(renderers, positions, direction):
+            renderer.begin()
+            renderer.polyline([pos, pos + (200, 0), pos + (200, 150)], (255, 128, 0), 3)
+            renderer.car(pos, 15, (139, 0, 0), d * 90)
+            renderer.text("Navigate to spot 1", (w // 2 - 150, 60), 1, (0, 0, 0), 2)
+            renderer.text("Straight", (w // 2 - 60, 100), 1, (0, 0, 0), 2)
+            renderer.end()
+    elapsed = time.perf_counter() - start
+    return renderers, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure navigation frame rendering time headlessly.")
+    parser.add_argument("--blueprint", default="navigation/layout.png")
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--frames", type=int, default=200)
+    args = parser.parse_args()
+
+    base = cv2.imread(args.blueprint)
+    if base is None:
+        raise FileNotFoundError(f"Could not load blueprint {args.blueprint}")
+    renderers, elapsed = simulate(base, args.users, args.frames)
+    total = args.users * args.frames
+    print(f"🖼️ {total} frames for {args.users} users in {elapsed:.2f}s "
+          f"({total / elapsed:.0f} frames/s, {elapsed / total * 1000:.3f} ms per frame)")
+    print(renderers[0].timer.summary())
+
+
+if __name__ == "__main__":
+    main()
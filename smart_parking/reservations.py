@@ -0,0 +1,352 @@
+import argparse
+import itertools
+import threading
+import time
+from collections import namedtuple
+
+import numpy as np
+
+from smart_parking.spotindex import SpotIndex
+
+Hold = namedtuple("Hold", ["spot", "token", "client", "expires"])
+
+
+# ---------- Packed bitsets ----------
+def bitset(n):
+    return np.zeros((n + 7) // 8, dtype=np.uint8)
+
+
+def test_bit(bits, i):
+    return bool(bits[i >> 3] & (1 << (i & 7)))
+
+
+def set_bit(bits, i):
+    bits[i >> 3] |= 1 << (i & 7)
+
+
+def clear_bit(bits, i):
+    bits[i >> 3] &= ~np.uint8(1 << (i & 7))
+
+
+def unpack(bits, n):
+    return np.unpackbits(bits, count=n, bitorder="little").astype(bool)
+
+
+def pack(values):
+    return np.packbits(np.asarray(values, dtype=bool), bitorder="little")
+
+
+# ---------- TTL expiry ----------
+class TimerWheel:
+    # Hashed timer wheel: a deadline goes into slot (deadline // resolution)
+    # % slots, and advancing the clock only visits the slots that passed.
+    # Cancelled entries are not removed; the owner ignores them when they
+    # fire (the reservation token no longer matches).
+
+    def __init__(self, resolution=1.0, slots=512, now=0.0):
+        self.resolution = resolution
+        self.slots = [[] for _ in range(slots)]
+        self.current = int(now // resolution)
+
+    def schedule(self, deadline, item):
+        tick = max(int(deadline // self.resolution), self.current)
+        self.slots[tick % len(self.slots)].append((deadline, item))
+
+    def advance(self, now):
+        # Returns the items whose deadline is <= now
+        target = int(now // self.resolution)
+        due = []
+        # A full turn visits every slot once; more would revisit the same ones
+        for tick in range(self.current, min(target, self.current + len(self.slots) - 1) + 1):
+            slot = self.slots[tick % len(self.slots)]
+            if not slot:
+                continue
+            keep = []
+            for entry in slot:
+                if entry[0] <= now:
+                    due.append(entry[1])
+                else:
+                    keep.append(entry)
+            slot[:] = keep
+        # Callers read the clock before taking the lock, so now can step back slightly
+        self.current = max(self.current, target)
+        return due
+
+
+# ---------- Reservations ----------
+class ReservationBook:
+    # Per-spot reservation state as three packed bitsets:
+    #   held      a driver was sent there and has ttl seconds to arrive
+    #   claimed   the driver parked (confirmed by the app)
+    #   occupied  the detector sees a car that nobody claimed
+    #   seen      the detector has seen the claimed car (so a claimed spot
+    #             reported empty is only freed once the car was there)
+    # Every transition happens under one lock, so a spot can never be handed
+    # to two drivers. Each hold gets a unique token; a late release or claim
+    # with an expired token is rejected instead of touching the next holder.
+    # reconcile() folds in the detector's confirmed occupancy.
+
+    def __init__(self, n_spots, default_ttl=120.0, centers=None, wheel_resolution=1.0, now=None,
+                 listener=None):
+        now = time.time() if now is None else now
+        self.n_spots = n_spots
+        self.default_ttl = default_ttl
+        self.held = bitset(n_spots)
+        self.claimed = bitset(n_spots)
+        self.occupied = bitset(n_spots)
+        self.seen = bitset(n_spots)
+        self.token = np.zeros(n_spots, dtype=np.int64)
+        self.client = [None] * n_spots
+        self.expires = np.zeros(n_spots)
+        self.wheel = TimerWheel(wheel_resolution, now=now)
+        self._tokens = itertools.count(1)
+        self._lock = threading.Lock()
+        self.listener = listener  # called as listener(event, spot, token) under the lock
+        # Optional spatial index of available spots for hold_nearest()
+        self.index = SpotIndex(centers, free=range(n_spots)) if centers is not None else None
+        self.counts = {"held": 0, "claimed": 0, "released": 0, "expired": 0, "rejected": 0, "taken": 0,
+                       "vacated": 0}
+
+    # ----- internal, lock held -----
+    def _available(self, spot):
+        i, bit = spot >> 3, 1 << (spot & 7)
+        return not ((self.held[i] | self.claimed[i] | self.occupied[i]) & bit)
+
+    def _emit(self, event, spot, token):
+        self.counts[event] += 1
+        if self.listener is not None:
+            self.listener(event, spot, token)
+
+    def _grant(self, spot, client, ttl, now):
+        token = next(self._tokens)
+        set_bit(self.held, spot)
+        self.token[spot] = token
+        self.client[spot] = client
+        self.expires[spot] = now + ttl
+        self.wheel.schedule(now + ttl, (spot, token))
+        if self.index is not None:
+            self.index.set_free(spot, False)
+        self._emit("held", spot, token)
+        return Hold(spot, token, client, now + ttl)
+
+    def _free(self, spot, event):
+        token = int(self.token[spot])
+        clear_bit(self.held, spot)
+        clear_bit(self.claimed, spot)
+        clear_bit(self.seen, spot)
+        self.client[spot] = None
+        self.token[spot] = 0
+        if self.index is not None and not test_bit(self.occupied, spot):
+            self.index.set_free(spot, True)
+        self._emit(event, spot, token)
+
+    def _expire(self, now):
+        for spot, token in self.wheel.advance(now):
+            if self.token[spot] == token and test_bit(self.held, spot) and not test_bit(self.claimed, spot):
+                self._free(spot, "expired")
+
+    # ----- public -----
+    def hold(self, spot, client, ttl=None, now=None):
+        # Atomically reserves spot for client; None if it is not available
+        now = time.time() if now is None else now
+        with self._lock:
+            self._expire(now)
+            if not self._available(spot):
+                self.counts["rejected"] += 1
+                return None
+            return self._grant(spot, client, ttl or self.default_ttl, now)
+
+    def hold_nearest(self, point, client, ttl=None, now=None):
+        # Reserves the available spot nearest to point (straight-line)
+        if self.index is None:
+            raise ValueError("hold_nearest needs the book to be created with spot centers")
+        now = time.time() if now is None else now
+        with self._lock:
+            self._expire(now)
+            nearest = self.index.nearest(point)
+            if nearest is None:
+                self.counts["rejected"] += 1
+                return None
+            return self._grant(nearest[0], client, ttl or self.default_ttl, now)
+
+    def hold_first(self, spots, client, ttl=None, now=None):
+        # Reserves the first available spot of a preference list (e.g. by driving distance)
+        now = time.time() if now is None else now
+        with self._lock:
+            self._expire(now)
+            for spot in spots:
+                if self._available(spot):
+                    return self._grant(spot, client, ttl or self.default_ttl, now)
+            self.counts["rejected"] += 1
+            return None
+
+    def claim(self, hold, now=None):
+        # The driver parked: the spot stays theirs until released or the
+        # detector sees it empty. False if the hold already expired.
+        now = time.time() if now is None else now
+        with self._lock:
+            self._expire(now)
+            if self.token[hold.spot] != hold.token:
+                self.counts["rejected"] += 1
+                return False
+            set_bit(self.claimed, hold.spot)
+            self._emit("claimed", hold.spot, hold.token)
+            return True
+
+    def release(self, hold, now=None):
+        now = time.time() if now is None else now
+        with self._lock:
+            self._expire(now)
+            if self.token[hold.spot] != hold.token:
+                return False
+            self._free(hold.spot, "released")
+            return True
+
+    def expire(self, now=None):
+        with self._lock:
+            self._expire(time.time() if now is None else now)
+
+    def reconcile(self, occupied, now=None):
+        # Detector's confirmed occupancy wins over the app's view:
+        #   occupied, held    -> the holder parked: claimed
+        #   occupied, free    -> someone parked without the app: taken
+        #   empty, claimed    -> the car left: free, once the detector has seen
+        #                        it parked (a claim can come before the
+        #                        smoothed detector confirms the car)
+        #   empty, occupied   -> vacated, free again
+        # Holds on empty spots are kept; the driver may still be on the way.
+        now = time.time() if now is None else now
+        occupied = np.asarray(occupied, dtype=bool)
+        with self._lock:
+            self._expire(now)
+            held = unpack(self.held, self.n_spots)
+            claimed = unpack(self.claimed, self.n_spots)
+            was_occupied = unpack(self.occupied, self.n_spots)
+            seen = unpack(self.seen, self.n_spots)
+            for spot in np.flatnonzero(occupied & held & ~claimed):
+                set_bit(self.claimed, spot)
+                self._emit("claimed", int(spot), int(self.token[spot]))
+            for spot in np.flatnonzero(~occupied & claimed & seen):
+                self._free(int(spot), "released")
+            for spot in np.flatnonzero(occupied & held & ~seen):
+                set_bit(self.seen, spot)
+            for spot in np.flatnonzero(occupied & ~held & ~was_occupied):
+                set_bit(self.occupied, spot)
+                if self.index is not None:
+                    self.index.set_free(int(spot), False)
+                self._emit("taken", int(spot), 0)
+            for spot in np.flatnonzero(~occupied & was_occupied):
+                clear_bit(self.occupied, spot)
+                if self.index is not None and not held[spot]:
+                    self.index.set_free(int(spot), True)
+                self._emit("vacated", int(spot), 0)
+
+    def follow(self, state, camera_id):
+        # Reconcile on every occupancy change of one LotState camera
+        state.subscribe(lambda cam, occupied: self.reconcile(occupied) if cam == camera_id else None)
+
+    def available(self):
+        with self._lock:
+            return np.flatnonzero(~(unpack(self.held, self.n_spots) | unpack(self.claimed, self.n_spots)
+                                    | unpack(self.occupied, self.n_spots))).tolist()
+
+    def snapshot(self):
+        # Packed bitsets, ~n_spots / 8 bytes each
+        with self._lock:
+            return {"held": self.held.copy(), "claimed": self.claimed.copy(), "occupied": self.occupied.copy()}
+
+    def summary(self):
+        return "Reservations: " + ", ".join(f"{k} {v}" for k, v in self.counts.items())
+
+
+# ---------- Stress run ----------
+def check_history(events, n_spots):
+    # Replays (event, spot, token) in lock order; returns the violations
+    holder = [0] * n_spots
+    taken = [False] * n_spots
+    errors = []
+    for event, spot, token in events:
+        if event == "held":
+            if holder[spot] or taken[spot]:
+                errors.append(f"spot {spot} held by token {token} while owned by {holder[spot] or 'detector'}")
+            holder[spot] = token
+        elif event == "claimed":
+            if holder[spot] != token:
+                errors.append(f"spot {spot} claimed with stale token {token}")
+        elif event in ("released", "expired"):
+            if holder[spot] != token:
+                errors.append(f"spot {spot} {event} with stale token {token}")
+            holder[spot] = 0
+        elif event == "taken":
+            taken[spot] = True
+        elif event == "vacated":
+            taken[spot] = False
+    return errors
+
+
+def stress(n_spots=2000, clients=16, seconds=5.0, ttl=0.05, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.uniform(0, 1000, size=(n_spots, 2))
+    events = []
+    book = ReservationBook(n_spots, default_ttl=ttl, centers=centers, wheel_resolution=0.01,
+                           listener=lambda *event: events.append(event))
+    stop = threading.Event()
+    ops = [0] * clients
+    detector = np.zeros(n_spots, dtype=bool)
+
+    def client(k):
+        local = np.random.default_rng(seed + k + 1)
+        holds = []
+        while not stop.is_set():
+            action = local.random()
+            if action < 0.4 or not holds:
+                hold = book.hold_nearest(local.uniform(0, 1000, 2), client=k)
+                if hold is not None:
+                    holds.append(hold)
+            elif action < 0.5:
+                book.hold(int(local.integers(n_spots)), client=k)  # contended direct holds
+            elif action < 0.7:
+                book.claim(holds[int(local.integers(len(holds)))])
+            else:
+                book.release(holds.pop(int(local.integers(len(holds)))))
+            ops[k] += 1
+
+    def reconciler():
+        local = np.random.default_rng(seed)
+        while not stop.is_set():
+            flip = local.integers(n_spots, size=n_spots // 50)
+            detector[flip] = ~detector[flip]
+            book.reconcile(detector)
+            time.sleep(0.005)
+
+    threads = [threading.Thread(target=client, args=(k,)) for k in range(clients)]
+    threads.append(threading.Thread(target=reconciler))
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    time.sleep(seconds)
+    stop.set()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    return book, sum(ops) / elapsed, check_history(events, n_spots)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stress the reservation book with concurrent clients.")
+    parser.add_argument("--spots", type=int, default=2000)
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--ttl", type=float, default=0.05, help="hold TTL in seconds (short, to exercise expiry)")
+    args = parser.parse_args()
+
+    book, rate, errors = stress(args.spots, args.clients, args.seconds, args.ttl)
+    print(book.summary())
+    print(f"🔒 {rate:.0f} operations/s from {args.clients} clients, {len(errors)} double assignments")
+    for error in errors[:10]:
+        print("  ", error)
+    raise SystemExit(1 if errors else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,33 @@
+import numpy as np
+
+
+# ---------- Crop regions around configured spots ----------
+def spot_rois(spots, frame_shape, tiles=1, padding=64):
+    # Bounding region(s) of all spot polygons as [(x1, y1, x2, y2), ...].
+    # tiles > 1 groups spots along the longer axis of the lot so that cameras
+    # with spots spread across the view do not end up cropping the whole frame.
+    # padding keeps the full body of vehicles whose center is inside a spot.
+    h, w = frame_shape[:2]
+    bounds = np.array([[min(x for x, _ in s), min(y for _, y in s),
+                        max(x for x, _ in s), max(y for _, y in s)] for s in spots], dtype=np.float32)
+
+    axis = 0 if np.ptp(bounds[:, [0, 2]]) >= np.ptp(bounds[:, [1, 3]]) else 1
+    centers = (bounds[:, axis] + bounds[:, axis + 2]) / 2
+    groups = np.array_split(np.argsort(centers), max(1, min(tiles, len(spots))))
+
+    rois = []
+    for group in groups:
+        x1, y1 = bounds[group, :2].min(axis=0) - padding
+        x2, y2 = bounds[group, 2:].max(axis=0) + padding
+        x1, x2 = np.clip([x1, x2], 0, w).astype(int)
+        y1, y2 = np.clip([y1, y2], 0, h).astype(int)
+        if x2 > x1 and y2 > y1:
+            rois.append((int(x1), int(y1), int(x2), int(y2)))
+    # Spots outside the frame: fall back to detecting on the full frame
+    return rois or [(0, 0, w, h)]
+
+
+def roi_pixel_ratio(rois, frame_shape):
+    # Fraction of the frame's pixels the detector actually sees
+    h, w = frame_shape[:2]
+    return sum((x2 - x1) * (y2 - y1) for x1, y1, x2, y2 in rois) / float(h * w)
@@ -0,0 +1,236 @@
+import asyncio
+import hashlib
+import math
+import re
+import time
+from collections import OrderedDict, namedtuple
+
+# Parking lot (lon, lat)
+DESTINATION = (73.86567022368467, 18.531292153194457)
+
+Route = namedtuple("Route", ["distance_m", "duration_s", "coords"])  # coords: [(lon, lat), ...]
+
+
+# ---------- Cache ----------
+class TTLCache:
+    # LRU with a per-entry time to live: expired entries count as misses
+    # and the least recently used entry is evicted beyond maxsize.
+
+    def __init__(self, maxsize=1024, ttl=3600.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, now=None):
+        now = time.monotonic() if now is None else now
+        entry = self._data.get(key)
+        if entry is None or entry[0] <= now:
+            if entry is not None:
+                del self._data[key]
+            self.misses += 1
+            return None
+        self._data.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, key, value, now=None):
+        now = time.monotonic() if now is None else now
+        self._data[key] = (now + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def __len__(self):
+        return len(self._data)
+
+
+class AsyncMemo:
+    # TTLCache in front of a coroutine: identical keys already in flight share
+    # one call instead of each issuing their own
+
+    def __init__(self, cache):
+        self.cache = cache
+        self._inflight = {}
+        self.coalesced = 0
+
+    async def get(self, key, fetch):
+        value = self.cache.get(key)
+        if value is not None:
+            return value
+        while key in self._inflight:
+            pending = self._inflight[key]
+            self.coalesced += 1
+            try:
+                return await asyncio.shield(pending)
+            except asyncio.CancelledError:
+                # The caller running the fetch was cancelled (e.g. its client
+                # disconnected): take over instead of failing or hanging
+                if not pending.cancelled():
+                    raise
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            value = await fetch()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # mark retrieved when nobody else was waiting
+            raise
+        else:
+            if value is not None:
+                self.cache.put(key, value)
+            future.set_result(value)
+            return value
+        finally:
+            del self._inflight[key]
+
+
+def normalize_address(address):
+    # "  MG Road,Pune " and "mg road, pune" share one cache entry
+    address = re.sub(r"\s*,\s*", ", ", address.strip().lower())
+    return re.sub(r"\s+", " ", address)
+
+
+def grid_cell(coords, cell_deg):
+    # Origins in the same cell (~cell_deg * 111 km wide) share a route
+    return (round(coords[0] / cell_deg), round(coords[1] / cell_deg))
+
+
+def haversine_m(a, b):
+    lon1, lat1, lon2, lat2 = map(math.radians, (a[0], a[1], b[0], b[1]))
+    h = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * 6371000 * math.asin(math.sqrt(h))
+
+
+# ---------- Backends ----------
+class ORSBackend:
+    # openrouteservice (Pelias geocoding + driving directions). The client is
+    # synchronous, so calls run in the default executor.
+
+    def __init__(self, key=None, key_path="maps_integration/key.txt", profile="driving-car"):
+        import openrouteservice
+
+        if key is None:
+            with open(key_path) as f:
+                key = f.read().strip()
+        self.client = openrouteservice.Client(key=key)
+        self.profile = profile
+
+    async def geocode(self, address):
+        result = await asyncio.get_running_loop().run_in_executor(None, self.client.pelias_search, address)
+        features = result.get("features")
+        if not features:
+            return None
+        return tuple(features[0]["geometry"]["coordinates"])  # (lon, lat)
+
+    async def route(self, origin, destination):
+        def directions():
+            return self.client.directions(coordinates=[origin, destination], profile=self.profile, format="geojson")
+
+        result = await asyncio.get_running_loop().run_in_executor(None, directions)
+        feature = result["features"][0]
+        summary = feature["properties"]["summary"]
+        return Route(summary["distance"], summary["duration"], [tuple(c) for c in feature["geometry"]["coordinates"]])
+
+
+class OfflineBackend:
+    # Stand-in for tests and offline use: known addresses from a dict, others
+    # hashed to a stable point near the lot; routes are straight lines
+    # stretched by a detour factor at a fixed speed.
+
+    def __init__(self, places=None, center=DESTINATION, radius_deg=0.05, speed_kmh=25.0, detour=1.3, delay=0.0):
+        self.places = {normalize_address(k): tuple(v) for k, v in (places or {}).items()}
+        self.center = center
+        self.radius_deg = radius_deg
+        self.speed_ms = speed_kmh / 3.6
+        self.detour = detour
+        self.delay = delay  # simulated network latency in seconds
+        self.calls = 0
+
+    async def geocode(self, address):
+        self.calls += 1
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        key = normalize_address(address)
+        if key in self.places:
+            return self.places[key]
+        digest = hashlib.blake2b(key.encode(), digest_size=8).digest()
+        dx = (int.from_bytes(digest[:4], "little") / 2 ** 32 - 0.5) * 2 * self.radius_deg
+        dy = (int.from_bytes(digest[4:], "little") / 2 ** 32 - 0.5) * 2 * self.radius_deg
+        return (self.center[0] + dx, self.center[1] + dy)
+
+    async def route(self, origin, destination):
+        self.calls += 1
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        distance = haversine_m(origin, destination) * self.detour
+        return Route(distance, distance / self.speed_ms, [tuple(origin), tuple(destination)])
+
+
+# ---------- Routing service ----------
+class RoutingService:
+    # Geocodes and routes through a backend with two caches:
+    #   geocodes by normalized address
+    #   routes by (origin grid cell, destination)
+    # Identical queries already in flight share one backend call instead of
+    # each issuing their own.
+
+    def __init__(self, backend, geocode_ttl=7 * 24 * 3600, route_ttl=15 * 60, cache_size=4096, cell_deg=0.005):
+        self.backend = backend
+        self.geocodes = TTLCache(cache_size, geocode_ttl)
+        self.routes = TTLCache(cache_size, route_ttl)
+        self.cell_deg = cell_deg
+        self._geocode_memo = AsyncMemo(self.geocodes)
+        self._route_memo = AsyncMemo(self.routes)
+
+    @property
+    def coalesced(self):
+        return self._geocode_memo.coalesced + self._route_memo.coalesced
+
+    async def geocode(self, address):
+        key = normalize_address(address)
+        return await self._geocode_memo.get(key, lambda: self.backend.geocode(address))
+
+    async def route(self, origin, destination=DESTINATION):
+        key = (grid_cell(origin, self.cell_deg), tuple(destination))
+        return await self._route_memo.get(key, lambda: self.backend.route(tuple(origin), tuple(destination)))
+
+    async def eta(self, address, destination=DESTINATION):
+        # (origin, route) for an address, or (None, None) if it cannot be geocoded
+        origin = await self.geocode(address)
+        if origin is None:
+            return None, None
+        return origin, await self.route(origin, destination)
+
+    def summary(self):
+        return (f"Routing: geocode cache {self.geocodes.hits} hits / {self.geocodes.misses} misses, "
+                f"route cache {self.routes.hits} hits / {self.routes.misses} misses, {self.coalesced} coalesced")
+
+
+# ---------- Map (optional) ----------
+def route_map(origin, destination, route, path="route_map.html", open_browser=False):
+    # Only built on request; folium is imported here so ETA queries never load it
+    import folium
+
+    m = folium.Map(location=[(origin[1] + destination[1]) / 2, (origin[0] + destination[0]) / 2], zoom_start=12)
+    folium.Marker(location=[origin[1], origin[0]], popup="Origin", icon=folium.Icon(color="green")).add_to(m)
+    folium.Marker(location=[destination[1], destination[0]], popup="Destination",
+                  icon=folium.Icon(color="red")).add_to(m)
+    folium.PolyLine([(lat, lon) for lon, lat in route.coords], color="blue", weight=5, opacity=0.7).add_to(m)
+    m.save(path)
+    if open_browser:
+        import webbrowser
+        webbrowser.open(path)
+    return path
+
+
+def google_maps_url(origin, destination):
+    return (f"https://www.google.com/maps/dir/?api=1"
+            f"&origin={origin[1]},{origin[0]}"
+            f"&destination={destination[1]},{destination[0]}"
+            f"&travelmode=driving")
@@ -0,0 +1,270 @@
+import argparse
+import asyncio
+import functools
+import json
+import multiprocessing as mp
+import os
+import queue
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+import numpy as np
+
+from smart_parking.api import AvailabilityAPI
+from smart_parking.batching import BatchScheduler
+from smart_parking.history import OccupancyStore
+from smart_parking.spots import load_parking_spots
+
+# Per-camera options passed through to stream_occupancy
+STREAM_OPTIONS = ["max_queue", "drop_stale", "motion_threshold", "max_stale", "roi_tiles", "roi_padding", "imgsz",
+                  "smooth_window", "smooth_required"]
+
+
+# ---------- Shared lot state ----------
+class LotState:
+    # Latest occupancy of every camera's spots plus per-camera throughput.
+    # Readers (navigation, prediction, the API) get copies; listeners are
+    # called with (camera_id, occupied) whenever a camera's occupancy changes.
+
+    def __init__(self, spot_counts, fps_window=5.0):
+        self._lock = threading.Lock()
+        self.version = 0
+        self.occupied = {cam: np.zeros(n, dtype=bool) for cam, n in spot_counts.items()}
+        self.known = {cam: False for cam in spot_counts}
+        self.updated = {cam: None for cam in spot_counts}
+        self.lag = {cam: 0.0 for cam in spot_counts}
+        self._frame_times = {cam: deque() for cam in spot_counts}
+        self.fps_window = fps_window
+        self.listeners = []
+
+    def subscribe(self, callback):
+        self.listeners.append(callback)
+
+    def update(self, camera_id, occupied, lag=0.0, now=None):
+        now = time.time() if now is None else now
+        occupied = np.asarray(occupied, dtype=bool)
+        with self._lock:
+            frames = self._frame_times[camera_id]
+            frames.append(now)
+            while frames and now - frames[0] > self.fps_window:
+                frames.popleft()
+            self.updated[camera_id] = now
+            self.lag[camera_id] = lag
+
+            changed = not self.known[camera_id] or not np.array_equal(self.occupied[camera_id], occupied)
+            if changed:
+                self.occupied[camera_id] = occupied.copy()
+                self.known[camera_id] = True
+                self.version += 1
+        if changed:
+            for callback in self.listeners:
+                callback(camera_id, occupied)
+        return changed
+
+    def fps(self, camera_id):
+        with self._lock:
+            frames = self._frame_times[camera_id]
+            if len(frames) < 2:
+                return 0.0
+            return (len(frames) - 1) / max(frames[-1] - frames[0], 1e-6)
+
+    def empty_spots(self, camera_id):
+        with self._lock:
+            return np.flatnonzero(~self.occupied[camera_id]).tolist()
+
+    def free_count(self):
+        with self._lock:
+            return sum(int(np.count_nonzero(~occ)) for cam, occ in self.occupied.items() if self.known[cam])
+
+    def snapshot(self):
+        with self._lock:
+            cameras = {}
+            for cam, occ in self.occupied.items():
+                cameras[cam] = {
+                    "occupied": occ.astype(int).tolist(),
+                    "empty": np.flatnonzero(~occ).tolist(),
+                    "known": self.known[cam],
+                    "updated": self.updated[cam],
+                    "lag_ms": round(self.lag[cam] * 1000, 1),
+                }
+            version = self.version
+        for cam in cameras:
+            cameras[cam]["fps"] = round(self.fps(cam), 2)
+        return {"version": version, "cameras": cameras}
+
+
+# ---------- Camera worker process ----------
+def camera_worker(camera, model_options, results, stop, detect=None):
+    # Runs decode + detect for one camera (in its own process, or in a thread
+    # when detect is a shared scheduler) and reports
+    # (camera_id, occupied, detected, latency, sent_at) tuples
+    from smart_parking.models import get_detector
+    from smart_parking.stream import stream_occupancy
+
+    model = get_detector(**model_options) if detect is None else None
+    options = {k: camera[k] for k in STREAM_OPTIONS if k in camera}
+    if detect is not None and options.get("imgsz"):
+        # The shared scheduler batches this camera's frames by its input size
+        detect = functools.partial(detect, imgsz=options["imgsz"])
+    for result in stream_occupancy(camera["source"], camera["spots"], model, detect=detect, **options):
+        if stop.is_set():
+            break
+        results.put((camera["id"], np.packbits(result.occupied), result.detected,
+                     result.latency, time.time()))
+
+
+# ---------- Server ----------
+class OccupancyServer:
+    # By default every camera gets its own process and detector. With a
+    # "batching" section in the config ({"max_batch": 8, "max_wait_ms": 20})
+    # cameras run as threads that share one detector through a BatchScheduler;
+    # cameras with their own imgsz are batched separately from the others.
+
+    def __init__(self, config):
+        self.config = config
+        self.cameras = {cam["id"]: cam for cam in config["cameras"]}
+        self.spot_counts = {cam_id: len(load_parking_spots(cam["spots"])) for cam_id, cam in self.cameras.items()}
+        self.state = LotState(self.spot_counts)
+        self.model_options = {k: config[k] for k in ("weights", "export", "imgsz") if config.get(k)}
+
+        store = OccupancyStore(config["store"]) if config.get("store") else None
+        self.history = {cam_id: store.writer(cam_id, n) for cam_id, n in self.spot_counts.items()} if store else {}
+
+        self.scheduler = None
+        batching = config.get("batching")
+        if batching:
+            from smart_parking.models import get_detector
+            model_options = dict(self.model_options)
+            imgsz = model_options.get("imgsz")
+            self.scheduler = BatchScheduler(get_detector(**model_options),
+                                            max_batch=batching.get("max_batch", 8),
+                                            max_wait=batching.get("max_wait_ms", 20) / 1000.0,
+                                            **({"imgsz": imgsz} if imgsz else {}))
+            self.results = queue.Queue(maxsize=1024)
+            self.stop_event = threading.Event()
+            self.processes = [threading.Thread(target=camera_worker, name=f"camera-{cam_id}", daemon=True,
+                                               args=(cam, None, self.results, self.stop_event,
+                                                     self.scheduler.detect))
+                              for cam_id, cam in self.cameras.items()]
+        else:
+            ctx = mp.get_context("spawn")
+            self.results = ctx.Queue(maxsize=1024)
+            self.stop_event = ctx.Event()
+            self.processes = [ctx.Process(target=camera_worker, name=f"camera-{cam_id}", daemon=True,
+                                          args=(cam, self.model_options, self.results, self.stop_event))
+                              for cam_id, cam in self.cameras.items()]
+        self._collector = threading.Thread(target=self._collect, daemon=True)
+
+    def start(self):
+        if self.scheduler is not None:
+            self.scheduler.start()
+        for process in self.processes:
+            process.start()
+        self._collector.start()
+        return self
+
+    def _collect(self):
+        while not self.stop_event.is_set():
+            try:
+                self._handle(self.results.get(timeout=0.5))
+            except queue.Empty:
+                continue
+
+    def _handle(self, item):
+        camera_id, packed, detected, latency, sent_at = item
+        occupied = np.unpackbits(packed, count=self.spot_counts[camera_id]).astype(bool)
+        changed = self.state.update(camera_id, occupied, lag=latency + time.time() - sent_at)
+        if changed and camera_id in self.history:
+            self.history[camera_id].append(datetime.now(), occupied=occupied)
+
+    def alive(self):
+        return any(p.is_alive() for p in self.processes)
+
+    def stop(self):
+        self.stop_event.set()
+        for process in self.processes:
+            process.join(timeout=5)
+            if process.is_alive() and hasattr(process, "terminate"):
+                process.terminate()
+        if self.scheduler is not None:
+            self.scheduler.stop()
+            print(self.scheduler.summary())
+        self._collector.join(timeout=2)
+        # Results the workers sent before exiting
+        while True:
+            try:
+                self._handle(self.results.get_nowait())
+            except queue.Empty:
+                break
+        for writer in self.history.values():
+            writer.close()
+
+    def status_line(self):
+        parts = [f"{cam}: {self.state.fps(cam):.1f} fps, lag {self.state.lag[cam] * 1000:.0f} ms, "
+                 f"{len(self.state.empty_spots(cam))} free" for cam in self.cameras]
+        if self.scheduler is not None:
+            m = self.scheduler.metrics()
+            parts.append(f"batch fill {m['fill_ratio']:.0%}, latency p95 {m['latency_ms_p95']} ms")
+        return " | ".join(parts)
+
+
+def load_config(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def make_arrivals(server, backend):
+    # Live forecasts on top of the trained predictor's curve (when there is one)
+    from smart_parking.availability import ArrivalAvailability
+    from smart_parking.forecast import LotForecaster, model_baseline
+    from smart_parking.prediction import default_model
+    from smart_parking.routing import OfflineBackend, ORSBackend, RoutingService
+
+    has_model = os.path.exists(default_model())
+    baselines = {cam: model_baseline(cam) for cam in server.cameras} if has_model else {}
+    forecaster = LotForecaster(server.spot_counts, baselines=baselines)
+    forecaster.follow(server.state)
+    routing = RoutingService(OfflineBackend() if backend == "offline" else ORSBackend())
+    return ArrivalAvailability(routing, forecaster=forecaster, model_path=default_model() if has_model else None)
+
+
+async def serve_with_api(server, api, status_every):
+    api_task = asyncio.create_task(api.serve_forever())
+    while server.alive() and not api_task.done():
+        await asyncio.sleep(status_every)
+        print(server.status_line())
+    api_task.cancel()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run occupancy detection for every camera of the lot.")
+    parser.add_argument("config", help="JSON file listing cameras, their sources and polygon files")
+    parser.add_argument("--status-every", type=float, default=5.0, help="seconds between status lines")
+    parser.add_argument("--api-port", type=int, help="serve the availability API on this port")
+    parser.add_argument("--api-host", default="0.0.0.0")
+    parser.add_argument("--arrivals", choices=["ors", "offline"],
+                        help="also serve /arrivals (chance of a spot on arrival) with this routing backend")
+    args = parser.parse_args()
+
+    server = OccupancyServer(load_config(args.config))
+    arrivals = make_arrivals(server, args.arrivals) if args.arrivals else None
+    api = (AvailabilityAPI(server.state, host=args.api_host, port=args.api_port, arrivals=arrivals)
+           if args.api_port else None)
+    server.start()
+    print(f"🚦 Started {len(server.processes)} camera workers")
+    try:
+        if api is not None:
+            asyncio.run(serve_with_api(server, api, args.status_every))
+        while server.alive():
+            time.sleep(args.status_every)
+            print(server.status_line())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,247 @@
+import argparse
+import time
+
+import numpy as np
+
+from smart_parking.planner import MOVES, load_lot_planner
+
+# Same rules as navigation/nav.py
+REACH_RADIUS = 40.0
+DWELL_S = 2.0
+
+# Agent states
+PENDING, WAITING, DRIVING, DWELLING, PARKED, DONE = range(6)
+
+STRATEGIES = ["nearest", "reserve"]
+
+
+# ---------- Headless multi-vehicle simulation ----------
+class LotSimulation:
+    # Simulates many cars entering the lot at once: every car drives along
+    # its target spot's distance field, claims the spot after dwelling 2 s
+    # within 40 px of it, parks for a while and leaves. All cars move in one
+    # vectorized step per tick.
+    #   nearest: every car heads for the nearest free spot (by driving
+    #            distance); when another car claims it first, that is a
+    #            conflict and the car re-targets.
+    #   reserve: a spot is reserved on assignment, so no two cars share a target.
+
+    def __init__(self, planner, n_agents, arrival_rate=1.0, mean_stay=120.0, speed=150.0,
+                 strategy="nearest", max_wait=300.0, occupied=None, seed=0):
+        if strategy not in STRATEGIES:
+            raise ValueError(f"unknown strategy {strategy!r}, expected one of {STRATEGIES}")
+        self.planner = planner
+        self.strategy = strategy
+        self.speed = speed
+        self.max_wait = max_wait
+        rng = np.random.default_rng(seed)
+
+        # Flattened fields and an 8-neighbour table for the field descent
+        n_spots, rows, cols = planner.fields.shape
+        self.fields = planner.fields.reshape(n_spots, -1)
+        self.shape = (rows, cols)
+        r, c = np.divmod(np.arange(rows * cols), cols)
+        self.neighbours = np.full((rows * cols, len(MOVES)), -1, dtype=np.intp)
+        for k, (dr, dc, _) in enumerate(MOVES):
+            nr, nc = r + dr, c + dc
+            inside = (nr >= 0) & (nr < rows) & (nc >= 0) & (nc < cols)
+            self.neighbours[inside, k] = nr[inside] * cols + nc[inside]
+        self.snap = planner.snap.reshape(-1)
+        self.centers = planner.spot_centers.astype(np.float64)
+        self.last_leg = planner.last_leg
+
+        # Spots
+        self.owner = np.full(n_spots, -1, dtype=np.intp)
+        if occupied is not None:
+            self.owner[np.asarray(occupied, dtype=np.intp)] = n_agents  # parked before the run
+        self.reserved = np.zeros(n_spots, dtype=bool)
+
+        # Agents
+        self.arrive_t = np.cumsum(rng.exponential(1.0 / arrival_rate, n_agents))
+        self.stay = rng.exponential(mean_stay, n_agents)
+        self.state = np.full(n_agents, PENDING, dtype=np.int8)
+        self.pos = np.tile(planner.cell_center(planner.entrance), (n_agents, 1)).astype(np.float64)
+        self.target = np.full(n_agents, -1, dtype=np.intp)
+        self.dwell_start = np.zeros(n_agents)
+        self.park_t = np.full(n_agents, np.nan)
+        self.leave_t = np.full(n_agents, np.inf)
+        self.travelled = np.zeros(n_agents)
+        self.gave_up = np.zeros(n_agents, dtype=bool)
+
+        self.t = 0.0
+        self.conflicts = 0
+        self.ticks = 0
+        self.peak_active = 0
+
+    # ----- helpers -----
+    def _cells(self, agents):
+        rows, cols = self.shape
+        cell = self.planner.cell
+        r = np.clip((self.pos[agents, 1] // cell).astype(np.intp), 0, rows - 1)
+        c = np.clip((self.pos[agents, 0] // cell).astype(np.intp), 0, cols - 1)
+        return self.snap[r * cols + c]
+
+    def _free(self):
+        free = self.owner == -1
+        if self.strategy == "reserve":
+            free &= ~self.reserved
+        return np.flatnonzero(free)
+
+    # ----- assignment -----
+    def _assign(self, agents):
+        candidates = self._free()
+        if len(agents) == 0 or len(candidates) == 0:
+            return
+        # (n_candidates, n_agents) driving distances, gathering only those entries of the fields
+        d = (self.fields[candidates[:, None], self._cells(agents)] * self.planner.cell
+             + self.last_leg[candidates, None])
+        if self.strategy == "nearest":
+            best = np.argmin(d, axis=0)
+            ok = np.isfinite(d[best, np.arange(len(agents))])
+            self.target[agents[ok]] = candidates[best[ok]]
+            self.state[agents[ok]] = DRIVING
+            return
+        # reserve: earliest arrivals pick first, each spot goes to one car
+        taken = np.zeros(len(candidates), dtype=bool)
+        for i in np.argsort(self.arrive_t[agents], kind="stable"):
+            column = np.where(taken, np.inf, d[:, i])
+            best = int(np.argmin(column))
+            if not np.isfinite(column[best]):
+                break
+            taken[best] = True
+            agent = agents[i]
+            self.target[agent] = candidates[best]
+            self.reserved[candidates[best]] = True
+            self.state[agent] = DRIVING
+
+    def _release_target(self, agents):
+        if self.strategy == "reserve":
+            self.reserved[self.target[agents]] = False
+        self.target[agents] = -1
+
+    # ----- one tick -----
+    def step(self, dt):
+        t = self.t + dt
+        state = self.state
+
+        # Departures free their spot
+        leaving = np.flatnonzero((state == PARKED) & (self.leave_t <= t))
+        self.owner[self.target[leaving]] = -1
+        state[leaving] = DONE
+
+        # Arrivals queue at the entrance
+        state[(state == PENDING) & (self.arrive_t <= t)] = WAITING
+
+        # Cars whose target was claimed by someone else re-target
+        moving = np.flatnonzero((state == DRIVING) | (state == DWELLING))
+        lost = moving[self.owner[self.target[moving]] != -1]
+        if len(lost):
+            self.conflicts += len(lost)
+            self._release_target(lost)
+            state[lost] = WAITING
+
+        # Waiting cars give up after max_wait without a spot
+        waiting = np.flatnonzero(state == WAITING)
+        timed_out = waiting[t - self.arrive_t[waiting] > self.max_wait]
+        state[timed_out] = DONE
+        self.gave_up[timed_out] = True
+        self._assign(np.flatnonzero(state == WAITING))
+
+        # Move along the field; on the spot's entry cell head for its center
+        moving = np.flatnonzero((state == DRIVING) | (state == DWELLING))
+        if len(moving):
+            targets = self.target[moving]
+            cells = self._cells(moving)
+            neighbours = self.neighbours[cells]
+            values = np.where(neighbours >= 0, self.fields[targets[:, None], np.maximum(neighbours, 0)], np.inf)
+            nxt = neighbours[np.arange(len(moving)), np.argmin(values, axis=1)]
+            rows, cols = np.divmod(nxt, self.shape[1])
+            aim = np.column_stack(((cols + 0.5) * self.planner.cell, (rows + 0.5) * self.planner.cell))
+            at_entry = self.fields[targets, cells] == 0
+            aim[at_entry] = self.centers[targets[at_entry]]
+
+            vec = aim - self.pos[moving]
+            length = np.hypot(vec[:, 0], vec[:, 1])
+            travel = np.minimum(self.speed * dt, length)
+            scale = np.divide(travel, length, out=np.zeros_like(length), where=length > 0)
+            self.pos[moving] += vec * scale[:, None]
+            self.travelled[moving] += travel
+
+            # Reach logic: within 40 px starts the 2 s dwell, leaving resets it
+            near = np.hypot(*(self.pos[moving] - self.centers[targets]).T) <= REACH_RADIUS
+            arrived = moving[near & (state[moving] == DRIVING)]
+            state[arrived] = DWELLING
+            self.dwell_start[arrived] = t
+            state[moving[~near & (state[moving] == DWELLING)]] = DRIVING
+
+        # Claims: first car per spot wins, later ones in the same tick re-target
+        dwelling = np.flatnonzero((state == DWELLING) & (t - self.dwell_start >= DWELL_S))
+        if len(dwelling):
+            spots, first = np.unique(self.target[dwelling], return_index=True)
+            winners = dwelling[first]
+            free = self.owner[spots] == -1
+            winners = winners[free]
+            self.owner[self.target[winners]] = winners
+            if self.strategy == "reserve":
+                self.reserved[self.target[winners]] = False
+            state[winners] = PARKED
+            self.park_t[winners] = t
+            self.leave_t[winners] = t + self.stay[winners]
+
+        self.t = t
+        self.ticks += 1
+        self.peak_active = max(self.peak_active, int(np.count_nonzero((state >= WAITING) & (state <= DWELLING))))
+
+    def run(self, dt=0.1, until=None):
+        # Runs until every car has parked and left or given up (or until `until` seconds)
+        while (until is None or self.t < until) and np.any(self.state != DONE):
+            self.step(dt)
+        return self.metrics()
+
+    # ----- results -----
+    def metrics(self):
+        parked = ~np.isnan(self.park_t)
+        time_to_park = self.park_t[parked] - self.arrive_t[parked]
+        hours = max(self.t, 1e-9) / 3600
+        return {
+            "strategy": self.strategy,
+            "agents": len(self.state),
+            "sim_seconds": round(self.t, 1),
+            "parked": int(parked.sum()),
+            "gave_up": int(self.gave_up.sum()),
+            "conflicts": self.conflicts,
+            "throughput_per_hour": round(float(parked.sum()) / hours, 1),
+            "time_to_park_mean_s": round(float(time_to_park.mean()), 1) if parked.any() else None,
+            "time_to_park_p95_s": round(float(np.percentile(time_to_park, 95)), 1) if parked.any() else None,
+            "mean_drive_px": round(float(self.travelled[parked].mean()), 1) if parked.any() else None,
+            "peak_active": self.peak_active,
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate many cars parking in the lot, headless.")
+    parser.add_argument("--blueprint", default="navigation/layout.png")
+    parser.add_argument("--spots", default="navigation/layout_polygons.txt")
+    parser.add_argument("--agents", type=int, default=2000)
+    parser.add_argument("--arrival-rate", type=float, default=0.5, help="cars per second")
+    parser.add_argument("--mean-stay", type=float, default=30.0, help="mean parking time in seconds")
+    parser.add_argument("--speed", type=float, default=150.0, help="pixels per second")
+    parser.add_argument("--max-wait", type=float, default=300.0, help="seconds a car waits for a spot")
+    parser.add_argument("--strategy", choices=STRATEGIES + ["all"], default="all")
+    parser.add_argument("--dt", type=float, default=0.1, help="simulation tick in seconds")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    planner = load_lot_planner(args.blueprint, args.spots)
+    for strategy in (STRATEGIES if args.strategy == "all" else [args.strategy]):
+        sim = LotSimulation(planner, args.agents, arrival_rate=args.arrival_rate, mean_stay=args.mean_stay,
+                            speed=args.speed, strategy=strategy, max_wait=args.max_wait, seed=args.seed)
+        start = time.perf_counter()
+        metrics = sim.run(dt=args.dt)
+        elapsed = time.perf_counter() - start
+        print(f"🚗 {strategy}: {metrics}")
+        print(f"   {sim.ticks} ticks in {elapsed:.2f}s ({metrics['sim_seconds'] / elapsed:.0f}x real time)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+import numpy as np
+
+# Number of set bits for every uint8 value
+POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+# ---------- Per-spot N-of-M debouncing ----------
+class OccupancySmoother:
+    # Keeps the last `window` (<= 8) raw observations of every spot as bits of
+    # one uint8 and flips a spot's confirmed state only when at least
+    # `required` of them disagree with it. A car driving past or a single
+    # missed detection therefore never produces a transition. required must
+    # be a strict majority of the window: the history is not cleared on a
+    # flip, so with less the older votes for the other state flip it back.
+
+    def __init__(self, n_spots, window=5, required=4, initial=None):
+        if not window // 2 < required <= window <= 8:
+            raise ValueError("need window // 2 < required <= window <= 8")
+        self.window = window
+        self.required = required
+        self.mask = np.uint8((1 << window) - 1)
+        self.history = np.zeros(n_spots, dtype=np.uint8)
+        self.seen = 0
+        self.state = np.zeros(n_spots, dtype=bool) if initial is None else np.array(initial, dtype=bool)
+        self.since = np.zeros(n_spots, dtype=np.float64)
+        self.observations = 0
+        self.transitions = 0
+
+    def update(self, observed, now):
+        # Feeds one frame of raw occupancy; returns the confirmed transitions
+        # as a list of (spot, occupied, time)
+        observed = np.asarray(observed, dtype=bool)
+        self.history = ((self.history << 1) | observed.astype(np.uint8)) & self.mask
+        self.seen = min(self.seen + 1, self.window)
+        self.observations += 1
+
+        occupied_votes = POPCOUNT[self.history]
+        empty_votes = self.seen - occupied_votes
+        flip = np.where(self.state, empty_votes >= self.required, occupied_votes >= self.required)
+        changed = np.flatnonzero(flip)
+        if len(changed) == 0:
+            return []
+
+        self.state[changed] = ~self.state[changed]
+        self.since[changed] = now
+        self.transitions += len(changed)
+        return [(int(i), bool(self.state[i]), now) for i in changed]
+
+    def summary(self):
+        return (f"Smoothing: {self.observations} frames, {self.transitions} confirmed transitions "
+                f"({self.required} of {self.window} frames)")
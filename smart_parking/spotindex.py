@@ -0,0 +1,130 @@
+import heapq
+import threading
+
+import numpy as np
+
+LEAF_SIZE = 8
+
+
+def spot_centers(spots):
+    return np.array([(np.mean([p[0] for p in s]), np.mean([p[1] for p in s])) for s in spots],
+                    dtype=np.float64).reshape(-1, 2)
+
+
+# ---------- Nearest free spot ----------
+class SpotIndex:
+    # KD-tree over the spot centers (built once; spots do not move) where
+    # every node counts the free spots below it. Opening or closing a spot
+    # updates the counts on its leaf-to-root path, O(log n), and queries skip
+    # every subtree without a free spot, so they stay fast when the lot is
+    # nearly full. Safe to share between threads.
+
+    def __init__(self, centers, free=None):
+        self.centers = np.asarray(centers, dtype=np.float64).reshape(-1, 2)
+        n = len(self.centers)
+        self.free = [False] * n
+        self._lock = threading.Lock()
+
+        # Nodes as parallel lists: bounding box, children, parent, leaf spots
+        self.lo, self.hi, self.children, self.parent, self.leaf_spots = [], [], [], [], []
+        self.leaf_of = np.zeros(n, dtype=np.intp)
+        if n:
+            self._build(np.arange(n), -1)
+        # Plain lists: the query loop indexes them one element at a time
+        self.free_count = [0] * len(self.lo)
+        self.lo = [tuple(b) for b in np.array(self.lo).tolist()]
+        self.hi = [tuple(b) for b in np.array(self.hi).tolist()]
+        self._points = self.centers.tolist()
+        if free is not None:
+            for spot in free:
+                self.set_free(spot, True)
+
+    @classmethod
+    def from_polygons(cls, spots, free=None):
+        return cls(spot_centers(spots), free)
+
+    def _build(self, idx, parent):
+        node = len(self.lo)
+        points = self.centers[idx]
+        lo, hi = points.min(axis=0), points.max(axis=0)
+        self.lo.append(lo)
+        self.hi.append(hi)
+        self.parent.append(parent)
+        self.children.append(None)
+        self.leaf_spots.append(None)
+        if len(idx) <= LEAF_SIZE:
+            self.leaf_spots[node] = idx.tolist()
+            self.leaf_of[idx] = node
+            return node
+        # Split the wider side at the median
+        axis = int(np.argmax(hi - lo))
+        order = idx[np.argsort(points[:, axis], kind="stable")]
+        half = len(order) // 2
+        left = self._build(order[:half], node)
+        right = self._build(order[half:], node)
+        self.children[node] = (left, right)
+        return node
+
+    # ----- updates -----
+    def set_free(self, spot, free):
+        with self._lock:
+            if self.free[spot] == free:
+                return False
+            self.free[spot] = free
+            delta = 1 if free else -1
+            node = int(self.leaf_of[spot])
+            while node != -1:
+                self.free_count[node] += delta
+                node = self.parent[node]
+            return True
+
+    def update(self, occupied):
+        # Applies a full occupancy vector; only spots that flipped are touched
+        occupied = np.asarray(occupied, dtype=bool)
+        changed = np.flatnonzero(np.array(self.free, dtype=bool) == occupied).tolist()
+        for spot in changed:
+            self.set_free(spot, not occupied[spot])
+        return changed
+
+    def free_spots(self):
+        return [spot for spot, free in enumerate(self.free) if free]
+
+    # ----- queries -----
+    def nearest(self, point, max_distance=None):
+        found = self.k_nearest(point, 1, max_distance)
+        return found[0] if found else None
+
+    def k_nearest(self, point, k, max_distance=None):
+        # [(spot, distance)] of the k nearest free spots, closest first
+        px, py = float(point[0]), float(point[1])
+        limit = np.inf if max_distance is None else max_distance * max_distance
+        result = []
+        with self._lock:
+            if not len(self.lo) or self.free_count[0] == 0:
+                return result
+            heap = [(self._box_distance(0, px, py), 0, 0)]  # (distance², is_spot, id)
+            while heap and len(result) < k:
+                d2, is_spot, item = heapq.heappop(heap)
+                if d2 > limit:
+                    break
+                if is_spot:
+                    result.append((item, d2 ** 0.5))
+                    continue
+                if self.free_count[item] == 0:
+                    continue
+                if self.children[item] is None:
+                    for spot in self.leaf_spots[item]:
+                        if self.free[spot]:
+                            cx, cy = self._points[spot]
+                            heapq.heappush(heap, ((cx - px) ** 2 + (cy - py) ** 2, 1, spot))
+                else:
+                    for child in self.children[item]:
+                        if self.free_count[child]:
+                            heapq.heappush(heap, (self._box_distance(child, px, py), 0, child))
+        return result
+
+    def _box_distance(self, node, px, py):
+        lo, hi = self.lo[node], self.hi[node]
+        dx = max(lo[0] - px, 0.0, px - hi[0])
+        dy = max(lo[1] - py, 0.0, py - hi[1])
+        return dx * dx + dy * dy
@@ -0,0 +1,81 @@
+import os
+
+import cv2
+import numpy as np
+
+from smart_parking.spots import load_parking_spots
+
+# Label of pixels that belong to no spot
+BACKGROUND = -1
+
+
+# ---------- Spot label raster ----------
+class SpotMap:
+    # int16 image the size of the camera frame where each pixel holds the index
+    # of the spot it belongs to (BACKGROUND elsewhere). Occupancy then becomes a
+    # NumPy gather instead of a point-in-polygon test per spot and vehicle.
+
+    def __init__(self, spots, labels):
+        self.spots = spots
+        self.labels = labels
+        self.n_spots = len(spots)
+        self.areas = np.bincount(labels[labels >= 0].ravel(), minlength=self.n_spots)
+
+    @classmethod
+    def build(cls, spots, frame_shape):
+        h, w = frame_shape[:2]
+        labels = np.full((h, w), BACKGROUND, dtype=np.int16)
+        for i, spot in enumerate(spots):
+            cv2.fillPoly(labels, [np.array(spot, dtype=np.int32)], int(i))
+        return cls(spots, labels)
+
+    def occupancy_from_centers(self, centers):
+        # True for every spot that contains at least one vehicle center
+        occupied = np.zeros(self.n_spots, dtype=bool)
+        centers = np.asarray(centers, dtype=np.float32).reshape(-1, 2)
+        if len(centers) == 0:
+            return occupied
+        h, w = self.labels.shape
+        xs = centers[:, 0].astype(np.intp)
+        ys = centers[:, 1].astype(np.intp)
+        inside = (xs >= 0) & (xs < w) & (ys >= 0) & (ys < h)
+        hit = self.labels[ys[inside], xs[inside]]
+        occupied[hit[hit >= 0]] = True
+        return occupied
+
+    def overlap_ratios(self, boxes):
+        # Fraction of each spot's pixels covered by the union of the boxes
+        mask = np.zeros(self.labels.shape, dtype=bool)
+        h, w = mask.shape
+        for x1, y1, x2, y2 in np.asarray(boxes).reshape(-1, 4):
+            x1, x2 = max(int(x1), 0), min(int(np.ceil(x2)), w)
+            y1, y2 = max(int(y1), 0), min(int(np.ceil(y2)), h)
+            if x2 > x1 and y2 > y1:
+                mask[y1:y2, x1:x2] = True
+        covered = self.labels[mask]
+        counts = np.bincount(covered[covered >= 0], minlength=self.n_spots)
+        return counts / np.maximum(self.areas, 1)
+
+    def occupancy_from_boxes(self, boxes, min_overlap=0.3):
+        return self.overlap_ratios(boxes) >= min_overlap
+
+
+# ---------- Build once, cache to disk ----------
+def spot_map_cache_path(polygon_file, frame_shape):
+    h, w = frame_shape[:2]
+    root, _ = os.path.splitext(polygon_file)
+    return f"{root}.spotmap_{w}x{h}.npy"
+
+
+def load_spot_map(polygon_file, frame_shape, cache_path=None):
+    # The raster is rebuilt only when the polygon file is newer than the cache
+    spots = load_parking_spots(polygon_file)
+    cache_path = cache_path or spot_map_cache_path(polygon_file, frame_shape)
+    if os.path.exists(cache_path) and os.path.getmtime(cache_path) >= os.path.getmtime(polygon_file):
+        labels = np.load(cache_path)
+        if labels.shape == tuple(frame_shape[:2]) and labels.max() < len(spots):
+            return SpotMap(spots, labels)
+
+    spot_map = SpotMap.build(spots, frame_shape)
+    np.save(cache_path, spot_map.labels)
+    return spot_map
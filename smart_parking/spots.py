@@ -0,0 +1,21 @@
+import ast
+
+import numpy as np
+
+
+# ---------- Load parking spot polygons from TXT file ----------
+def load_parking_spots(file_path):
+    spots = []
+    with open(file_path, "r") as f:
+        for line in f:
+            line = line.strip()
+            if line:  # skip empty lines
+                polygon = ast.literal_eval(line)
+                spots.append(polygon)
+    return spots
+
+
+def spot_label_position(spot):
+    cx = int(np.mean([pt[0] for pt in spot]))
+    cy = int(np.mean([pt[1] for pt in spot]))
+    return cx, cy
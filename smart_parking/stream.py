@@ -0,0 +1,161 @@
+import os
+import queue
+import threading
+import time
+from collections import namedtuple
+
+import cv2
+
+from smart_parking.detection import box_centers, detect_vehicles
+from smart_parking.motion import MotionGate
+from smart_parking.roi import roi_pixel_ratio, spot_rois
+from smart_parking.smoothing import OccupancySmoother
+from smart_parking.spotmap import load_spot_map
+
+
+# ---------- Producer: decode frames on a background thread ----------
+class FrameReader:
+    # Reads from a cv2.VideoCapture source (file path, camera index or
+    # RTSP/HTTP URL) into a bounded queue. When the consumer falls behind and
+    # drop_stale is set, the oldest queued frame is discarded so the consumer
+    # always sees the freshest frames and latency stays bounded.
+
+    def __init__(self, source, max_queue=2, drop_stale=True):
+        self.source = source
+        self.drop_stale = drop_stale
+        # Recordings are timed by their own position (0.0 on the first frame),
+        # live sources by the wall clock; decided once, never per frame
+        self.video_clock = isinstance(source, str) and os.path.isfile(source)
+        self.frames = queue.Queue(maxsize=max_queue)
+        self.decoded = 0
+        self.dropped = 0
+        self.fps = 0.0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        cap = cv2.VideoCapture(self.source)
+        if not cap.isOpened():
+            raise IOError(f"Could not open video source {self.source}")
+        self.fps = cap.get(cv2.CAP_PROP_FPS) or 0.0
+        self._thread = threading.Thread(target=self._run, args=(cap,), daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    def _put(self, item):
+        while not self._stop.is_set():
+            if self.drop_stale:
+                try:
+                    self.frames.put_nowait(item)
+                    return
+                except queue.Full:
+                    try:
+                        self.frames.get_nowait()
+                        self.dropped += 1
+                    except queue.Empty:
+                        pass
+            else:
+                try:
+                    self.frames.put(item, timeout=0.1)
+                    return
+                except queue.Full:
+                    pass
+
+    def _run(self, cap):
+        try:
+            while not self._stop.is_set():
+                ret, frame = cap.read()
+                if not ret:
+                    break
+                pos_ms = cap.get(cv2.CAP_PROP_POS_MSEC)
+                self._put((self.decoded, pos_ms / 1000.0, time.time(), frame))
+                self.decoded += 1
+        finally:
+            cap.release()
+            # End-of-stream marker; never dropped because the consumer waits for it
+            while not self._stop.is_set():
+                try:
+                    self.frames.put(None, timeout=0.1)
+                    break
+                except queue.Full:
+                    pass
+
+    def __iter__(self):
+        while True:
+            item = self.frames.get()
+            if item is None:
+                return
+            yield item
+
+
+# ---------- Consumer: detect and emit per-spot occupancy ----------
+# occupied is a bool vector per spot; detected is False when the motion gate
+# skipped the detector and occupied/boxes were carried over from an earlier frame.
+# With smoothing, occupied is the confirmed state and transitions lists the
+# (spot, occupied, time) changes confirmed on this frame (None without smoothing).
+OccupancyFrame = namedtuple(
+    "OccupancyFrame", ["index", "video_time", "latency", "occupied", "boxes", "frame", "detected",
+                       "transitions"])
+
+
+def stream_occupancy(source, polygon_file, model, max_queue=2, drop_stale=True,
+                     motion_threshold=None, max_stale=60.0, roi_tiles=0, roi_padding=64, imgsz=None,
+                     smooth_window=0, smooth_required=None, detect=None):
+    # Yields an OccupancyFrame for every frame taken off the queue. With a
+    # motion_threshold the detector only runs when a spot ROI changed or the
+    # last detection is older than max_stale seconds. roi_tiles > 0 runs the
+    # detector on crops around the spots instead of the full frame. With
+    # smooth_window a spot only changes after smooth_required of the last
+    # smooth_window detections agree. detect replaces the model call, e.g.
+    # with a shared BatchScheduler.detect.
+    if detect is None:
+        detect_options = {"imgsz": imgsz} if imgsz else {}
+
+        def detect(frame, rois):
+            return detect_vehicles(model, frame, rois=rois, **detect_options)
+
+    reader = FrameReader(source, max_queue=max_queue, drop_stale=drop_stale).start()
+    spot_map = None
+    gate = None
+    rois = None
+    smoother = None
+    occupied = boxes = None
+    try:
+        for frame_index, video_time, decoded_at, frame in reader:
+            if spot_map is None:
+                spot_map = load_spot_map(polygon_file, frame.shape)
+                if motion_threshold is not None:
+                    gate = MotionGate(spot_map.spots, frame.shape, threshold=motion_threshold,
+                                      max_stale=max_stale)
+                if smooth_window:
+                    smoother = OccupancySmoother(spot_map.n_spots, window=smooth_window,
+                                                 required=smooth_required or smooth_window)
+                if roi_tiles:
+                    rois = spot_rois(spot_map.spots, frame.shape, tiles=roi_tiles, padding=roi_padding)
+                    print(f"Detecting on {len(rois)} ROI crop(s), "
+                          f"{roi_pixel_ratio(rois, frame.shape):.0%} of the frame")
+
+            now = video_time if reader.video_clock else decoded_at
+            detected = gate is None or gate.should_detect(frame, now)
+            transitions = [] if smoother is not None else None
+            if detected:
+                boxes = detect(frame, rois)
+                occupied = spot_map.occupancy_from_centers(box_centers(boxes))
+                if smoother is not None:
+                    transitions = smoother.update(occupied, now)
+            if smoother is not None:
+                occupied = smoother.state.copy()
+            yield OccupancyFrame(frame_index, video_time, time.time() - decoded_at,
+                                 occupied, boxes, frame, detected, transitions)
+    finally:
+        reader.stop()
+        print(f"Decoded {reader.decoded} frames, dropped {reader.dropped} stale frames.")
+        if gate is not None:
+            print(gate.summary())
+        if smoother is not None:
+            print(smoother.summary())
@@ -0,0 +1,17 @@
+from smart_parking.reservations import ReservationBook
+
+
+def test_claimed_spot_stays_claimed_until_the_car_is_seen():
+    book = ReservationBook(4, now=0.0)
+    hold = book.hold(1, "driver", now=0.0)
+    assert book.claim(hold, now=1.0)
+
+    # The smoothed detector has not seen the car arrive yet
+    book.reconcile([False] * 4, now=2.0)
+    assert 1 not in book.available()
+    assert book.hold(1, "other", now=2.0) is None
+
+    # Seen parked, then gone: the spot is free again
+    book.reconcile([False, True, False, False], now=3.0)
+    book.reconcile([False] * 4, now=4.0)
+    assert 1 in book.available()